@@ -0,0 +1,275 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+import json
+import base64
+import tempfile
+from datetime import datetime
+
+# Alert probabilities of the threshold model precomputed on a grid of its dominant inputs, for
+# services that cannot run the forest (backend/services/alertLookupService.js). The grid spans
+# height x rate_of_change x time of day; sin_time / cos_time follow from the time of day, and
+# the remaining features (rolling statistics, day of year) are set to their mean over the
+# training readings falling in the same height / rate_of_change cell. A lookup is a trilinear
+# interpolation between the eight surrounding grid nodes, O(1) per reading.
+# Time of day is read from the naive training timestamps, which hold UTC (MongoDB stores UTC;
+# CSV exports must do the same); alertLookupService.js looks readings up by UTC time of day.
+
+DEFAULT_LOOKUP_PATH = os.path.join('models', 'alert_lookup.json')
+LOOKUP_FORMAT = 'alert-probability-lookup'
+LOOKUP_VERSION = 1
+
+# Axes of the grid: feature name, number of nodes and whether the axis wraps around
+GRID_AXES = (('height', 64, False), ('rate_of_change', 32, False), ('time_of_day', 24, True))
+
+# Probabilities are stored as uint16, probability = value / PROBABILITY_SCALE
+PROBABILITY_SCALE = 65535
+
+
+class AlertLookup:
+    def __init__(self, axes, probabilities, thresholds=None, accuracy=None):
+        """Grid of alert probabilities with trilinear interpolation.
+
+        Args:
+            axes (list): Per axis a dict with name, start, step, size and periodic; node i of an
+                axis sits at start + i * step, and a periodic axis wraps after size nodes.
+            probabilities (numpy.ndarray): Probabilities at the nodes, shape of the axis sizes.
+            thresholds (dict, optional): Threshold name to alert probability threshold.
+            accuracy (dict, optional): Held-out comparison against the full model (see evaluate).
+        """
+        self.axes = [dict(axis) for axis in axes]
+        self.probabilities = np.asarray(probabilities, dtype=np.float64)
+        self.thresholds = dict(thresholds or {})
+        self.accuracy = accuracy
+
+    def _positions(self, axis, values):
+        """Lower node index and interpolation weight of every value along one axis."""
+        position = (np.asarray(values, dtype=np.float64) - axis['start']) / axis['step']
+        size = axis['size']
+        if axis['periodic']:
+            lower = np.floor(position)
+            return lower.astype(np.int64) % size, position - lower, size
+        # Values outside the grid take the edge value
+        position = np.clip(position, 0, size - 1)
+        lower = np.clip(np.floor(position), 0, max(size - 2, 0)).astype(np.int64)
+        return lower, position - lower, size
+
+    def probability(self, height, rate_of_change, time_of_day):
+        """Interpolated alert probability; arguments broadcast like NumPy arrays.
+
+        Args:
+            height (array-like): Height in metres.
+            rate_of_change (array-like): Height change since the previous reading.
+            time_of_day (array-like): Decimal hours, hour + minute / 60.
+        """
+        coordinates = np.broadcast_arrays(height, rate_of_change, time_of_day)
+        lowers, weights, sizes = zip(*(self._positions(axis, values) for axis, values in zip(self.axes, coordinates)))
+        result = np.zeros(coordinates[0].shape)
+        for corner in range(8):
+            index, weight = [], 1.0
+            for dim in range(3):
+                upper = (corner >> dim) & 1
+                node = lowers[dim] + upper
+                # Periodic axes wrap to node 0; clamped axes never step past the last node
+                index.append(node % sizes[dim])
+                weight = weight * (weights[dim] if upper else 1 - weights[dim])
+            result += weight * self.probabilities[tuple(index)]
+        return result
+
+    def decide(self, probability, threshold='optimal'):
+        return np.asarray(probability) >= self.thresholds[threshold]
+
+    def to_dict(self):
+        """JSON-serializable table: metadata and base64 little-endian uint16 probabilities."""
+        quantized = np.round(np.clip(self.probabilities, 0, 1) * PROBABILITY_SCALE).astype('<u2')
+        return {
+            'format': LOOKUP_FORMAT,
+            'version': LOOKUP_VERSION,
+            'created': datetime.now().isoformat(),
+            'interpolation': 'trilinear',
+            'axes': self.axes,
+            'order': 'C',
+            'dtype': 'uint16le',
+            'scale': 1.0 / PROBABILITY_SCALE,
+            'thresholds': {name: float(value) for name, value in self.thresholds.items()},
+            'accuracy': self.accuracy,
+            'data': base64.b64encode(quantized.tobytes()).decode('ascii')
+        }
+
+    def save(self, path=DEFAULT_LOOKUP_PATH):
+        lookup_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(lookup_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(path) + '.', dir=lookup_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.to_dict(), f, default=float)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=DEFAULT_LOOKUP_PATH):
+        with open(path) as f:
+            table = json.load(f)
+        if table.get('format') != LOOKUP_FORMAT:
+            raise ValueError(f"{path} is not an alert probability lookup")
+        if table['version'] > LOOKUP_VERSION:
+            raise ValueError(f"{path} uses lookup version {table['version']}, newer than supported {LOOKUP_VERSION}")
+        shape = tuple(axis['size'] for axis in table['axes'])
+        values = np.frombuffer(base64.b64decode(table['data']), dtype='<u2').reshape(shape)
+        return cls(table['axes'], values * table['scale'], table['thresholds'], table.get('accuracy'))
+
+
+def _axis(name, values, size, periodic):
+    if periodic:
+        # Time of day: nodes every 24 / size hours from midnight
+        return {'name': name, 'start': 0.0, 'step': 24.0 / size, 'size': size, 'periodic': True}
+    # Robust range, so a few outliers do not stretch the grid
+    low, high = np.nanquantile(values, [0.001, 0.999])
+    if high <= low:
+        high = low + 1.0
+    return {'name': name, 'start': float(low), 'step': float(high - low) / (size - 1), 'size': size, 'periodic': False}
+
+
+def grid_features(axes, features, processed):
+    """Feature matrix of every grid node, in C order of the axes.
+
+    Returns:
+        numpy.ndarray: Shape (number of nodes, len(features)).
+    """
+    heights = axes[0]['start'] + axes[0]['step'] * np.arange(axes[0]['size'])
+    rates = axes[1]['start'] + axes[1]['step'] * np.arange(axes[1]['size'])
+    hours = axes[2]['start'] + axes[2]['step'] * np.arange(axes[2]['size'])
+
+    # Mean of every other feature per (height, rate_of_change) cell, the overall mean where a cell is empty
+    others = [name for name in features if name not in ('height', 'rate_of_change', 'sin_time', 'cos_time')]
+    cell_h = np.clip(np.rint((processed['height'].to_numpy() - axes[0]['start']) / axes[0]['step']), 0, axes[0]['size'] - 1)
+    cell_r = np.clip(np.rint((processed['rate_of_change'].to_numpy() - axes[1]['start']) / axes[1]['step']), 0, axes[1]['size'] - 1)
+    cells = (cell_h * axes[1]['size'] + cell_r).astype(np.int64)
+    n_cells = axes[0]['size'] * axes[1]['size']
+    counts = np.bincount(cells, minlength=n_cells)
+    cell_means = {}
+    for name in others:
+        values = processed[name].to_numpy(dtype=np.float64)
+        sums = np.bincount(cells, weights=values, minlength=n_cells)
+        cell_means[name] = np.where(counts > 0, sums / np.maximum(counts, 1), values.mean())
+
+    h, r, t = np.meshgrid(np.arange(len(heights)), np.arange(len(rates)), np.arange(len(hours)), indexing='ij')
+    h, r, t = h.ravel(), r.ravel(), t.ravel()
+    time_rad = 2 * np.pi * hours[t] / 24
+    columns = {
+        'height': heights[h],
+        'rate_of_change': rates[r],
+        'sin_time': np.sin(time_rad),
+        'cos_time': np.cos(time_rad)
+    }
+    for name in others:
+        columns[name] = cell_means[name][h * len(rates) + r]
+    return np.column_stack([columns[name] for name in features])
+
+
+def build_lookup(model, scaler, features, processed, thresholds=None, axes=GRID_AXES, chunk_size=65536):
+    """Evaluate the model on the grid spanned by processed (preprocess_data output).
+
+    Args:
+        model: Classifier with predict_proba, e.g. the bundle's FlatForest.
+        scaler: Scaler the model's inputs are standardized with.
+        features (list): Model feature names.
+        processed (pandas.DataFrame): Training readings with the model features.
+        thresholds (dict, optional): Alert probability thresholds to ship with the table.
+        axes (tuple, optional): (name, size, periodic) of the height, rate_of_change and
+            time_of_day axes.
+
+    Returns:
+        AlertLookup: The probability grid.
+    """
+    if [name for name, _, _ in axes] != ['height', 'rate_of_change', 'time_of_day']:
+        raise ValueError("The grid axes are height, rate_of_change and time_of_day, in that order")
+    time_of_day = processed['ts'].dt.hour + processed['ts'].dt.minute / 60
+    grid_axes = [
+        _axis(name, time_of_day if name == 'time_of_day' else processed[name], size, periodic)
+        for name, size, periodic in axes
+    ]
+    X = grid_features(grid_axes, features, processed)
+    probabilities = np.concatenate([
+        model.predict_proba(scaler.transform(pd.DataFrame(X[start:start + chunk_size], columns=features)))[:, 1]
+        for start in range(0, len(X), chunk_size)
+    ])
+    return AlertLookup(grid_axes, probabilities.reshape([axis['size'] for axis in grid_axes]), thresholds)
+
+
+def evaluate(lookup, model, scaler, features, processed, y_true):
+    """Accuracy loss of the lookup against the full model on held-out readings.
+
+    Returns:
+        dict: Probability errors, and per threshold the share of readings where both decide
+        the same plus the F1 score of each against y_true.
+    """
+    from sklearn.metrics import f1_score
+
+    full = model.predict_proba(scaler.transform(processed[features]))[:, 1]
+    time_of_day = processed['ts'].dt.hour + processed['ts'].dt.minute / 60
+    approx = lookup.probability(processed['height'].to_numpy(), processed['rate_of_change'].to_numpy(),
+                                time_of_day.to_numpy())
+    error = np.abs(approx - full)
+    y_true = np.asarray(y_true, dtype=bool)
+    report = {
+        'readings': int(len(processed)),
+        'mean_abs_probability_error': float(error.mean()),
+        'p99_abs_probability_error': float(np.quantile(error, 0.99)),
+        'max_abs_probability_error': float(error.max()),
+        'thresholds': {}
+    }
+    for name, threshold in lookup.thresholds.items():
+        full_alert, approx_alert = full >= threshold, approx >= threshold
+        report['thresholds'][name] = {
+            'agreement': float(np.mean(full_alert == approx_alert)),
+            'model_f1': float(f1_score(y_true, full_alert, zero_division=0)),
+            'lookup_f1': float(f1_score(y_true, approx_alert, zero_division=0))
+        }
+    return report
+
+
+def export_alert_lookup(model, scaler, features, thresholds, data, path=DEFAULT_LOOKUP_PATH, axes=GRID_AXES):
+    """Build the lookup from the training split of data, evaluate it on the held-out split and save it.
+
+    The split is the one train_threshold_model uses, so held-out readings were not seen in training.
+
+    Returns:
+        AlertLookup: The saved lookup, with its accuracy report.
+    """
+    from sklearn.model_selection import train_test_split
+    from alert_threshold_optimization import preprocess_data
+
+    processed = preprocess_data(data)
+    train, test = train_test_split(processed, test_size=0.2, random_state=42)
+    lookup = build_lookup(model, scaler, features, train, thresholds=thresholds, axes=axes)
+    lookup.accuracy = evaluate(lookup, model, scaler, features, test, test['alert_triggered'])
+    lookup.save(path)
+    return lookup
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from model_bundle import load_classifier_bundle
+
+    parser = argparse.ArgumentParser(description='Export the alert model as a probability lookup table')
+    parser.add_argument('--bundle', type=str, default=os.path.join('models', 'alert_threshold_model.bundle'),
+                        help='Alert model bundle written by alert_threshold_optimization.py')
+    parser.add_argument('--data', type=str, default='alert_data.csv', help='Training data CSV')
+    parser.add_argument('--output', type=str, default=DEFAULT_LOOKUP_PATH, help='Lookup JSON path')
+    parser.add_argument('--bins', type=int, nargs=3, metavar=('HEIGHT', 'RATE', 'HOURS'),
+                        default=[size for _, size, _ in GRID_AXES], help='Grid nodes per axis')
+    args = parser.parse_args()
+
+    model, scaler, features, thresholds = load_classifier_bundle(args.bundle)
+    data = pd.read_csv(args.data, parse_dates=['ts'])
+    axes = tuple((name, size, periodic) for (name, _, periodic), size in zip(GRID_AXES, args.bins))
+
+    started = time.perf_counter()
+    lookup = export_alert_lookup(model, scaler, features, thresholds, data, path=args.output, axes=axes)
+    print(f"Lookup of {lookup.probabilities.size} nodes written to {args.output} "
+          f"({os.path.getsize(args.output) / 1024:.0f} KiB) in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    print(json.dumps(lookup.accuracy, indent=2))
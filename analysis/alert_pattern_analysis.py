@@ -1,24 +1,36 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import seaborn as sns
 from datetime import datetime, timedelta
 import os
 import sys
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, confusion_matrix
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def load_data(from_csv=True, csv_path='alert_analysis_data.csv'):
+from readings_store import ReadingsStore
+from model_bundle import save_classifier_bundle
+from feature_pipeline import FeatureSpec, compute_features
+from temporal_join import join_alerts
+from synthetic_data import generate_frame
+
+FEATURE_SPEC = FeatureSpec(
+    calendar=('hour', 'minute', 'day_of_year', 'month', 'day', 'day_of_week'),
+    time_of_day=True,
+    rolling_window=24
+)
+
+def load_data(from_csv=True, csv_path='alert_analysis_data.csv', store=None, station_id=None, start_date=None, end_date=None):
     """
     Load alert and tide data either from MongoDB or from a CSV file
+
+    With a ReadingsStore the CSV is imported into the store (only when it changed) and
+    only the partitions of the requested station and time range are read back.
     """
     if from_csv:
+        if store is not None:
+            data = store.read_csv(csv_path, station_id, start_date, end_date)
+            if data is not None:
+                return data
+        
         try:
             return pd.read_csv(csv_path)
         except FileNotFoundError:
@@ -77,14 +89,7 @@ def load_data(from_csv=True, csv_path='alert_analysis_data.csv'):
             alert_df = pd.DataFrame(alert_data)
             reading_df = pd.DataFrame(reading_data)
             
-            merged_data = pd.merge_asof(
-                reading_df.sort_values('ts'),
-                alert_df.sort_values('ts'),
-                on='ts',
-                by='stationId',
-                direction='nearest',
-                tolerance=pd.Timedelta('1h')
-            )
+            merged_data = join_alerts(reading_df.sort_values('ts'), alert_df)
             
             merged_data['has_alert'] = ~merged_data['alert_id'].isna()
             
@@ -98,141 +103,9 @@ def load_data(from_csv=True, csv_path='alert_analysis_data.csv'):
 
 def create_sample_data(n_days=60, n_stations=3):
     """
-    Create sample data for alert pattern analysis
+    Create sample data for alert pattern analysis (see synthetic_data.py)
     """
-    np.random.seed(42)
-    
-    end_time = pd.Timestamp.now()
-    start_time = end_time - pd.Timedelta(days=n_days)
-    timestamps = pd.date_range(start=start_time, end=end_time, freq='15min')
-    
-    stations = [
-        {
-            'stationId': f'station-{i+1}',
-            'stationName': f'Station {i+1}',
-            'latitude': 50.5 + np.random.rand() * 5,
-            'longitude': -5.5 + np.random.rand() * 5
-        } for i in range(n_stations)
-    ]
-    
-    alert_types = ['HIGH_TIDE', 'LOW_TIDE', 'RAPID_RISE', 'RAPID_FALL']
-    alert_severities = ['low', 'medium', 'high']
-    
-    data = []
-    alert_id_counter = 1
-    
-    for station in stations:
-        time_values = np.linspace(0, 2*np.pi*n_days/2, len(timestamps))  # n_days/2 complete cycles
-        
-        phase_offset = np.random.rand() * np.pi  # Random phase offset
-        amplitude = 1.5 + np.random.rand() * 1.0  # Random amplitude between 1.5 and 2.5
-        
-        heights = amplitude * np.sin(time_values + phase_offset)
-        
-        heights += 0.3 * np.sin(time_values/2 + np.random.rand() * np.pi)
-        
-        heights += 0.5 * np.sin(time_values / (n_days/2) + np.random.rand() * np.pi)
-        
-        heights += 0.1 * np.random.randn(len(timestamps))
-        
-        spring_neap_factor = 0.4 * np.sin(time_values * (2/14.77) + np.random.rand() * np.pi)
-        heights *= (1 + spring_neap_factor)
-        
-        rate_of_change = np.diff(heights, prepend=heights[0])
-        
-        high_tide_threshold = 2.0
-        low_tide_threshold = -0.5
-        rapid_rise_threshold = 0.3
-        rapid_fall_threshold = -0.3
-        
-        alerts = []
-        
-        for i, (ts, height, roc) in enumerate(zip(timestamps, heights, rate_of_change)):
-            # High tide alert
-            if height > high_tide_threshold:
-                alerts.append({
-                    'alert_id': f'alert-{alert_id_counter}',
-                    'ts': ts,
-                    'stationId': station['stationId'],
-                    'type': 'HIGH_TIDE',
-                    'message': f"High tide alert for {station['stationName']}",
-                    'acknowledged': np.random.choice([True, False], p=[0.7, 0.3]),
-                    'severity': np.random.choice(alert_severities, p=[0.2, 0.5, 0.3]),
-                    'kind': 'tide',
-                    'area': f"Area near {station['stationName']}"
-                })
-                alert_id_counter += 1
-            
-            elif height < low_tide_threshold:
-                alerts.append({
-                    'alert_id': f'alert-{alert_id_counter}',
-                    'ts': ts,
-                    'stationId': station['stationId'],
-                    'type': 'LOW_TIDE',
-                    'message': f"Low tide alert for {station['stationName']}",
-                    'acknowledged': np.random.choice([True, False], p=[0.7, 0.3]),
-                    'severity': np.random.choice(alert_severities, p=[0.3, 0.5, 0.2]),
-                    'kind': 'tide',
-                    'area': f"Area near {station['stationName']}"
-                })
-                alert_id_counter += 1
-            
-            elif roc > rapid_rise_threshold:
-                alerts.append({
-                    'alert_id': f'alert-{alert_id_counter}',
-                    'ts': ts,
-                    'stationId': station['stationId'],
-                    'type': 'RAPID_RISE',
-                    'message': f"Rapid tide rise alert for {station['stationName']}",
-                    'acknowledged': np.random.choice([True, False], p=[0.6, 0.4]),
-                    'severity': np.random.choice(alert_severities, p=[0.1, 0.4, 0.5]),
-                    'kind': 'tide',
-                    'area': f"Area near {station['stationName']}"
-                })
-                alert_id_counter += 1
-            
-            elif roc < rapid_fall_threshold:
-                alerts.append({
-                    'alert_id': f'alert-{alert_id_counter}',
-                    'ts': ts,
-                    'stationId': station['stationId'],
-                    'type': 'RAPID_FALL',
-                    'message': f"Rapid tide fall alert for {station['stationName']}",
-                    'acknowledged': np.random.choice([True, False], p=[0.6, 0.4]),
-                    'severity': np.random.choice(alert_severities, p=[0.2, 0.5, 0.3]),
-                    'kind': 'tide',
-                    'area': f"Area near {station['stationName']}"
-                })
-                alert_id_counter += 1
-            
-            data.append({
-                'reading_id': f"{station['stationId']}-{i}",
-                'ts': ts,
-                'height': height,
-                'rate_of_change': roc,
-                'type': 'prediction',
-                'stationId': station['stationId'],
-                'stationName': station['stationName'],
-                'latitude': station['latitude'],
-                'longitude': station['longitude'],
-                'has_alert': False  # Will be updated later
-            })
-            
-        for alert in alerts:
-            # Find the closest reading by timestamp
-            closest_idx = np.argmin(np.abs([(ts - alert['ts']).total_seconds() for ts in timestamps]))
-            
-            # Update the reading with alert information
-            data[closest_idx]['has_alert'] = True
-            data[closest_idx]['alert_id'] = alert['alert_id']
-            data[closest_idx]['alert_type'] = alert['type']
-            data[closest_idx]['message'] = alert['message']
-            data[closest_idx]['acknowledged'] = alert['acknowledged']
-            data[closest_idx]['severity'] = alert['severity']
-            data[closest_idx]['kind'] = alert['kind']
-            data[closest_idx]['area'] = alert['area']
-    
-    df = pd.DataFrame(data)
+    df = generate_frame(n_days=n_days, n_stations=n_stations)
     
     df.to_csv('alert_analysis_data.csv', index=False)
     
@@ -240,41 +113,17 @@ def create_sample_data(n_days=60, n_stations=3):
 
 def preprocess_data(data):
     """
-    Preprocess the data for alert pattern analysis
+    Preprocess the data for alert pattern analysis (see feature_pipeline.py)
     """
-    if isinstance(data['ts'].iloc[0], str):
-        data['ts'] = pd.to_datetime(data['ts'])
-    
-    data['hour'] = data['ts'].dt.hour
-    data['minute'] = data['ts'].dt.minute
-    data['day_of_year'] = data['ts'].dt.dayofyear
-    data['month'] = data['ts'].dt.month
-    data['day'] = data['ts'].dt.day
-    data['day_of_week'] = data['ts'].dt.dayofweek
-    
-    data['time_of_day'] = data['hour'] + data['minute'] / 60
-    
-    if 'rate_of_change' not in data.columns:
-        data = data.sort_values(['stationId', 'ts'])
-        data['rate_of_change'] = data.groupby('stationId')['height'].diff()
-    
-    data['height_rolling_mean'] = data.groupby('stationId')['height'].transform(
-        lambda x: x.rolling(window=24, min_periods=1).mean()
-    )
-    data['height_rolling_std'] = data.groupby('stationId')['height'].transform(
-        lambda x: x.rolling(window=24, min_periods=1).std()
-    )
-    
-    data['height_zscore'] = (data['height'] - data['height_rolling_mean']) / data['height_rolling_std'].replace(0, 1)
-    
-    data = data.dropna()
-    
-    return data
+    return compute_features(data, FEATURE_SPEC)
 
 def analyze_alert_frequency(data):
     """
     Analyze the frequency of alerts by type, station, and time
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     os.makedirs('visualizations', exist_ok=True)
     
     alert_data = data[data['has_alert'] == True].copy()
@@ -367,6 +216,8 @@ def analyze_alert_distribution(data):
     """
     Analyze the distribution of alerts by tide height and rate of change
     """
+    import matplotlib.pyplot as plt
+    
     os.makedirs('visualizations', exist_ok=True)
     
     plt.figure(figsize=(12, 8))
@@ -498,6 +349,10 @@ def analyze_alert_patterns(data):
     """
     Analyze patterns of alerts over time
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    import seaborn as sns
+    
     # Create output directory
     os.makedirs('visualizations', exist_ok=True)
     
@@ -601,6 +456,9 @@ def analyze_alert_acknowledgment(data):
     """
     Analyze patterns of alert acknowledgment
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     # Create output directory
     os.makedirs('visualizations', exist_ok=True)
     
@@ -683,6 +541,9 @@ def analyze_alert_correlations(data):
     """
     Analyze correlations between alerts and tide features
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     # Create output directory
     os.makedirs('visualizations', exist_ok=True)
     
@@ -744,6 +605,13 @@ def build_alert_prediction_model(data):
     """
     Build a predictive model for alerts based on tide features
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report, confusion_matrix
+    
     # Create output directory
     os.makedirs('models', exist_ok=True)
     
@@ -829,11 +697,9 @@ def build_alert_prediction_model(data):
     plt.savefig('visualizations/alert_feature_importance.png')
     plt.close()
     
-    # Save model and scaler
-    import joblib
-    joblib.dump(model, 'models/alert_prediction_model.pkl')
-    joblib.dump(scaler, 'models/alert_prediction_scaler.pkl')
-    joblib.dump(features, 'models/alert_prediction_features.pkl')
+    # Save model, scaler and features as one bundle
+    save_classifier_bundle('models/alert_prediction_model.bundle', model, scaler, features,
+                           kind='alert_prediction_classifier')
     
     print("Alert prediction model saved")
     
@@ -933,7 +799,7 @@ def generate_alert_insights(data, model=None, scaler=None, features=None):
     print("Alert insights saved to 'insights/alert_insights.md'")
 
 # Main function
-def main():
+def main(store_dir=None, station_id=None, start_date=None, end_date=None):
     print("Coastle Alert - Alert Pattern Analysis")
     print("=====================================")
     
@@ -944,7 +810,8 @@ def main():
     
     # Load data
     print("\nLoading alert and tide data...")
-    data = load_data(from_csv=True)
+    store = ReadingsStore(store_dir, dataset='alert_analysis_data') if store_dir else None
+    data = load_data(from_csv=True, store=store, station_id=station_id, start_date=start_date, end_date=end_date)
     print(f"Loaded {len(data)} data points.")
     
     # Preprocess data
@@ -982,4 +849,13 @@ def main():
     print("\nAlert pattern analysis complete!")
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Coastle Alert - Alert Pattern Analysis')
+    parser.add_argument('--store', type=str, help='Read through the local columnar readings store in this directory')
+    parser.add_argument('--station', type=str, help='Only analyze this station (with --store)')
+    parser.add_argument('--start', type=str, help='Start of the time range, e.g. 2024-01-01 (with --store)')
+    parser.add_argument('--end', type=str, help='End of the time range (with --store)')
+    args = parser.parse_args()
+    
+    main(store_dir=args.store, station_id=args.station, start_date=args.start, end_date=args.end)
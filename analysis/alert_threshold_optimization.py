@@ -1,23 +1,48 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from sklearn.model_selection import GridSearchCV, train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report, confusion_matrix, precision_recall_curve
-from sklearn.preprocessing import StandardScaler
-import joblib
 import os
 import sys
 
 # Add the parent directory to sys.path to import from backend
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from readings_store import ReadingsStore
+from model_bundle import save_classifier_bundle, load_classifier_bundle
+from feature_pipeline import FeatureSpec, compute_features
+from temporal_join import join_alerts
+from alert_lookup import export_alert_lookup
+from threshold_sweep import DEFAULT_COSTS, optimize_thresholds, by_type
+
+# Model, scaler, features and thresholds in one memory-mappable file (see model_bundle.py)
+ALERT_BUNDLE_PATH = os.path.join('models', 'alert_threshold_model.bundle')
+
+# Calendar, cyclical and 12-sample rolling features, ordered by time across stations
+FEATURE_SPEC = FeatureSpec(cyclical=True, rolling_window=12, sort_by=('ts',))
+
+# Alert types and the columns flagging them; readings without them are one type, ALL
+ALERT_TYPE_COLUMNS = {'HIGH_TIDE': 'high_tide_alert', 'LOW_TIDE': 'low_tide_alert'}
+
+# Costs of false alarms and missed alerts per alert type (see threshold_sweep.py); a missed
+# high tide, i.e. a flood without warning, costs the most
+ALERT_COSTS = {
+    'HIGH_TIDE': [[0.0, 1.0], [20.0, 0.0]],
+    'default': DEFAULT_COSTS
+}
+
 # Function to load data
-def load_data(from_csv=True, csv_path='alert_data.csv'):
+def load_data(from_csv=True, csv_path='alert_data.csv', store=None, station_id=None, start_date=None, end_date=None):
     """
     Load alert and tide data either from MongoDB or from a CSV file
+
+    With a ReadingsStore the CSV is imported into the store (only when it changed) and
+    only the partitions of the requested station and time range are read back.
     """
     if from_csv:
+        if store is not None:
+            data = store.read_csv(csv_path, station_id, start_date, end_date)
+            if data is not None:
+                return data
+        
         try:
             return pd.read_csv(csv_path)
         except FileNotFoundError:
@@ -78,14 +103,7 @@ def load_data(from_csv=True, csv_path='alert_data.csv'):
             reading_df = pd.DataFrame(reading_data)
             
             # Merge data to create a dataset with readings and whether they triggered alerts
-            merged_data = pd.merge_asof(
-                reading_df.sort_values('ts'),
-                alert_df.sort_values('ts'),
-                on='ts',
-                by='stationId',
-                direction='nearest',
-                tolerance=pd.Timedelta('1h')
-            )
+            merged_data = join_alerts(reading_df.sort_values('ts'), alert_df)
             
             # Create alert flag
             merged_data['alert_triggered'] = ~merged_data['alert_id'].isna()
@@ -156,53 +174,27 @@ def create_sample_data(n_samples=2000):
 def preprocess_data(data):
     """
     Preprocess the data for alert threshold optimization
+
+    The features are computed by the shared pipeline (see feature_pipeline.py) and memoized,
+    so the repeated calls in main() on the same data reuse the first result. data is not modified.
     """
-    # Convert timestamp to datetime if it's not already
-    if isinstance(data['ts'].iloc[0], str):
-        data['ts'] = pd.to_datetime(data['ts'])
-    
-    # Extract time-based features
-    data['hour'] = data['ts'].dt.hour
-    data['minute'] = data['ts'].dt.minute
-    data['day_of_year'] = data['ts'].dt.dayofyear
-    data['month'] = data['ts'].dt.month
-    
-    # Calculate time of day in radians (for cyclical features)
-    data['time_rad'] = 2 * np.pi * (data['hour'] * 60 + data['minute']) / (24 * 60)
-    data['sin_time'] = np.sin(data['time_rad'])
-    data['cos_time'] = np.cos(data['time_rad'])
-    
-    # Calculate day of year in radians (for seasonal patterns)
-    data['day_rad'] = 2 * np.pi * data['day_of_year'] / 365.25
-    data['sin_day'] = np.sin(data['day_rad'])
-    data['cos_day'] = np.cos(data['day_rad'])
-    
-    # Calculate rate of change if not already present
-    if 'rate_of_change' not in data.columns:
-        data = data.sort_values('ts')
-        data['rate_of_change'] = data.groupby('stationId')['height'].diff()
-    
-    # Calculate rolling statistics
-    data['height_rolling_mean'] = data.groupby('stationId')['height'].transform(
-        lambda x: x.rolling(window=12, min_periods=1).mean()
-    )
-    data['height_rolling_std'] = data.groupby('stationId')['height'].transform(
-        lambda x: x.rolling(window=12, min_periods=1).std()
-    )
-    
-    # Calculate z-score
-    data['height_zscore'] = (data['height'] - data['height_rolling_mean']) / data['height_rolling_std'].replace(0, 1)
-    
-    # Drop rows with NaN values
-    data = data.dropna()
-    
-    return data
+    return compute_features(data, FEATURE_SPEC)
 
 # Function to train the model
-def train_threshold_model(data):
+def train_threshold_model(data, search='halving', max_fits=None, max_seconds=None,
+                          search_state_path='models/alert_threshold_search.json'):
     """
     Train a Random Forest model to predict when alerts should be triggered
+
+    search='halving' runs a budgeted, resumable successive-halving search (bounded by
+    max_fits / max_seconds); search='grid' runs the exhaustive GridSearchCV.
     """
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import GridSearchCV, train_test_split
+    from sklearn.metrics import classification_report, confusion_matrix
+    from hyperparameter_search import SuccessiveHalvingSearch
+    
     # Preprocess data
     processed_data = preprocess_data(data)
     
@@ -230,19 +222,36 @@ def train_threshold_model(data):
         'class_weight': [None, 'balanced']
     }
     
-    grid_search = GridSearchCV(
-        RandomForestClassifier(random_state=42),
-        param_grid,
-        cv=5,
-        scoring='f1',
-        n_jobs=-1
-    )
-    
-    grid_search.fit(X_train_scaled, y_train)
-    
-    # Get best model
-    best_model = grid_search.best_estimator_
-    print(f"Best parameters: {grid_search.best_params_}")
+    if search == 'halving':
+        halving_search = SuccessiveHalvingSearch(
+            RandomForestClassifier(random_state=42),
+            param_grid,
+            scoring='f1',
+            max_fits=max_fits,
+            max_seconds=max_seconds,
+            state_path=search_state_path,
+            random_state=42
+        )
+        
+        halving_search.fit(X_train_scaled, y_train)
+        
+        # Get best model
+        best_model = halving_search.best_estimator_
+        halving_search.print_report()
+    else:
+        grid_search = GridSearchCV(
+            RandomForestClassifier(random_state=42),
+            param_grid,
+            cv=5,
+            scoring='f1',
+            n_jobs=-1
+        )
+        
+        grid_search.fit(X_train_scaled, y_train)
+        
+        # Get best model
+        best_model = grid_search.best_estimator_
+        print(f"Best parameters: {grid_search.best_params_}")
     
     # Evaluate model
     y_pred = best_model.predict(X_test_scaled)
@@ -254,11 +263,9 @@ def train_threshold_model(data):
     print("\nConfusion Matrix:")
     print(cm)
     
-    # Save model and scaler
+    # Save model, scaler and features; main() adds the thresholds once they are known
     os.makedirs('models', exist_ok=True)
-    joblib.dump(best_model, 'models/alert_threshold_model.pkl')
-    joblib.dump(scaler, 'models/alert_threshold_scaler.pkl')
-    joblib.dump(features, 'models/alert_threshold_features.pkl')
+    save_classifier_bundle(ALERT_BUNDLE_PATH, best_model, scaler, features)
     
     return best_model, scaler, features, X_test_scaled, y_test
 
@@ -267,6 +274,8 @@ def find_optimal_thresholds(model, X_test_scaled, y_test):
     """
     Find optimal probability thresholds for alert generation
     """
+    from sklearn.metrics import precision_recall_curve
+    
     # Get probability predictions
     y_proba = model.predict_proba(X_test_scaled)[:, 1]
     
@@ -283,8 +292,10 @@ def find_optimal_thresholds(model, X_test_scaled, y_test):
     
     print(f"\nOptimal threshold: {best_threshold:.4f} (F1: {best_f1:.4f})")
     
-    # Find high-precision threshold (for critical alerts)
-    high_precision_idx = np.argmax(precision[recall >= 0.5])
+    # Find high-precision threshold (for critical alerts); precision / recall have one more
+    # entry than thresholds, and the argmax is taken over candidate indices into thresholds
+    candidates = np.flatnonzero(recall[:-1] >= 0.5)
+    high_precision_idx = candidates[np.argmax(precision[candidates])] if len(candidates) else len(thresholds)
     high_precision_threshold = thresholds[high_precision_idx] if high_precision_idx < len(thresholds) else 0.7
     
     print(f"High-precision threshold: {high_precision_threshold:.4f} "
@@ -292,7 +303,8 @@ def find_optimal_thresholds(model, X_test_scaled, y_test):
           f"Recall: {recall[high_precision_idx]:.4f})")
     
     # Find high-recall threshold (for catching all potential alerts)
-    high_recall_idx = np.argmax(recall[precision >= 0.5])
+    candidates = np.flatnonzero(precision[:-1] >= 0.5)
+    high_recall_idx = candidates[np.argmax(recall[candidates])] if len(candidates) else len(thresholds)
     high_recall_threshold = thresholds[high_recall_idx] if high_recall_idx < len(thresholds) else 0.3
     
     print(f"High-recall threshold: {high_recall_threshold:.4f} "
@@ -306,15 +318,40 @@ def find_optimal_thresholds(model, X_test_scaled, y_test):
         'high_recall': high_recall_threshold
     }
     
-    joblib.dump(thresholds_dict, 'models/alert_thresholds.pkl')
-    
     return thresholds_dict, precision, recall, thresholds
 
+# Function to find thresholds per station and alert type
+def optimize_station_thresholds(model, scaler, features, data, costs=ALERT_COSTS):
+    """
+    Cost-optimal probability thresholds per station and alert type on the held-out readings
+
+    All (station, alert type) groups are optimized in one vectorized sweep (see threshold_sweep.py);
+    groups with too few readings or alerts use the threshold optimized over all stations.
+    """
+    from sklearn.model_selection import train_test_split
+    
+    # Same held-out split as train_threshold_model
+    processed = preprocess_data(data)
+    _, test = train_test_split(processed, test_size=0.2, random_state=42)
+    test = test.assign(probability=model.predict_proba(scaler.transform(test[features]))[:, 1])
+    
+    types = {name: column for name, column in ALERT_TYPE_COLUMNS.items() if column in test}
+    table = optimize_thresholds(by_type(test, 'probability', types or {'ALL': 'alert_triggered'}), costs=costs)
+    
+    os.makedirs('recommendations', exist_ok=True)
+    table.to_csv('recommendations/alert_thresholds_by_station.csv', index=False)
+    print(f"Thresholds of {len(table)} station / alert type groups saved to "
+          f"'recommendations/alert_thresholds_by_station.csv' ({table['fallback'].sum()} use the overall threshold)")
+    
+    return table
+
 # Function to visualize results
 def visualize_results(data, model, scaler, features, thresholds_dict, precision, recall, thresholds):
     """
     Create visualizations of the threshold optimization results
     """
+    import matplotlib.pyplot as plt
+    
     # Create output directory
     os.makedirs('visualizations', exist_ok=True)
     
@@ -464,7 +501,8 @@ def generate_alert_recommendations(data, model, scaler, features, thresholds_dic
     return recommendations
 
 # Main function
-def main():
+def main(store_dir=None, station_id=None, start_date=None, end_date=None, search='halving',
+         max_fits=None, max_seconds=None):
     print("Coastle Alert - Alert Threshold Optimization")
     print("=========================================")
     
@@ -475,16 +513,20 @@ def main():
     
     # Load data
     print("\nLoading alert and tide data...")
-    data = load_data(from_csv=True)
+    store = ReadingsStore(store_dir, dataset='alert_data') if store_dir else None
+    data = load_data(from_csv=True, store=store, station_id=station_id, start_date=start_date, end_date=end_date)
     print(f"Loaded {len(data)} data points.")
     
     # Train model
     print("\nTraining alert threshold model...")
-    model, scaler, features, X_test_scaled, y_test = train_threshold_model(data)
+    model, scaler, features, X_test_scaled, y_test = train_threshold_model(
+        data, search=search, max_fits=max_fits, max_seconds=max_seconds
+    )
     
     # Find optimal thresholds
     print("\nFinding optimal alert thresholds...")
     thresholds_dict, precision, recall, thresholds = find_optimal_thresholds(model, X_test_scaled, y_test)
+    save_classifier_bundle(ALERT_BUNDLE_PATH, model, scaler, features, thresholds=thresholds_dict)
     
     # Visualize results
     print("\nCreating visualizations...")
@@ -492,9 +534,35 @@ def main():
     
     # Generate recommendations
     print("\nGenerating alert threshold recommendations...")
-    recommendations = generate_alert_recommendations(data, model, scaler, features, thresholds_dict)
+    # The bundle's flat forest answers the small predict_proba batches without scikit-learn's per-call overhead
+    flat_model, _, _, _ = load_classifier_bundle(ALERT_BUNDLE_PATH)
+    recommendations = generate_alert_recommendations(data, flat_model, scaler, features, thresholds_dict)
+    
+    # Cost-weighted thresholds per station and alert type
+    print("\nOptimizing thresholds per station and alert type...")
+    optimize_station_thresholds(flat_model, scaler, features, data)
+    
+    # Precomputed probabilities for alertService.js, which cannot run the forest (see alert_lookup.py)
+    print("\nExporting alert probability lookup...")
+    lookup = export_alert_lookup(flat_model, scaler, features, thresholds_dict, data)
+    agreement = lookup.accuracy['thresholds']['optimal']['agreement']
+    print(f"Lookup decisions agree with the model on {agreement:.1%} of held-out readings")
     
     print("\nAlert threshold optimization complete!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Coastle Alert - Alert Threshold Optimization')
+    parser.add_argument('--store', type=str, help='Read through the local columnar readings store in this directory')
+    parser.add_argument('--station', type=str, help='Only analyze this station (with --store)')
+    parser.add_argument('--start', type=str, help='Start of the time range, e.g. 2024-01-01 (with --store)')
+    parser.add_argument('--end', type=str, help='End of the time range (with --store)')
+    parser.add_argument('--search', type=str, choices=['grid', 'halving'], default='halving',
+                        help='Hyperparameter search for the threshold model')
+    parser.add_argument('--search-max-fits', type=int, help='Fit budget of the halving search')
+    parser.add_argument('--search-max-seconds', type=float, help='Time budget of the halving search in seconds')
+    args = parser.parse_args()
+    
+    main(store_dir=args.store, station_id=args.station, start_date=args.start, end_date=args.end,
+         search=args.search, max_fits=args.search_max_fits, max_seconds=args.search_max_seconds)
@@ -0,0 +1,359 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+import json
+import tempfile
+
+# Nanosecond constants used for epoch arithmetic
+HOUR_NS = 3600 * 10**9
+DAY_NS = 24 * HOUR_NS
+
+# Reference new moon used by the original moon phase approximation (2000-01-06)
+LEGACY_NEW_MOON_NS = 947116800 * 10**9
+SYNODIC_MONTH_DAYS = 29.53
+
+# J2000.0 epoch (2000-01-01 12:00 UTC) in nanoseconds since the Unix epoch
+J2000_NS = 946728000 * 10**9
+OBLIQUITY_RAD = np.deg2rad(23.4397)
+
+# Columns produced by the feature engine, in lookup table order
+ASTRO_FEATURES = ['moon_phase', 'lunar_phase', 'lunar_declination', 'solar_angle', 'spring_neap']
+
+# Default hourly lookup table, covering 1990-01-01 to 2060-01-01
+TABLE_START = '1990-01-01'
+TABLE_END = '2060-01-01'
+DEFAULT_TABLE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'astro', 'astro_hourly_1990_2060.npy'
+)
+
+# How table rows between two hourly rows are filled: moon_phase changes only at midnight UTC,
+# which lies on the hour grid, so the earlier row is exact; angles wrap at their period
+STEP_FEATURES = {'moon_phase'}
+PERIODIC_FEATURES = {'lunar_phase': 1.0, 'solar_angle': 2 * np.pi}
+
+_default_table = None
+_default_table_error = None
+
+
+def to_epoch_ns(ts):
+    """Convert timestamps to an int64 array of nanoseconds since the Unix epoch.
+
+    Args:
+        ts: A DatetimeIndex, datetime Series, array of datetime64 values or a list of datetimes.
+            Timezone-aware values are converted to UTC, naive values are assumed to be UTC.
+
+    Returns:
+        numpy.ndarray: int64 epoch nanoseconds.
+    """
+    if isinstance(ts, np.ndarray) and ts.dtype == np.int64:
+        return ts
+
+    index = pd.DatetimeIndex(ts)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+
+    return index.as_unit('ns').asi8
+
+
+def _days_since_j2000(epoch_ns):
+    return (np.asarray(epoch_ns, dtype=np.int64) - J2000_NS) / DAY_NS
+
+
+def _moon_ecliptic(d):
+    """Low-precision lunar ecliptic longitude and latitude (radians) for days since J2000."""
+    mean_longitude = np.deg2rad(218.316 + 13.176396 * d)
+    mean_anomaly = np.deg2rad(134.963 + 13.064993 * d)
+    latitude_argument = np.deg2rad(93.272 + 13.229350 * d)
+
+    longitude = mean_longitude + np.deg2rad(6.289) * np.sin(mean_anomaly)
+    latitude = np.deg2rad(5.128) * np.sin(latitude_argument)
+    return longitude, latitude
+
+
+def _sun_ecliptic_longitude(d):
+    """Low-precision solar ecliptic longitude (radians) for days since J2000."""
+    mean_anomaly = np.deg2rad(357.5291 + 0.98560028 * d)
+    center = np.deg2rad(
+        1.9148 * np.sin(mean_anomaly) + 0.02 * np.sin(2 * mean_anomaly) + 0.0003 * np.sin(3 * mean_anomaly)
+    )
+    return mean_anomaly + center + np.deg2rad(102.9372) + np.pi
+
+
+def _elongation(d):
+    """Moon-sun elongation in radians, wrapped to [0, 2*pi)."""
+    moon_longitude, _ = _moon_ecliptic(d)
+    return np.mod(moon_longitude - _sun_ecliptic_longitude(d), 2 * np.pi)
+
+
+def legacy_moon_phase(epoch_ns):
+    """Moon phase (0-1) using the original whole-day approximation.
+
+    Matches TidePredictionModel's historical per-row calculation exactly, so models
+    trained before the feature engine existed keep receiving the same inputs.
+
+    Args:
+        epoch_ns (numpy.ndarray): int64 epoch nanoseconds.
+
+    Returns:
+        numpy.ndarray: Moon phase values between 0 and 1.
+    """
+    days = np.floor_divide(np.asarray(epoch_ns, dtype=np.int64) - LEGACY_NEW_MOON_NS, DAY_NS)
+    return np.mod(days, SYNODIC_MONTH_DAYS) / SYNODIC_MONTH_DAYS
+
+
+def lunar_phase(epoch_ns):
+    """Lunar phase (0 = new moon, 0.5 = full moon) from the moon-sun elongation."""
+    return _elongation(_days_since_j2000(epoch_ns)) / (2 * np.pi)
+
+
+def lunar_declination(epoch_ns):
+    """Lunar declination in radians."""
+    longitude, latitude = _moon_ecliptic(_days_since_j2000(epoch_ns))
+    return np.arcsin(
+        np.sin(latitude) * np.cos(OBLIQUITY_RAD)
+        + np.cos(latitude) * np.sin(OBLIQUITY_RAD) * np.sin(longitude)
+    )
+
+
+def solar_angle(epoch_ns):
+    """Solar ecliptic longitude in radians, wrapped to [0, 2*pi)."""
+    return np.mod(_sun_ecliptic_longitude(_days_since_j2000(epoch_ns)), 2 * np.pi)
+
+
+def spring_neap_index(epoch_ns):
+    """Spring/neap index: 1 at spring tides (new/full moon), 0 at neap tides (quarters)."""
+    return 0.5 * (1 + np.cos(2 * _elongation(_days_since_j2000(epoch_ns))))
+
+
+_FEATURE_FUNCTIONS = {
+    'moon_phase': legacy_moon_phase,
+    'lunar_phase': lunar_phase,
+    'lunar_declination': lunar_declination,
+    'solar_angle': solar_angle,
+    'spring_neap': spring_neap_index,
+}
+
+
+def compute_features(epoch_ns, columns=None):
+    """Compute astronomical features for a block of timestamps.
+
+    Args:
+        epoch_ns (numpy.ndarray): int64 epoch nanoseconds.
+        columns (list, optional): Features to compute. Defaults to all of ASTRO_FEATURES.
+
+    Returns:
+        dict: Mapping of feature name to float64 array.
+    """
+    columns = ASTRO_FEATURES if columns is None else columns
+    epoch_ns = np.asarray(epoch_ns, dtype=np.int64)
+
+    # The elongation is shared by phase and spring/neap, compute it once
+    features = {}
+    elongation = None
+    for column in columns:
+        if column in ('lunar_phase', 'spring_neap'):
+            if elongation is None:
+                elongation = _elongation(_days_since_j2000(epoch_ns))
+            if column == 'lunar_phase':
+                features[column] = elongation / (2 * np.pi)
+            else:
+                features[column] = 0.5 * (1 + np.cos(2 * elongation))
+        else:
+            features[column] = _FEATURE_FUNCTIONS[column](epoch_ns)
+
+    return features
+
+
+class AstroLookupTable:
+    """Memory-mapped hourly table of precomputed astronomical features."""
+
+    def __init__(self, path=DEFAULT_TABLE_PATH):
+        """Open a lookup table previously written by build_lookup_table.
+
+        Args:
+            path (str, optional): Path to the .npy table.
+        """
+        self.path = path
+        self.values = np.load(path, mmap_mode='r')
+
+        with open(path + '.json') as f:
+            meta = json.load(f)
+
+        self.start_ns = meta['start_ns']
+        self.step_ns = meta['step_ns']
+        self.columns = meta['columns']
+        self._column_index = {name: i for i, name in enumerate(self.columns)}
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def lookup(self, epoch_ns, columns=None):
+        """Fetch features by index arithmetic.
+
+        Timestamps between two table rows are interpolated linearly (moon_phase, constant
+        within a day, takes the earlier row; wrapping angles interpolate the short way
+        round). Only timestamps outside the table range are computed directly.
+
+        Args:
+            epoch_ns (numpy.ndarray): int64 epoch nanoseconds.
+            columns (list, optional): Features to fetch. Defaults to all table columns.
+
+        Returns:
+            dict: Mapping of feature name to float64 array.
+        """
+        columns = self.columns if columns is None else columns
+        epoch_ns = np.asarray(epoch_ns, dtype=np.int64)
+        rows, remainder = np.divmod(epoch_ns - self.start_ns, self.step_ns)
+        # The next row is needed for interpolation unless the timestamp sits on a row
+        inside = (rows >= 0) & ((rows < len(self) - 1) | ((rows == len(self) - 1) & (remainder == 0)))
+
+        hit = np.flatnonzero(inside)
+        lower = self.values[rows[hit]]
+        upper = self.values[np.minimum(rows[hit] + 1, len(self) - 1)]
+        fraction = remainder[hit] / self.step_ns
+
+        features = {}
+        for name in columns:
+            values = np.empty(len(epoch_ns))
+            i = self._column_index[name]
+            low = np.asarray(lower[:, i], dtype=np.float64)
+            if name in STEP_FEATURES:
+                values[hit] = low
+            else:
+                change = np.asarray(upper[:, i], dtype=np.float64) - low
+                period = PERIODIC_FEATURES.get(name)
+                if period is not None:
+                    change = np.mod(change + period / 2, period) - period / 2
+                    values[hit] = np.mod(low + fraction * change, period)
+                else:
+                    values[hit] = low + fraction * change
+            features[name] = values
+
+        if len(hit) < len(epoch_ns):
+            missed = np.flatnonzero(~inside)
+            for name, values in compute_features(epoch_ns[missed], columns).items():
+                features[name][missed] = values
+        return features
+
+
+def build_lookup_table(path=DEFAULT_TABLE_PATH, start=TABLE_START, end=TABLE_END, chunk_hours=24 * 365):
+    """Precompute the hourly astronomical feature table and write it as a .npy file.
+
+    Args:
+        path (str, optional): Output path for the table.
+        start (str, optional): First timestamp in the table (UTC).
+        end (str, optional): End of the table range (UTC, exclusive).
+        chunk_hours (int, optional): Rows computed per block, bounding peak memory.
+
+    Returns:
+        AstroLookupTable: The freshly written table, memory-mapped.
+    """
+    start_ns = int(pd.Timestamp(start).as_unit('ns').value)
+    end_ns = int(pd.Timestamp(end).as_unit('ns').value)
+    n_rows = (end_ns - start_ns) // HOUR_NS
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    # Write to a temporary file first so readers never see a half-built table; the name is
+    # unique so processes building the table at the same time do not share a memmap
+    fd, tmp_path = tempfile.mkstemp(suffix='.npy', prefix=os.path.basename(path) + '.',
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    table = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(n_rows, len(ASTRO_FEATURES)))
+
+    for first in range(0, n_rows, chunk_hours):
+        last = min(first + chunk_hours, n_rows)
+        epoch_ns = start_ns + np.arange(first, last, dtype=np.int64) * HOUR_NS
+        features = compute_features(epoch_ns)
+        for i, name in enumerate(ASTRO_FEATURES):
+            table[first:last, i] = features[name]
+
+    table.flush()
+    del table
+
+    fd, tmp_meta = tempfile.mkstemp(suffix='.json', prefix=os.path.basename(path) + '.',
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'start_ns': start_ns, 'step_ns': HOUR_NS, 'columns': ASTRO_FEATURES}, f)
+    os.replace(tmp_meta, path + '.json')
+    os.replace(tmp_path, path)
+
+    return AstroLookupTable(path)
+
+
+def get_default_table(build=False):
+    """Return the shared default lookup table.
+
+    The table is only built when asked to (astronomical_features.py --build, or the
+    prediction server at startup); feature requests never build it implicitly. A failure to
+    open or build it is remembered, so later calls compute directly without retrying.
+
+    Args:
+        build (bool, optional): Build the table if it does not exist yet.
+
+    Returns:
+        AstroLookupTable: The table, or None if it is unavailable.
+    """
+    global _default_table, _default_table_error
+
+    if _default_table is None and _default_table_error is None:
+        try:
+            if os.path.exists(DEFAULT_TABLE_PATH) and os.path.exists(DEFAULT_TABLE_PATH + '.json'):
+                _default_table = AstroLookupTable(DEFAULT_TABLE_PATH)
+            elif build:
+                _default_table = build_lookup_table(DEFAULT_TABLE_PATH)
+        except (OSError, ValueError) as e:
+            _default_table_error = e
+            print(f"Astronomical lookup table unavailable ({e}). Computing features directly.", file=sys.stderr)
+
+    return _default_table
+
+
+def astronomical_features(ts, columns=None, table='default'):
+    """Astronomical features for a block of timestamps as a DataFrame.
+
+    Timestamps inside the table range are served from the lookup table (interpolated
+    between hourly rows); anything else is computed directly with the vectorized formulas.
+
+    Args:
+        ts: Timestamps accepted by to_epoch_ns.
+        columns (list, optional): Features to return. Defaults to all of ASTRO_FEATURES.
+        table (AstroLookupTable, optional): Lookup table to use. Pass None to always compute.
+
+    Returns:
+        pandas.DataFrame: One column per feature, one row per timestamp.
+    """
+    epoch_ns = to_epoch_ns(ts)
+    columns = ASTRO_FEATURES if columns is None else list(columns)
+
+    if table == 'default':
+        table = get_default_table()
+
+    if table is not None:
+        features = table.lookup(epoch_ns, columns)
+    else:
+        features = compute_features(epoch_ns, columns)
+
+    return pd.DataFrame(features, columns=columns)
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Astronomical feature lookup table')
+    parser.add_argument('--build', action='store_true', help='Build the hourly lookup table')
+    parser.add_argument('--path', type=str, default=DEFAULT_TABLE_PATH, help='Path of the lookup table')
+    parser.add_argument('--start', type=str, default=TABLE_START, help='First timestamp in the table')
+    parser.add_argument('--end', type=str, default=TABLE_END, help='End of the table range')
+
+    args = parser.parse_args()
+
+    if args.build:
+        started = time.perf_counter()
+        table = build_lookup_table(args.path, start=args.start, end=args.end)
+        print(f"Built {len(table)} hourly rows in {time.perf_counter() - started:.2f}s -> {args.path}")
+    else:
+        parser.print_help()
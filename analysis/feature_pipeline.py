@@ -0,0 +1,272 @@
+import numpy as np
+import pandas as pd
+import sys
+import hashlib
+from collections import OrderedDict
+
+from grouped_rolling import grouped_rolling
+from tide_extrema import extrema_flags
+
+# Calendar fields derived from the ts column
+CALENDAR_FIELDS = {
+    'hour': lambda ts: ts.dt.hour,
+    'minute': lambda ts: ts.dt.minute,
+    'day_of_year': lambda ts: ts.dt.dayofyear,
+    'month': lambda ts: ts.dt.month,
+    'day': lambda ts: ts.dt.day,
+    'day_of_week': lambda ts: ts.dt.dayofweek,
+}
+
+
+class FeatureSpec:
+    def __init__(self, calendar=('hour', 'minute', 'day_of_year', 'month'), cyclical=False, time_of_day=False,
+                 rate_of_change='rate_of_change', keep_existing_rate=True, rolling_window=24,
+                 rolling_extremes=False, extrema_window=None, value_column='height', group_column='stationId',
+                 sort_by=('stationId', 'ts'), dropna=True):
+        """Declaration of the derived columns an analysis needs.
+
+        Every stage works per group (station) in ts order. Stages are memoized separately, so
+        two specs that share e.g. the calendar fields or a rolling window reuse each other's
+        columns on the same data.
+
+        Args:
+            calendar (tuple, optional): CALENDAR_FIELDS to add.
+            cyclical (bool, optional): Add time_rad / sin_time / cos_time and day_rad / sin_day / cos_day.
+            time_of_day (bool, optional): Add time_of_day in decimal hours.
+            rate_of_change (str, optional): Name of the per-group first difference of value_column,
+                or None to skip it.
+            keep_existing_rate (bool, optional): Keep a rate_of_change column already in the data.
+            rolling_window (int, optional): Window (in samples) of <value>_rolling_mean / _std / _zscore,
+                or None to skip them.
+            rolling_extremes (bool, optional): Also add <value>_rolling_min / _max over the same window.
+            extrema_window (int, optional): Centered window of the is_high_tide / is_low_tide flags,
+                or None to skip them.
+            value_column (str, optional): Measured column the statistics are computed on.
+            group_column (str, optional): Column identifying independent series.
+            sort_by (tuple, optional): Row order of the result.
+            dropna (bool, optional): Drop rows with any missing value, as the analyses always did.
+        """
+        unknown = set(calendar) - set(CALENDAR_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown calendar fields: {sorted(unknown)}")
+
+        self.calendar = tuple(calendar)
+        self.cyclical = cyclical
+        self.time_of_day = time_of_day
+        self.rate_of_change = rate_of_change
+        self.keep_existing_rate = keep_existing_rate
+        self.rolling_window = rolling_window
+        self.rolling_extremes = rolling_extremes
+        self.extrema_window = extrema_window
+        self.value_column = value_column
+        self.group_column = group_column
+        self.sort_by = tuple(sort_by)
+        self.dropna = dropna
+
+    def key(self):
+        """Hashable identity of the spec, part of the memoization key."""
+        return tuple(sorted(vars(self).items()))
+
+    def stages(self, columns):
+        """(stage key, compute function) pairs in column order for data with the given columns."""
+        value, group = self.value_column, self.group_column
+        stages = []
+        # Every key names the group column: work is sorted by it, so it fixes the row order
+        if self.calendar:
+            stages.append((('calendar', group, self.calendar), lambda work: _calendar(work, self.calendar)))
+        if self.time_of_day:
+            stages.append((('time_of_day', group), _time_of_day))
+        if self.cyclical:
+            stages.append((('cyclical', group), _cyclical))
+        if self.rate_of_change and not (self.keep_existing_rate and self.rate_of_change in columns):
+            name = self.rate_of_change
+            stages.append((('rate_of_change', value, group, name),
+                           lambda work: {name: work.groupby(group)[value].diff().to_numpy()}))
+        if self.rolling_window:
+            window = self.rolling_window
+            extremes = self.rolling_extremes
+            stages.append((('rolling', value, group, window, extremes),
+                           lambda work: _rolling_stats(work, value, group, window, extremes)))
+        if self.extrema_window:
+            window = self.extrema_window
+            stages.append((('extrema', value, group, window),
+                           lambda work: _tide_extrema(work, value, group, window)))
+        return stages
+
+
+def _calendar(work, fields):
+    return {field: CALENDAR_FIELDS[field](work['ts']).to_numpy() for field in fields}
+
+
+def _time_of_day(work):
+    return {'time_of_day': (work['ts'].dt.hour + work['ts'].dt.minute / 60).to_numpy()}
+
+
+def _cyclical(work):
+    # Time of day and day of year in radians, for daily and seasonal patterns
+    time_rad = 2 * np.pi * (work['ts'].dt.hour * 60 + work['ts'].dt.minute).to_numpy() / (24 * 60)
+    day_rad = 2 * np.pi * work['ts'].dt.dayofyear.to_numpy() / 365.25
+    return {
+        'time_rad': time_rad,
+        'sin_time': np.sin(time_rad),
+        'cos_time': np.cos(time_rad),
+        'day_rad': day_rad,
+        'sin_day': np.sin(day_rad),
+        'cos_day': np.cos(day_rad)
+    }
+
+
+def _rolling_stats(work, value, group, window, extremes):
+    # One vectorized pass over all groups (see grouped_rolling.py)
+    stats = grouped_rolling(work, value, group, window)
+    columns = {
+        f'{value}_rolling_mean': stats['mean'],
+        f'{value}_rolling_std': stats['std'],
+        f'{value}_zscore': stats['zscore']
+    }
+    if extremes:
+        columns[f'{value}_rolling_min'] = stats['min']
+        columns[f'{value}_rolling_max'] = stats['max']
+    return columns
+
+
+def _tide_extrema(work, value, group, window):
+    # Vectorized over all groups; work is sorted by group and ts (see tide_extrema.py)
+    codes, _ = pd.factorize(work[group])
+    is_high, is_low = extrema_flags(work[value].to_numpy(dtype=np.float64), codes, window)
+    return {'is_high_tide': is_high, 'is_low_tide': is_low}
+
+
+def frame_hash(df):
+    """Content hash of a DataFrame: column names, dtypes, index and values."""
+    digest = hashlib.sha1()
+    digest.update(repr([(str(name), str(dtype)) for name, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _nbytes(value):
+    """Memory held by a cached result frame or stage column dict."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return sum(int(pd.Series(values).memory_usage(deep=True, index=False)) for values in value.values())
+
+
+class FeaturePipeline:
+    def __init__(self, max_bytes=256 * 1024**2):
+        """Computes FeatureSpec columns with memoization.
+
+        Results are cached by (input content hash, spec) and the columns of every stage by
+        (input content hash, stage), so preprocessing the same data again, or with a spec that
+        shares stages, does not recompute rolling statistics over the full dataset. The input
+        frame is never modified.
+
+        Args:
+            max_bytes (int, optional): Memory budget of the cached results and stage columns (LRU);
+                the most recent entry is kept even if it alone exceeds it.
+        """
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, key):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return self._cache[key][0]
+        self.misses += 1
+        return None
+
+    def _put(self, key, value):
+        if key in self._cache:
+            self.resident_bytes -= self._cache.pop(key)[1]
+        size = _nbytes(value)
+        self._cache[key] = (value, size)
+        self.resident_bytes += size
+        while self.resident_bytes > self.max_bytes and len(self._cache) > 1:
+            _, (_, size) = self._cache.popitem(last=False)
+            self.resident_bytes -= size
+            self.evictions += 1
+
+    def compute(self, data, spec):
+        """Add the spec's derived columns to a copy of data.
+
+        Args:
+            data (pandas.DataFrame): Readings with ts, the group column and the value column.
+            spec (FeatureSpec): Columns to derive.
+
+        Returns:
+            pandas.DataFrame: New frame ordered by spec.sort_by, without NaN rows if spec.dropna.
+        """
+        data_key = frame_hash(data)
+        result_key = ('result', data_key, spec.key())
+        result = self._get(result_key)
+        if result is not None:
+            return result.copy()
+
+        work = data.copy()
+        if not pd.api.types.is_datetime64_any_dtype(work['ts']):
+            work['ts'] = pd.to_datetime(work['ts'])
+        # Stages run per group in ts order
+        work = work.sort_values([spec.group_column, 'ts'], kind='stable')
+
+        for stage_key, compute in spec.stages(work.columns):
+            columns = self._get(('stage', data_key, stage_key))
+            if columns is None:
+                columns = compute(work)
+                self._put(('stage', data_key, stage_key), columns)
+            for name, values in columns.items():
+                work[name] = values
+
+        if spec.sort_by != (spec.group_column, 'ts'):
+            work = work.sort_values(list(spec.sort_by), kind='stable')
+        if spec.dropna:
+            work = work.dropna()
+
+        self._put(result_key, work)
+        return work.copy()
+
+    def clear(self):
+        self._cache.clear()
+        self.resident_bytes = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._cache),
+            'resident_bytes': self.resident_bytes,
+            'max_bytes': self.max_bytes
+        }
+
+
+# Shared by every analysis running in this process
+default_pipeline = FeaturePipeline()
+
+
+def compute_features(data, spec):
+    """FeaturePipeline.compute on the process-wide default pipeline."""
+    return default_pipeline.compute(data, spec)
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Time the shared feature pipeline on a CSV export')
+    parser.add_argument('csv', type=str, help='CSV with ts, stationId and height columns')
+    parser.add_argument('--window', type=int, default=24, help='Rolling window in samples')
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.csv)
+    spec = FeatureSpec(cyclical=True, rolling_window=args.window)
+    for attempt in ('cold', 'memoized'):
+        started = time.perf_counter()
+        features = compute_features(data, spec)
+        print(f"{attempt}: {len(features)} rows in {1000 * (time.perf_counter() - started):.1f} ms",
+              file=sys.stderr)
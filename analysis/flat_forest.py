@@ -0,0 +1,352 @@
+import numpy as np
+import os
+import sys
+import time
+
+
+def node_dtype(dtype=np.float64):
+    """Record layout of one tree node: split threshold and feature, left and right child, and
+    whether a missing (NaN) feature value goes to the right child."""
+    return np.dtype({
+        'names': ['threshold', 'feature', 'left', 'right', 'missing_right'],
+        'formats': [np.dtype(dtype), np.int32, np.int32, np.int32, np.int32]
+    }, align=True)
+
+
+class FlatForest:
+    # Levels advanced between dropping (tree, sample) pairs that already reached a leaf
+    COMPACT_EVERY = 8
+
+    def __init__(self, nodes, value, roots, max_depth, n_features, classes=None):
+        """Random forest flattened into contiguous node arrays.
+
+        All trees share one node numbering. nodes[i] holds the split threshold and feature
+        and the left / right child of node i in a single record, so advancing a sample by one
+        level touches one cache line; value[i] is the leaf prediction. Leaves point back to
+        themselves with an infinite threshold, so every sample can be advanced through all
+        trees level by level without branching. NaN features follow missing_right, the
+        direction scikit-learn routes missing values at that split.
+
+        Build one with FlatForest.from_sklearn(forest).
+
+        Args:
+            nodes (numpy.ndarray): Node records, see node_dtype.
+            value (numpy.ndarray): Leaf value per node, shape (n_nodes,) or (n_nodes, n_classes).
+            roots (numpy.ndarray): Root node of every tree (int32).
+            max_depth (int): Depth of the deepest tree.
+            n_features (int): Number of input features.
+            classes (numpy.ndarray, optional): Class labels of a classifier forest.
+        """
+        self.nodes = nodes
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.classes_ = classes
+        self.n_features_in_ = self.n_features
+
+    @classmethod
+    def from_sklearn(cls, forest, dtype=np.float64):
+        """Export a fitted RandomForestRegressor or RandomForestClassifier.
+
+        Args:
+            forest: Fitted scikit-learn forest.
+            dtype (numpy.dtype, optional): Threshold and leaf value dtype. float32 shrinks the
+                model; thresholds are rounded down so splits stay exact for float32 input.
+
+        Returns:
+            FlatForest: The flattened forest.
+        """
+        dtype = np.dtype(dtype)
+        is_classifier = hasattr(forest, 'classes_')
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        n_nodes = int(sizes.sum())
+
+        nodes = np.zeros(n_nodes, dtype=node_dtype(dtype))
+        threshold = np.empty(n_nodes, dtype=np.float64)
+        value = np.empty((n_nodes, len(forest.classes_)) if is_classifier else n_nodes, dtype=np.float64)
+
+        for tree, offset, size in zip(trees, offsets, sizes):
+            block = slice(offset, offset + size)
+            own = np.arange(offset, offset + size, dtype=np.int32)
+            is_leaf = tree.children_left == -1
+
+            nodes['feature'][block] = np.where(is_leaf, 0, tree.feature)
+            nodes['left'][block] = np.where(is_leaf, own, tree.children_left + offset)
+            nodes['right'][block] = np.where(is_leaf, own, tree.children_right + offset)
+            threshold[block] = np.where(is_leaf, np.inf, tree.threshold)
+            missing_left = getattr(tree, 'missing_go_to_left', None)
+            if missing_left is not None:
+                nodes['missing_right'][block] = np.where(is_leaf, 0, np.asarray(missing_left) == 0)
+            else:
+                # Trees of scikit-learn before 1.3 send NaN right (NaN <= threshold is false)
+                nodes['missing_right'][block] = ~is_leaf
+
+            if is_classifier:
+                # Older scikit-learn versions store class counts instead of fractions
+                counts = tree.value[:, 0, :]
+                value[block] = counts / counts.sum(axis=1, keepdims=True)
+            else:
+                value[block] = tree.value[:, 0, 0]
+
+        if dtype == np.float32:
+            # sklearn compares float32 inputs against float64 thresholds; rounding the threshold
+            # down to the nearest float32 keeps x <= threshold identical for every float32 x
+            threshold32 = threshold.astype(np.float32)
+            too_high = threshold32.astype(np.float64) > threshold
+            threshold32[too_high] = np.nextafter(threshold32[too_high], np.float32(-np.inf))
+            nodes['threshold'] = threshold32
+        else:
+            nodes['threshold'] = threshold
+
+        return cls(
+            nodes=nodes,
+            value=value.astype(dtype),
+            roots=offsets.astype(np.int32),
+            max_depth=max(estimator.get_depth() for estimator in forest.estimators_),
+            n_features=forest.n_features_in_,
+            classes=np.asarray(forest.classes_) if is_classifier else None
+        )
+
+    @property
+    def nbytes(self):
+        """Resident size of the node arrays in bytes."""
+        return self.nodes.nbytes + self.value.nbytes + self.roots.nbytes
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X, chunk_size=4096):
+        """Leaf node reached by every sample in every tree.
+
+        Args:
+            X (array-like): Samples of shape (n_samples, n_features).
+            chunk_size (int, optional): Samples evaluated at once, bounding the working memory
+                to n_trees * chunk_size node indices.
+
+        Returns:
+            numpy.ndarray: Global leaf indices of shape (n_trees, n_samples).
+        """
+        # Same input precision as scikit-learn's tree traversal
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        has_missing = bool(np.isnan(X).any())
+        if has_missing and 'missing_right' not in self.nodes.dtype.names:
+            raise ValueError("Input contains NaN and this flat forest was exported without "
+                             "missing-value routing; re-export it with FlatForest.from_sklearn")
+        n_samples = len(X)
+        leaves = np.empty((self.n_trees, n_samples), dtype=np.int32)
+
+        for start in range(0, n_samples, chunk_size):
+            chunk = X[start:start + chunk_size]
+            flat_X = chunk.ravel()
+            # Offset of each (tree, sample) pair's row in the flattened chunk
+            row_offsets = np.tile(np.arange(len(chunk), dtype=np.int64) * self.n_features, self.n_trees)
+            nodes = np.repeat(self.roots, len(chunk))
+            pairs = np.arange(len(nodes))
+            reached = np.empty(len(nodes), dtype=np.int32)
+
+            depth = 0
+            while True:
+                # Advance every active (tree, sample) pair one level per step
+                for _ in range(self.COMPACT_EVERY):
+                    previous = nodes
+                    records = self.nodes.take(nodes)
+                    x = flat_X.take(row_offsets + records['feature'])
+                    go_right = x > records['threshold']
+                    if has_missing:
+                        go_right |= np.isnan(x) & (records['missing_right'] != 0)
+                    nodes = np.where(go_right, records['right'], records['left'])
+                depth += self.COMPACT_EVERY
+
+                if depth >= self.max_depth:
+                    reached[pairs] = nodes
+                    break
+
+                # Retire pairs sitting on a leaf so deep trees only cost for the samples still descending;
+                # only leaves point back to themselves
+                done = nodes == previous
+                reached[pairs[done]] = nodes[done]
+                active = ~done
+                nodes, row_offsets, pairs = nodes[active], row_offsets[active], pairs[active]
+                if not len(nodes):
+                    break
+
+            leaves[:, start:start + len(chunk)] = reached.reshape(self.n_trees, len(chunk))
+
+        return leaves
+
+    def tree_values(self, X, chunk_size=4096):
+        """Per-tree predictions, shape (n_trees, n_samples) or (n_trees, n_samples, n_classes)."""
+        return self.value[self.apply(X, chunk_size)]
+
+    def predict(self, X, chunk_size=4096):
+        """Forest prediction: mean leaf value for regressors, most probable class for classifiers."""
+        if self.classes_ is not None:
+            return self.classes_[np.argmax(self.predict_proba(X, chunk_size), axis=1)]
+        return self.tree_values(X, chunk_size).mean(axis=0, dtype=np.float64)
+
+    def predict_quantiles(self, X, quantiles=(0.1, 0.5, 0.9), chunk_size=4096):
+        """Forest mean and quantiles of the per-tree predictions of a regressor forest.
+        
+        Every chunk of rows is traversed once; its (n_trees, chunk_size) matrix of leaf values
+        yields both the mean and the quantiles, so memory stays bounded by the chunk. The
+        quantiles match np.quantile's default linear interpolation, computed by sorting the
+        tree values of each row, which is cheaper than np.quantile for a few dozen rows.
+        
+        Args:
+            X (array-like): Samples of shape (n_samples, n_features).
+            quantiles (sequence, optional): Quantiles in [0, 1].
+            chunk_size (int, optional): Samples evaluated at once.
+            
+        Returns:
+            tuple: (mean of shape (n_samples,), quantiles of shape (len(quantiles), n_samples))
+        """
+        if self.classes_ is not None:
+            raise ValueError("predict_quantiles is only available for regressor forests")
+        
+        quantiles = np.asarray(quantiles, dtype=np.float64)
+        if np.any((quantiles < 0) | (quantiles > 1)):
+            raise ValueError("Quantiles must be between 0 and 1")
+        
+        X = np.asarray(X)
+        mean = np.empty(len(X))
+        bands = np.empty((len(quantiles), len(X)))
+
+        # Ranks between which each quantile interpolates, shared by every row
+        position = quantiles * (self.n_trees - 1)
+        lower = np.floor(position).astype(np.intp)
+        upper = np.minimum(lower + 1, self.n_trees - 1)
+        weight = (position - lower)[:, None]
+
+        # One leaf-value buffer for all chunks
+        buffer = np.empty(self.n_trees * min(chunk_size, len(X)), dtype=self.value.dtype)
+        for start in range(0, len(X), chunk_size):
+            rows = slice(start, start + chunk_size)
+            leaves = self.apply(X[rows], chunk_size)
+            values = buffer[:leaves.size].reshape(leaves.shape)
+            np.take(self.value, leaves, out=values)
+            mean[rows] = values.mean(axis=0, dtype=np.float64)
+            values.sort(axis=0)
+            bands[:, rows] = values[lower] + weight * (values[upper] - values[lower])
+        
+        return mean, bands
+    
+    def predict_proba(self, X, chunk_size=4096):
+        """Class probabilities of a classifier forest, averaged over trees."""
+        if self.classes_ is None:
+            raise ValueError("predict_proba is only available for classifier forests")
+        return self.tree_values(X, chunk_size).mean(axis=0, dtype=np.float64)
+
+    def to_arrays(self):
+        """Node arrays and metadata as a dict of NumPy arrays (see from_arrays)."""
+        arrays = {
+            'nodes': self.nodes,
+            'value': self.value,
+            'roots': self.roots,
+            'meta': np.array([self.max_depth, self.n_features], dtype=np.int64)
+        }
+        if self.classes_ is not None:
+            arrays['classes'] = self.classes_
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild a forest from to_arrays output, e.g. memory-mapped views of a model bundle."""
+        max_depth, n_features = arrays['meta']
+        return cls(
+            nodes=arrays['nodes'],
+            value=arrays['value'],
+            roots=arrays['roots'],
+            max_depth=max_depth,
+            n_features=n_features,
+            classes=arrays['classes'] if 'classes' in arrays else None
+        )
+
+    def save(self, path):
+        """Write the node arrays to an uncompressed .npz file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        """Load a forest written by save."""
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls.from_arrays({name: arrays[name] for name in arrays.files})
+
+
+def benchmark(forest, X, repeat=200):
+    """Compare scikit-learn and flat-array inference latency, model size and output parity.
+
+    Args:
+        forest: Fitted scikit-learn forest.
+        X (array-like): Samples to predict, e.g. one 24-row station request.
+        repeat (int, optional): Timed repetitions per engine.
+
+    Returns:
+        dict: Median latencies in ms, model sizes in bytes and the maximum absolute difference.
+    """
+    import pickle
+
+    is_classifier = hasattr(forest, 'classes_')
+    results = {'rows': len(X), 'trees': len(forest.estimators_)}
+
+    for name, dtype in (('float64', np.float64), ('float32', np.float32)):
+        flat = FlatForest.from_sklearn(forest, dtype=dtype)
+        reference = forest.predict_proba(X) if is_classifier else forest.predict(X)
+        output = flat.predict_proba(X) if is_classifier else flat.predict(X)
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            flat.predict_proba(X) if is_classifier else flat.predict(X)
+            timings.append(time.perf_counter() - started)
+
+        results[f'flat_{name}_ms'] = 1000 * float(np.median(timings))
+        
+        if not is_classifier:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                flat.predict_quantiles(X)
+                timings.append(time.perf_counter() - started)
+            results[f'flat_{name}_quantiles_ms'] = 1000 * float(np.median(timings))
+        results[f'flat_{name}_bytes'] = flat.nbytes
+        results[f'flat_{name}_max_abs_diff'] = float(np.max(np.abs(output - reference)))
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        forest.predict_proba(X) if is_classifier else forest.predict(X)
+        timings.append(time.perf_counter() - started)
+    results['sklearn_ms'] = 1000 * float(np.median(timings))
+    results['sklearn_bytes'] = len(pickle.dumps(forest))
+
+    return results
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(description='Export a fitted forest to flat arrays')
+    parser.add_argument('model', type=str, help='joblib file with a fitted RandomForest')
+    parser.add_argument('--output', type=str, help='Path of the .npz export (default: next to the model)')
+    parser.add_argument('--float32', action='store_true', help='Store thresholds and leaf values as float32')
+    parser.add_argument('--benchmark', action='store_true', help='Compare latency, size and parity with scikit-learn')
+    parser.add_argument('--rows', type=int, default=24, help='Rows per benchmark call')
+    args = parser.parse_args()
+
+    forest = joblib.load(args.model)
+    flat = FlatForest.from_sklearn(forest, dtype=np.float32 if args.float32 else np.float64)
+    output = args.output or os.path.splitext(args.model)[0] + '.flat.npz'
+    flat.save(output)
+    print(f"Exported {flat.n_trees} trees ({flat.nbytes / 1024**2:.1f} MB, depth {flat.max_depth}) to {output}")
+
+    if args.benchmark:
+        X = np.random.RandomState(0).randn(args.rows, flat.n_features)
+        for key, value in benchmark(forest, X).items():
+            print(f"{key}: {value}", file=sys.stderr)
@@ -0,0 +1,220 @@
+import numpy as np
+import os
+import sys
+import json
+import math
+import time
+import hashlib
+import tempfile
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, cross_val_score
+
+
+class SuccessiveHalvingSearch:
+    def __init__(self, estimator, param_grid, scoring, cv=3, factor=3, min_resources=None,
+                 max_fits=None, max_seconds=None, state_path=None, random_state=42, n_jobs=-1):
+        """Budgeted successive-halving search over a parameter grid.
+
+        Every candidate is first cross-validated on a small random subsample of the training
+        rows; only the best 1/factor of each round advances to a round with factor times more
+        rows, until the survivors are scored on the full data. The search stops early once
+        max_fits estimator fits or max_seconds of search time are spent, and then picks the best
+        candidate of the largest round reached.
+
+        With a state_path every cross-validation score is written to disk as soon as it is
+        computed, so an interrupted or repeated run with the same grid and data reuses them
+        instead of refitting.
+
+        Args:
+            estimator: Unfitted scikit-learn estimator.
+            param_grid (dict): Grid of parameters, as for GridSearchCV.
+            scoring (str): Scikit-learn scoring name.
+            cv (int, optional): Cross-validation folds per candidate.
+            factor (int, optional): Candidates kept per round (1/factor) and rows added per round (x factor).
+            min_resources (int, optional): Rows used in the first round. Defaults to what lets the
+                last round use all rows.
+            max_fits (int, optional): Budget in estimator fits (cv fits per candidate evaluation).
+            max_seconds (float, optional): Budget in search seconds, accumulated across resumed runs.
+            state_path (str, optional): JSON file holding the search state.
+            random_state (int, optional): Seed for the subsamples and the estimator.
+            n_jobs (int, optional): Parallel jobs for cross-validation.
+        """
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.cv = cv
+        self.factor = factor
+        self.min_resources = min_resources
+        self.max_fits = max_fits
+        self.max_seconds = max_seconds
+        self.state_path = state_path
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+
+        self.best_params_ = None
+        self.best_score_ = None
+        self.best_estimator_ = None
+        self.time_to_best_ = None
+        self.n_fits_ = 0
+        self.elapsed_ = 0.0
+        self.resumed_evaluations_ = 0
+        self.budget_exhausted_ = False
+
+    def _signature(self, X, y):
+        """Identify the grid, scoring and data, so state from a different search is never reused."""
+        digest = hashlib.sha1()
+        digest.update(json.dumps({
+            'estimator': type(self.estimator).__name__,
+            'grid': self.param_grid,
+            'scoring': self.scoring,
+            'cv': self.cv,
+            'factor': self.factor,
+            'min_resources': self.min_resources,
+            'random_state': self.random_state
+        }, sort_keys=True, default=str).encode())
+        digest.update(np.ascontiguousarray(X).tobytes())
+        digest.update(np.ascontiguousarray(y).tobytes())
+        return digest.hexdigest()
+
+    def _load_state(self, signature):
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if state.get('signature') == signature:
+                return state
+            print(f"Ignoring search state in {self.state_path}: grid or data changed", file=sys.stderr)
+        return {'signature': signature, 'scores': {}, 'elapsed': 0.0, 'n_fits': 0, 'complete': False}
+
+    def _save_state(self, state):
+        if not self.state_path:
+            return
+        state_dir = os.path.dirname(os.path.abspath(self.state_path))
+        os.makedirs(state_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(self.state_path) + '.', dir=state_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _resources(self, n_samples, n_candidates):
+        """Rows used by each round."""
+        n_rounds = max(1, math.ceil(math.log(n_candidates, self.factor)) + 1) if n_candidates > 1 else 1
+        min_resources = self.min_resources or n_samples // self.factor ** (n_rounds - 1)
+        min_resources = max(min_resources, 2 * self.cv)
+
+        resources = []
+        for round_index in range(n_rounds):
+            resources.append(min(n_samples, min_resources * self.factor ** round_index))
+        resources[-1] = n_samples
+        return resources
+
+    def _out_of_budget(self, state, started):
+        if self.max_fits is not None and state['n_fits'] >= self.max_fits:
+            return True
+        if self.max_seconds is not None and state['elapsed'] + time.perf_counter() - started >= self.max_seconds:
+            return True
+        return False
+
+    def fit(self, X, y):
+        """Run (or resume) the search and refit the best candidate on all rows.
+
+        Args:
+            X (array-like): Training features.
+            y (array-like): Training target.
+
+        Returns:
+            SuccessiveHalvingSearch: self
+        """
+        X = np.asarray(X)
+        y = np.asarray(y)
+        signature = self._signature(X, y)
+        state = self._load_state(signature)
+        started = time.perf_counter()
+
+        candidates = list(ParameterGrid(self.param_grid))
+        resources = self._resources(len(X), len(candidates))
+
+        # Nested subsamples: every round's rows contain the previous round's rows
+        order = np.random.RandomState(self.random_state).permutation(len(X))
+
+        def elapsed():
+            return state['elapsed'] + time.perf_counter() - started
+
+        self.resumed_evaluations_ = 0
+        self.budget_exhausted_ = False
+        survivors = list(range(len(candidates)))
+        last_round_scores = {}
+
+        for round_index, n_rows in enumerate(resources):
+            rows = np.sort(order[:n_rows])
+            round_scores = {}
+
+            for candidate_index in survivors:
+                params = candidates[candidate_index]
+                key = f"{round_index}|{json.dumps(params, sort_keys=True, default=str)}"
+
+                if key in state['scores']:
+                    round_scores[candidate_index] = state['scores'][key]
+                    self.resumed_evaluations_ += 1
+                    continue
+
+                if self._out_of_budget(state, started):
+                    self.budget_exhausted_ = True
+                    break
+
+                estimator = clone(self.estimator).set_params(**params)
+                scores = cross_val_score(estimator, X[rows], y[rows], cv=self.cv,
+                                         scoring=self.scoring, n_jobs=self.n_jobs)
+
+                state['elapsed'] = elapsed()
+                started = time.perf_counter()
+                state['n_fits'] += self.cv
+                state['scores'][key] = {'score': float(np.mean(scores)), 'elapsed': state['elapsed']}
+                round_scores[candidate_index] = state['scores'][key]
+                self._save_state(state)
+
+            if round_scores:
+                last_round_scores = round_scores
+            if self.budget_exhausted_ or round_index == len(resources) - 1:
+                break
+
+            # Keep the best 1/factor of this round
+            n_keep = max(1, math.ceil(len(survivors) / self.factor))
+            survivors = sorted(round_scores, key=lambda index: round_scores[index]['score'], reverse=True)[:n_keep]
+
+        state['elapsed'] = elapsed()
+        state['complete'] = not self.budget_exhausted_
+        self._save_state(state)
+
+        if not last_round_scores:
+            raise RuntimeError("Search budget exhausted before any candidate was evaluated")
+
+        # Best candidate of the largest round reached
+        best_index = max(last_round_scores, key=lambda index: last_round_scores[index]['score'])
+        self.best_params_ = candidates[best_index]
+        self.best_score_ = last_round_scores[best_index]['score']
+        self.time_to_best_ = last_round_scores[best_index]['elapsed']
+        self.n_fits_ = state['n_fits']
+        self.elapsed_ = state['elapsed']
+
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_)
+        self.best_estimator_.fit(X, y)
+        return self
+
+    def report(self):
+        """Summary of the search: chosen params, score, time-to-best and budget use."""
+        return {
+            'best_params': self.best_params_,
+            'best_score': self.best_score_,
+            'time_to_best_s': self.time_to_best_,
+            'elapsed_s': self.elapsed_,
+            'n_fits': self.n_fits_,
+            'resumed_evaluations': self.resumed_evaluations_,
+            'budget_exhausted': self.budget_exhausted_
+        }
+
+    def print_report(self):
+        print(f"Best parameters: {self.best_params_}")
+        print(f"Best CV score: {self.best_score_:.4f} after {self.time_to_best_:.1f}s "
+              f"({self.elapsed_:.1f}s total, {self.n_fits_} fits"
+              f"{', budget exhausted' if self.budget_exhausted_ else ''}"
+              f"{f', {self.resumed_evaluations_} evaluations resumed' if self.resumed_evaluations_ else ''})")
@@ -0,0 +1,354 @@
+import numpy as np
+import os
+import json
+import mmap
+import struct
+import pickle
+import hashlib
+import tempfile
+from datetime import datetime
+
+# File layout
+# -----------
+#   preamble:  8-byte magic, uint32 format version, uint32 reserved, uint64 header length
+#   header:    UTF-8 JSON (kind, metadata, features, thresholds, section table, checksum)
+#   payload:   one section per array or pickled object, each starting on a page boundary
+# Section offsets in the header are relative to the payload start, which is the first page
+# boundary after the header. Arrays are stored raw and C-contiguous, so they are mapped
+# straight from the page cache instead of being read and unpickled.
+
+MAGIC = b'TIDEBNDL'
+FORMAT_VERSION = 1
+PAGE_SIZE = mmap.ALLOCATIONGRANULARITY
+_PREAMBLE = struct.Struct('<8sIIQ')
+
+
+def _align(offset):
+    return -(-offset // PAGE_SIZE) * PAGE_SIZE
+
+
+# Header fields left out of the checksum, so identical models written at different times
+# share a checksum (prediction caches are keyed by it)
+UNHASHED_FIELDS = ('checksum', 'created')
+
+
+def _checksum(header, payload_chunks, unhashed=UNHASHED_FIELDS):
+    """SHA-256 over the header (without its checksum and creation time) and the payload bytes."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({k: v for k, v in header.items() if k not in unhashed}, sort_keys=True).encode())
+    for chunk in payload_chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_bundle(path, kind, arrays=None, objects=None, metadata=None, features=None, thresholds=None):
+    """Write a model bundle.
+
+    Args:
+        path (str): Bundle path, conventionally ending in .bundle.
+        kind (str): What the bundle holds, e.g. 'tide_forest' or 'alert_classifier'.
+        arrays (dict, optional): Name to NumPy array; stored raw and page-aligned.
+        objects (dict, optional): Name to picklable object (e.g. a scikit-learn estimator kept
+            for retraining); only unpickled when explicitly requested.
+        metadata (dict, optional): JSON-serializable training metadata.
+        features (list, optional): Feature names the model expects.
+        thresholds (dict, optional): Alert probability thresholds.
+
+    Returns:
+        str: The bundle checksum.
+    """
+    sections = {}
+    chunks = []
+    offset = 0
+
+    for name, array in (arrays or {}).items():
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise TypeError(f"Array {name!r} has an object dtype; store it in objects instead")
+        data = array.tobytes()
+        offset = _align(offset)
+        sections[name] = {
+            'offset': offset,
+            'nbytes': len(data),
+            'dtype': np.lib.format.dtype_to_descr(array.dtype),
+            'shape': list(array.shape)
+        }
+        chunks.append((offset, data))
+        offset += len(data)
+
+    for name, obj in (objects or {}).items():
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        offset = _align(offset)
+        sections[name] = {'offset': offset, 'nbytes': len(data), 'pickle': True}
+        chunks.append((offset, data))
+        offset += len(data)
+
+    header = {
+        'format_version': FORMAT_VERSION,
+        'kind': kind,
+        'created': datetime.now().isoformat(),
+        'metadata': metadata or {},
+        'features': list(features) if features is not None else None,
+        'thresholds': thresholds,
+        'sections': sections
+    }
+    header['checksum'] = _checksum(header, [data for _, data in chunks])
+    header_bytes = json.dumps(header, default=float).encode()
+    payload_start = _align(_PREAMBLE.size + len(header_bytes))
+
+    bundle_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(bundle_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(path) + '.', dir=bundle_dir)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, len(header_bytes)))
+        f.write(header_bytes)
+        for section_offset, data in chunks:
+            f.seek(payload_start + section_offset)
+            f.write(data)
+        f.truncate(payload_start + offset)
+    os.replace(tmp_path, path)
+
+    return header['checksum']
+
+
+def read_header(path):
+    """Read only the preamble and JSON header of a bundle, without touching the payload.
+
+    Returns:
+        dict: The header, with the payload start added as 'payload_offset'.
+    """
+    with open(path, 'rb') as f:
+        magic, version, _, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{path} uses bundle format {version}, newer than supported {FORMAT_VERSION}")
+        header = json.loads(f.read(header_length))
+
+    header['payload_offset'] = _align(_PREAMBLE.size + header_length)
+    return header
+
+
+def is_bundle(path):
+    """Whether a file starts with the bundle magic."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class ModelBundle:
+    def __init__(self, path):
+        """Open a bundle and memory-map its payload.
+
+        Arrays returned by array() are read-only views into the mapping: nothing is copied
+        until a page is touched, and processes opening the same bundle share its pages.
+
+        Args:
+            path (str): Bundle path.
+        """
+        self.path = path
+        self.header = read_header(path)
+        self._offset = self.header['payload_offset']
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def kind(self):
+        return self.header['kind']
+
+    @property
+    def metadata(self):
+        return self.header['metadata']
+
+    @property
+    def features(self):
+        return self.header['features']
+
+    @property
+    def thresholds(self):
+        return self.header['thresholds']
+
+    @property
+    def checksum(self):
+        return self.header['checksum']
+
+    def __contains__(self, name):
+        return name in self.header['sections']
+
+    def array(self, name):
+        """Zero-copy, read-only view of a stored array."""
+        section = self.header['sections'][name]
+        return np.ndarray(
+            shape=tuple(section['shape']),
+            dtype=np.lib.format.descr_to_dtype(section['dtype']),
+            buffer=self._mmap,
+            offset=self._offset + section['offset']
+        )
+
+    def arrays(self, prefix):
+        """All arrays whose name starts with prefix, keyed by the rest of the name."""
+        return {
+            name[len(prefix):]: self.array(name)
+            for name, section in self.header['sections'].items()
+            if name.startswith(prefix) and not section.get('pickle')
+        }
+
+    def object(self, name):
+        """Unpickle a stored object."""
+        section = self.header['sections'][name]
+        start = self._offset + section['offset']
+        return pickle.loads(self._mmap[start:start + section['nbytes']])
+
+    def verify(self):
+        """Recompute the checksum over the header and payload; raises ValueError on mismatch."""
+        header = {k: v for k, v in self.header.items() if k != 'payload_offset'}
+        sections = sorted(self.header['sections'].values(), key=lambda section: section['offset'])
+
+        def chunks():
+            return (
+                self._mmap[self._offset + section['offset']:self._offset + section['offset'] + section['nbytes']]
+                for section in sections
+            )
+
+        # Bundles written before the creation time was excluded hashed it too
+        if (_checksum(header, chunks()) != self.checksum
+                and _checksum(header, chunks(), unhashed=('checksum',)) != self.checksum):
+            raise ValueError(f"Checksum mismatch in {self.path}")
+        return True
+
+
+def scaler_arrays(scaler):
+    """Split a fitted StandardScaler into bundle arrays and JSON metadata."""
+    arrays = {}
+    for attribute in ('mean_', 'scale_', 'var_'):
+        if getattr(scaler, attribute, None) is not None:
+            arrays[f'scaler.{attribute}'] = np.asarray(getattr(scaler, attribute), dtype=np.float64)
+    metadata = {
+        'with_mean': scaler.with_mean,
+        'with_std': scaler.with_std,
+        'n_features_in_': int(scaler.n_features_in_),
+        'n_samples_seen_': np.asarray(scaler.n_samples_seen_).tolist()
+    }
+    if hasattr(scaler, 'feature_names_in_'):
+        metadata['feature_names_in_'] = [str(name) for name in scaler.feature_names_in_]
+    return arrays, metadata
+
+
+class BundleScaler:
+    def __init__(self, arrays, metadata):
+        """Fitted StandardScaler state read back from a bundle, able to transform.
+
+        Loading a bundle for prediction therefore never imports scikit-learn. The attributes
+        mirror StandardScaler's, so scaler_arrays() can write the scaler back unchanged.
+
+        Args:
+            arrays (dict): mean_, scale_ and var_ arrays (absent ones are None).
+            metadata (dict): Scaler metadata written by scaler_arrays.
+        """
+        self.with_mean = metadata['with_mean']
+        self.with_std = metadata['with_std']
+        self.mean_ = arrays.get('mean_')
+        self.scale_ = arrays.get('scale_')
+        self.var_ = arrays.get('var_')
+        self.n_features_in_ = metadata['n_features_in_']
+        self.n_samples_seen_ = np.asarray(metadata['n_samples_seen_'])
+        if 'feature_names_in_' in metadata:
+            self.feature_names_in_ = np.asarray(metadata['feature_names_in_'], dtype=object)
+
+    def transform(self, X):
+        """Standardize X the way StandardScaler.transform does."""
+        X = np.array(X, dtype=np.float64)
+        if self.with_mean and self.mean_ is not None:
+            X -= self.mean_
+        if self.with_std and self.scale_ is not None:
+            X /= self.scale_
+        return X
+
+    def inverse_transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        if self.with_std and self.scale_ is not None:
+            X *= self.scale_
+        if self.with_mean and self.mean_ is not None:
+            X += self.mean_
+        return X
+
+
+def load_scaler(bundle, metadata):
+    """Rebuild the scaler stored by scaler_arrays as a BundleScaler."""
+    return BundleScaler(bundle.arrays('scaler.'), metadata)
+
+
+def save_classifier_bundle(path, model, scaler, features, thresholds=None, metadata=None, kind='alert_classifier'):
+    """Bundle an alert classifier: flat forest arrays, scaler, features and thresholds.
+
+    The scikit-learn estimator is kept as a pickled object for analyses that need more
+    than predict_proba (e.g. feature_importances_).
+
+    Returns:
+        str: The bundle checksum.
+    """
+    from flat_forest import FlatForest
+
+    arrays = {f'model.{name}': array for name, array in FlatForest.from_sklearn(model).to_arrays().items()}
+    scaler_data, scaler_metadata = scaler_arrays(scaler)
+    arrays.update(scaler_data)
+
+    return write_bundle(
+        path,
+        kind=kind,
+        arrays=arrays,
+        objects={'estimator': model},
+        metadata=dict(metadata or {}, scaler=scaler_metadata),
+        features=features,
+        thresholds={name: float(value) for name, value in thresholds.items()} if thresholds else None
+    )
+
+
+def load_classifier_bundle(path, estimator=False):
+    """Load a bundle written by save_classifier_bundle.
+
+    Args:
+        path (str): Bundle path.
+        estimator (bool, optional): Return the pickled scikit-learn estimator instead of the
+            memory-mapped FlatForest.
+
+    Returns:
+        tuple: (model, scaler, features, thresholds)
+    """
+    from flat_forest import FlatForest
+
+    bundle = ModelBundle(path)
+    model = bundle.object('estimator') if estimator else FlatForest.from_arrays(bundle.arrays('model.'))
+    scaler = load_scaler(bundle, bundle.metadata['scaler'])
+    return model, scaler, bundle.features, bundle.thresholds
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Inspect a model bundle')
+    parser.add_argument('bundle', type=str, help='Bundle path')
+    parser.add_argument('--verify', action='store_true', help='Recompute and check the checksum')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    header = read_header(args.bundle)
+    header_ms = 1000 * (time.perf_counter() - started)
+
+    print(f"kind: {header['kind']} (format {header['format_version']}, created {header['created']})")
+    print(f"checksum: {header['checksum']}")
+    print(f"features: {header['features']}")
+    print(f"thresholds: {header['thresholds']}")
+    print(f"metadata: {json.dumps(header['metadata'])}")
+    for name, section in header['sections'].items():
+        layout = 'pickle' if section.get('pickle') else f"{section['dtype']} {tuple(section['shape'])}"
+        print(f"  {name}: {section['nbytes']} bytes, {layout}")
+    print(f"header read in {header_ms:.3f} ms")
+
+    if args.verify:
+        ModelBundle(args.bundle).verify()
+        print("checksum OK")
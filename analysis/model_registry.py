@@ -0,0 +1,211 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# Artifact file names inside a version directory, per backend
+ARTIFACT_FILES = {
+    'forest': {'model': 'model.bundle'},
+    'harmonic': {'model': 'model.json'}
+}
+# Versions published before meta.json recorded its files
+LEGACY_ARTIFACT_FILES = {
+    'forest': {'model': 'model.joblib', 'scaler': 'scaler.joblib'},
+    'harmonic': {'model': 'model.json'}
+}
+META_FILE = 'meta.json'
+
+
+def _version_number(version):
+    """Integer of a version name, v0001 -> 1; versions order by it, not by string."""
+    return int(version[1:])
+
+
+class ModelRegistry:
+    def __init__(self, root, model_classes, max_bytes=1024**3, mmap_mode='r'):
+        """Station-keyed registry of versioned model artifacts with a byte-bounded LRU cache.
+
+        Artifacts live in <root>/<station_id>/<version>/ next to a meta.json describing the
+        backend. Models are loaded lazily on first access and evicted least-recently-used
+        once the resident artifact size exceeds max_bytes.
+
+        Args:
+            root (str): Registry root directory.
+            model_classes (dict): Mapping of backend name to model class, e.g. {'forest': TidePredictionModel}.
+            max_bytes (int, optional): Upper bound on the total artifact size of cached models.
+            mmap_mode (str, optional): Passed to joblib.load so tree arrays are memory-mapped and
+                shared between worker processes. Use None to load into private memory.
+        """
+        self.root = root
+        self.model_classes = model_classes
+        self.backends = {model_class: name for name, model_class in model_classes.items()}
+        self.max_bytes = max_bytes
+        self.mmap_mode = mmap_mode
+
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(root, exist_ok=True)
+
+    def _station_dir(self, station_id):
+        station_id = str(station_id)
+        if not station_id or station_id in ('.', '..') or os.sep in station_id or '/' in station_id:
+            raise ValueError(f"Invalid station ID for the model registry: {station_id!r}")
+        return os.path.join(self.root, station_id)
+
+    def keys(self):
+        """Station IDs that have at least one published model."""
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name)) and self.versions(name)
+        )
+
+    def __contains__(self, station_id):
+        try:
+            return bool(self.versions(station_id))
+        except ValueError:
+            return False
+
+    def __getitem__(self, station_id):
+        return self.get(station_id)
+
+    def versions(self, station_id):
+        """Published versions of a station's model, oldest first."""
+        station_dir = self._station_dir(station_id)
+        if not os.path.isdir(station_dir):
+            return []
+        return sorted(
+            (name for name in os.listdir(station_dir)
+             if os.path.exists(os.path.join(station_dir, name, META_FILE))),
+            key=_version_number
+        )
+
+    def latest_version(self, station_id):
+        versions = self.versions(station_id)
+        if not versions:
+            raise KeyError(f"No model published for station {station_id}")
+        return versions[-1]
+
+    def artifact_paths(self, station_id, version=None):
+        """Paths of a published artifact.
+
+        Returns:
+            tuple: (backend, model_path, scaler_path or None, artifact size in bytes)
+        """
+        version = version or self.latest_version(station_id)
+        version_dir = os.path.join(self._station_dir(station_id), version)
+
+        with open(os.path.join(version_dir, META_FILE)) as f:
+            meta = json.load(f)
+
+        files = meta.get('files') or LEGACY_ARTIFACT_FILES[meta['backend']]
+        model_path = os.path.join(version_dir, files['model'])
+        scaler_path = os.path.join(version_dir, files['scaler']) if 'scaler' in files else None
+        size = sum(os.path.getsize(path) for path in (model_path, scaler_path) if path)
+        return meta['backend'], model_path, scaler_path, size
+
+    def publish(self, station_id, model):
+        """Save a trained model as the station's newest version.
+
+        Args:
+            station_id (str): Station the model belongs to.
+            model (TidePredictionModel): Trained model.
+
+        Returns:
+            str: The new version name.
+        """
+        backend = self.backends[type(model)]
+        station_dir = self._station_dir(station_id)
+
+        with self._lock:
+            existing = self.versions(station_id)
+            version = f"v{_version_number(existing[-1]) + 1 if existing else 1:04d}"
+            version_dir = os.path.join(station_dir, version)
+            os.makedirs(version_dir)
+
+            files = ARTIFACT_FILES[backend]
+            if 'scaler' in files:
+                model.save_model(
+                    model_path=os.path.join(version_dir, files['model']),
+                    scaler_path=os.path.join(version_dir, files['scaler'])
+                )
+            else:
+                model.save_model(model_path=os.path.join(version_dir, files['model']))
+
+            # meta.json is written last: a version only becomes visible once it is complete
+            with open(os.path.join(version_dir, META_FILE), 'w') as f:
+                json.dump({
+                    'station_id': str(station_id),
+                    'version': version,
+                    'backend': backend,
+                    'files': files,
+                    'created': datetime.now().isoformat()
+                }, f, indent=2)
+
+        return version
+
+    def get(self, station_id, version=None):
+        """Return a loaded model, loading it lazily and caching it.
+
+        Args:
+            station_id (str): Station ID.
+            version (str, optional): Version to load. Defaults to the latest one.
+
+        Returns:
+            TidePredictionModel: The loaded model.
+        """
+        with self._lock:
+            # Resolve the latest version on every call, so a version published by another
+            # process (e.g. a CLI --update next to a running server) is a cache miss
+            version = version or self.latest_version(station_id)
+            key = (str(station_id), version)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key][0]
+
+            self.misses += 1
+            backend, model_path, scaler_path, size = self.artifact_paths(station_id, version)
+
+            model = self.model_classes[backend]()
+            model.load_model(model_path, scaler_path=scaler_path, mmap_mode=self.mmap_mode)
+
+            self._cache[key] = (model, size)
+            self.resident_bytes += size
+            self._evict()
+
+            return model
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        while self.resident_bytes > self.max_bytes and len(self._cache) > 1:
+            _, (_, size) = self._cache.popitem(last=False)
+            self.resident_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all cached models."""
+        with self._lock:
+            self._cache.clear()
+            self.resident_bytes = 0
+
+    def stats(self):
+        """Cache counters.
+
+        Returns:
+            dict: Hits, misses, evictions, cached entries and resident/max bytes.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._cache),
+                'resident_bytes': self.resident_bytes,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class _PendingPredict:
+    """One caller's predict request waiting to be merged into a batch."""
+
+    __slots__ = ('model', 'times', 'station_id', 'future')
+
+    def __init__(self, model, times, station_id):
+        self.model = model
+        self.times = times
+        self.station_id = station_id
+        self.future = Future()
+
+
+class PredictBatcher:
+    def __init__(self, max_batch_size=64, max_wait_ms=2.0):
+        """Coalesce concurrent predict requests into single model calls.
+
+        Requests that arrive within max_wait_ms of the first request in a batch are merged:
+        their timestamps are concatenated into one feature matrix per model, predicted with
+        one predict_at call and split back per caller.
+
+        Args:
+            max_batch_size (int, optional): Maximum number of requests merged into one batch.
+            max_wait_ms (float, optional): Maximum time the first request waits for others to join.
+        """
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue = []
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self._batch_sizes = Counter()
+        self._model_calls = 0
+        self._requests = 0
+
+        self._worker = threading.Thread(target=self._run, name='predict-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, model, future_hours=24, start_time=None, station_id=None):
+        """Queue a predict request.
+
+        Args:
+            model (TidePredictionModel): Model to predict with.
+            future_hours (int, optional): Number of hours to predict into the future.
+            start_time (datetime, optional): Start time for predictions. Defaults to current time.
+            station_id (str, optional): Station ID for the predictions.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the same DataFrame model.predict would return.
+        """
+        if model.model is None:
+            raise ValueError("Model has not been trained or loaded yet")
+
+        request = _PendingPredict(model, model._future_times(future_hours, start_time), station_id)
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("PredictBatcher is closed")
+            self._queue.append(request)
+            self._condition.notify()
+
+        return request.future
+
+    def predict(self, model, future_hours=24, start_time=None, station_id=None):
+        """Blocking convenience wrapper around submit."""
+        return self.submit(model, future_hours, start_time, station_id).result()
+
+    def _next_batch(self):
+        """Wait for a first request, then collect others until the batch is full or the window closes."""
+        with self._condition:
+            while not self._queue and not self._closed:
+                self._condition.wait()
+            if not self._queue:
+                return None
+
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = self._queue[:self.max_batch_size]
+            del self._queue[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        """Predict a batch with one model call per (model, timezone) group."""
+        groups = {}
+        for request in batch:
+            groups.setdefault((id(request.model), str(request.times.tz)), []).append(request)
+
+        model_calls = 0
+        for requests in groups.values():
+            model = requests[0].model
+            try:
+                times = requests[0].times.append([request.times for request in requests[1:]])
+                predictions = model.predict_at(times)
+                model_calls += 1
+            except Exception as e:
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+
+            # Split the merged predictions back per caller
+            offsets = np.cumsum([0] + [len(request.times) for request in requests])
+            for request, start, end in zip(requests, offsets[:-1], offsets[1:]):
+                results_df = pd.DataFrame({
+                    'ts': request.times,
+                    'tide_m': predictions[start:end]
+                })
+                if request.station_id:
+                    results_df['stationId'] = request.station_id
+                request.future.set_result(results_df)
+
+        with self._condition:
+            self._batch_sizes[len(batch)] += 1
+            self._model_calls += model_calls
+            self._requests += len(batch)
+
+    def stats(self):
+        """Batch-size statistics since the batcher started.
+
+        Returns:
+            dict: Request, batch and model-call counts, mean/max batch size and a batch-size histogram.
+        """
+        with self._condition:
+            batches = sum(self._batch_sizes.values())
+            return {
+                'requests': self._requests,
+                'batches': batches,
+                'model_calls': self._model_calls,
+                'mean_batch_size': self._requests / batches if batches else 0.0,
+                'max_batch_size': max(self._batch_sizes) if batches else 0,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self._batch_sizes.items())}
+            }
+
+    def close(self):
+        """Flush queued requests and stop the worker thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join()
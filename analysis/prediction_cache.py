@@ -0,0 +1,238 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from prediction_formats import encode
+
+
+class PredictionCache:
+    def __init__(self, max_bytes=64 * 1024**2, ttl_seconds=3600, disk_dir=None, disk_max_bytes=1024**3):
+        """Two-tier cache of serialized predictions.
+
+        Entries are keyed by (station, model checksum, start hour, horizon) and hold the compact
+        JSON bytes produced by export_predictions_json, so a hit is served without predicting or
+        serializing. The memory tier is an LRU bounded by bytes; the optional disk tier keeps
+        one directory per model checksum so a restarted server starts warm. Both tiers expire
+        entries after ttl_seconds.
+
+        on_artifact_saved drops a model's entries as soon as save_model overwrites its artifact;
+        PredictionServer registers it in tide_prediction_model.artifact_listeners.
+
+        Args:
+            max_bytes (int, optional): Memory tier budget in bytes.
+            ttl_seconds (float, optional): Entry lifetime in seconds.
+            disk_dir (str, optional): Disk tier directory. Disabled when None.
+            disk_max_bytes (int, optional): Disk tier budget in bytes.
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_index = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    @staticmethod
+    def make_key(station_id, checksum, start_hour, horizon, fmt='json', quantiles=None):
+        """Cache key for a prediction request.
+
+        Args:
+            station_id (str): Station ID, or None.
+            checksum (str): Model artifact checksum.
+            start_hour (pandas.Timestamp): Start time floored to the hour.
+            horizon (int): Number of predicted hours.
+            fmt (str, optional): Payload encoding, 'json' or 'compact'.
+            quantiles (list, optional): Requested quantile bands.
+
+        Returns:
+            tuple: (checksum, entry name)
+        """
+        raw = f"{station_id}|{start_hour.isoformat()}|{horizon}"
+        if fmt != 'json':
+            raw += f"|{fmt}"
+        if quantiles:
+            raw += f"|q={','.join(f'{quantile:g}' for quantile in quantiles)}"
+        return checksum, hashlib.sha1(raw.encode()).hexdigest()
+
+    def _disk_path(self, key):
+        checksum, name = key
+        return os.path.join(self.disk_dir, checksum, name + '.json')
+
+    def _scan_disk(self):
+        """Index existing disk entries, oldest first, so the disk tier survives restarts."""
+        entries = []
+        for checksum in os.listdir(self.disk_dir):
+            checksum_dir = os.path.join(self.disk_dir, checksum)
+            if not os.path.isdir(checksum_dir):
+                continue
+            for filename in os.listdir(checksum_dir):
+                if filename.endswith('.json'):
+                    stat = os.stat(os.path.join(checksum_dir, filename))
+                    entries.append((stat.st_mtime, (checksum, filename[:-5]), stat.st_size))
+
+        for mtime, key, size in sorted(entries):
+            self._disk_index[key] = (mtime + self.ttl_seconds, size)
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def get(self, key):
+        """Return the cached bytes for a key, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                self._drop_memory(key)
+
+            disk_entry = self._disk_index.get(key)
+            if disk_entry is not None:
+                expires_at, _ = disk_entry
+                if expires_at > now:
+                    try:
+                        with open(self._disk_path(key), 'rb') as f:
+                            payload = f.read()
+                    except OSError:
+                        payload = None
+                    if payload is not None:
+                        self._disk_index.move_to_end(key)
+                        self._put_memory(key, payload, expires_at)
+                        self.disk_hits += 1
+                        return payload
+                self._drop_disk(key)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, payload):
+        """Store serialized prediction bytes in both tiers."""
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._put_memory(key, payload, expires_at)
+
+            if self.disk_dir:
+                path = self._disk_path(key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # A unique temp name, since several server processes may share the directory
+                fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(path) + '.',
+                                                dir=os.path.dirname(path))
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+
+                if key in self._disk_index:
+                    self._disk_bytes -= self._disk_index.pop(key)[1]
+                self._disk_index[key] = (expires_at, len(payload))
+                self._disk_bytes += len(payload)
+                self._evict_disk()
+
+    def _put_memory(self, key, payload, expires_at):
+        if key in self._memory:
+            self._drop_memory(key)
+        self._memory[key] = (expires_at, payload)
+        self._memory_bytes += len(payload)
+        while self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+            self.evictions += 1
+
+    def _drop_memory(self, key):
+        _, payload = self._memory.pop(key)
+        self._memory_bytes -= len(payload)
+
+    def _drop_disk(self, key):
+        _, size = self._disk_index.pop(key)
+        self._disk_bytes -= size
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_max_bytes and self._disk_index:
+            self._drop_disk(next(iter(self._disk_index)))
+            self.evictions += 1
+
+    def invalidate_checksum(self, checksum):
+        """Drop every entry computed with a model artifact checksum, in both tiers."""
+        with self._lock:
+            for key in [key for key in self._memory if key[0] == checksum]:
+                self._drop_memory(key)
+            for key in [key for key in self._disk_index if key[0] == checksum]:
+                self._disk_bytes -= self._disk_index.pop(key)[1]
+            if self.disk_dir:
+                shutil.rmtree(os.path.join(self.disk_dir, checksum), ignore_errors=True)
+            self.invalidations += 1
+
+    def on_artifact_saved(self, model_path, old_checksum, new_checksum):
+        """artifact_listeners callback: invalidate the checksum an artifact was replaced from."""
+        if old_checksum is not None:
+            self.invalidate_checksum(old_checksum)
+
+    def predict_json(self, model, future_hours=24, start_time=None, station_id=None, fmt='json', quantiles=None):
+        """Cached equivalent of model.export_predictions_json(model.predict(...)).
+
+        The start time is floored to the hour, so every request within the same hour shares
+        one entry. Models without an artifact checksum (never saved or loaded) bypass the cache.
+
+        Args:
+            model (TidePredictionModel): Trained model.
+            future_hours (int, optional): Number of hours to predict into the future.
+            start_time (datetime, optional): Start time for predictions. Defaults to current time.
+            station_id (str, optional): Station ID for the predictions.
+            fmt (str, optional): 'json' for records, 'compact' for columns with epoch-ms timestamps.
+            quantiles (list, optional): Quantile bands to add, see TidePredictionModel.predict.
+
+        Returns:
+            bytes: JSON predictions without whitespace.
+        """
+        start_hour = pd.Timestamp(start_time if start_time is not None else pd.Timestamp.now()).floor('h')
+
+        if model.checksum is None:
+            predictions = model.predict(future_hours, start_hour.to_pydatetime(), station_id, quantiles)
+            return encode(predictions, fmt, indent=None).encode()
+
+        key = self.make_key(station_id, model.checksum, start_hour, future_hours, fmt, quantiles)
+        payload = self.get(key)
+        if payload is None:
+            predictions = model.predict(future_hours, start_hour.to_pydatetime(), station_id, quantiles)
+            payload = encode(predictions, fmt, indent=None).encode()
+            self.put(key, payload)
+        return payload
+
+    def stats(self):
+        """Cache counters and tier sizes."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk_index),
+                'disk_bytes': self._disk_bytes
+            }
@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+import sys
+import json
+import time
+import struct
+
+# Output encodings of a predictions DataFrame (ts plus value columns, optionally stationId):
+#   json     records with ISO timestamps, the original export_predictions_json output
+#   compact  one JSON object of columns, timestamps as epoch milliseconds, no whitespace
+#   ndjson   one compact JSON record per line, written row by row
+#   binary   fixed header (start and step in epoch ms, count, station) followed by packed
+#            little-endian float32 tide heights; needs evenly spaced timestamps
+# Naive timestamps are taken as UTC.
+
+FORMATS = ('json', 'compact', 'ndjson', 'binary')
+
+BINARY_MAGIC = b'TPRD'
+BINARY_VERSION = 1
+# magic, version, station ID length, start ms, step ms, value count
+BINARY_HEADER = struct.Struct('<4sHHqqI')
+
+
+def _epoch_ms(ts):
+    """Epoch milliseconds of a timestamp column as int64."""
+    ts = pd.to_datetime(ts)
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_convert('UTC').dt.tz_localize(None)
+    return ts.to_numpy(dtype='datetime64[ms]').astype(np.int64)
+
+
+def to_json(predictions, indent=2):
+    """Records with ISO-formatted timestamps, e.g. [{"ts": "2024-01-01T00:00:00", "tide_m": 1.2}].
+
+    Timestamps are formatted in one vectorized call instead of per-row strftime.
+    """
+    columns = {}
+    for column in predictions.columns:
+        values = predictions[column]
+        if column == 'ts':
+            ts = pd.to_datetime(values)
+            if ts.dt.tz is not None:
+                columns[column] = ts.dt.strftime('%Y-%m-%dT%H:%M:%S').tolist()
+            else:
+                columns[column] = np.datetime_as_string(ts.to_numpy(dtype='datetime64[s]'), unit='s').tolist()
+        else:
+            columns[column] = values.tolist()
+
+    names = list(columns)
+    records = [dict(zip(names, row)) for row in zip(*columns.values())]
+    return json.dumps(records, indent=indent)
+
+
+def to_compact_json(predictions):
+    """Columns as arrays, e.g. {"ts": [1704067200000, ...], "tide_m": [1.2, ...], "stationId": "S1"}.
+
+    A non-numeric column with a single value (the station ID) is written once as a scalar.
+    """
+    payload = {}
+    for column in predictions.columns:
+        values = predictions[column]
+        if column == 'ts':
+            payload[column] = _epoch_ms(values).tolist()
+        elif not pd.api.types.is_numeric_dtype(values) and values.nunique(dropna=False) == 1:
+            payload[column] = values.iloc[0]
+        else:
+            payload[column] = values.tolist()
+    return json.dumps(payload, separators=(',', ':'), default=str)
+
+
+def iter_ndjson(predictions):
+    """Yield one compact JSON record per row, newline-terminated, with epoch-ms timestamps."""
+    columns = {
+        column: _epoch_ms(predictions[column]).tolist() if column == 'ts' else predictions[column].tolist()
+        for column in predictions.columns
+    }
+    names = list(columns)
+    for row in zip(*columns.values()):
+        yield json.dumps(dict(zip(names, row)), separators=(',', ':'), default=str) + '\n'
+
+
+def to_binary(predictions, value_column='tide_m'):
+    """Packed float32 values behind a start / step header.
+
+    Layout: BINARY_HEADER, the UTF-8 station ID, zero padding to a 4-byte boundary, then
+    count little-endian float32 values.
+
+    Raises:
+        ValueError: If the timestamps are not evenly spaced.
+    """
+    ms = _epoch_ms(predictions['ts'])
+    step = int(ms[1] - ms[0]) if len(ms) > 1 else 0
+    if len(ms) > 2 and np.any(np.diff(ms) != step):
+        raise ValueError("The binary format needs evenly spaced timestamps")
+
+    station_id = b''
+    if 'stationId' in predictions.columns and len(predictions):
+        station_id = str(predictions['stationId'].iloc[0]).encode()
+
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(station_id),
+                                int(ms[0]) if len(ms) else 0, step, len(ms))
+    padding = b'\0' * (-(len(header) + len(station_id)) % 4)
+    values = np.ascontiguousarray(predictions[value_column], dtype='<f4')
+    return header + station_id + padding + values.tobytes()
+
+
+def from_binary(payload, value_column='tide_m'):
+    """Decode to_binary output back into a predictions DataFrame."""
+    magic, version, station_length, start_ms, step_ms, count = BINARY_HEADER.unpack_from(payload)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a binary predictions payload")
+    if version > BINARY_VERSION:
+        raise ValueError(f"Binary predictions version {version} is newer than supported {BINARY_VERSION}")
+
+    offset = BINARY_HEADER.size
+    station_id = payload[offset:offset + station_length].decode()
+    offset += station_length
+    offset += -offset % 4
+    values = np.frombuffer(payload, dtype='<f4', count=count, offset=offset)
+
+    predictions = pd.DataFrame({
+        'ts': pd.to_datetime(start_ms + step_ms * np.arange(count, dtype=np.int64), unit='ms'),
+        value_column: values.astype(np.float64)
+    })
+    if station_id:
+        predictions['stationId'] = station_id
+    return predictions
+
+
+def encode(predictions, fmt='json', indent=2):
+    """Encode predictions in one of FORMATS.
+
+    Returns:
+        str or bytes: Text for the JSON formats, bytes for binary.
+    """
+    if fmt == 'json':
+        return to_json(predictions, indent=indent)
+    if fmt == 'compact':
+        return to_compact_json(predictions)
+    if fmt == 'ndjson':
+        return ''.join(iter_ndjson(predictions))
+    if fmt == 'binary':
+        return to_binary(predictions)
+    raise ValueError(f"Unknown predictions format: {fmt}")
+
+
+def write_predictions(predictions, fmt='json', stream=None, indent=2):
+    """Write predictions to a stream; NDJSON is written and flushed row by row.
+
+    Args:
+        predictions (pandas.DataFrame): Predictions with a ts column.
+        fmt (str, optional): One of FORMATS.
+        stream (file, optional): Text stream (binary streams for fmt='binary'). Defaults to stdout.
+        indent (int, optional): JSON indentation of the json format.
+    """
+    if stream is None:
+        stream = sys.stdout.buffer if fmt == 'binary' else sys.stdout
+
+    if fmt == 'ndjson':
+        for line in iter_ndjson(predictions):
+            stream.write(line)
+            stream.flush()
+        return
+
+    stream.write(encode(predictions, fmt, indent))
+    if fmt != 'binary':
+        stream.write('\n')
+    stream.flush()
+
+
+def _legacy_json(predictions, indent=2):
+    """The original export_predictions_json body, kept as the benchmark reference."""
+    predictions_dict = predictions.copy()
+    predictions_dict['ts'] = predictions_dict['ts'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return json.dumps(predictions_dict.to_dict(orient='records'), indent=indent)
+
+
+def benchmark(predictions, repeat=50):
+    """Encoding and decoding cost and payload size of every format.
+
+    Args:
+        predictions (pandas.DataFrame): Predictions to encode.
+        repeat (int, optional): Timed repetitions per format.
+
+    Returns:
+        dict: Per format, median encode and decode time in ms and payload size in bytes.
+    """
+    decoders = {
+        'legacy json': json.loads,
+        'json': json.loads,
+        'compact': json.loads,
+        'ndjson': lambda payload: [json.loads(line) for line in payload.splitlines()],
+        'binary': from_binary
+    }
+    encoders = {'legacy json': _legacy_json}
+    encoders.update({fmt: (lambda fmt: lambda df: encode(df, fmt))(fmt) for fmt in FORMATS})
+
+    def median_ms(func, argument):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(argument)
+            timings.append(time.perf_counter() - started)
+        return 1000 * float(np.median(timings))
+
+    results = {}
+    for name, encoder in encoders.items():
+        payload = encoder(predictions)
+        results[name] = {
+            'encode_ms': median_ms(encoder, predictions),
+            'decode_ms': median_ms(decoders[name], payload),
+            'bytes': len(payload if isinstance(payload, bytes) else payload.encode())
+        }
+    return results
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the prediction output formats')
+    parser.add_argument('--hours', type=int, default=24, help='Predicted hours per payload')
+    parser.add_argument('--repeat', type=int, default=50, help='Timed repetitions per format')
+    args = parser.parse_args()
+
+    hours = np.arange(args.hours)
+    predictions = pd.DataFrame({
+        'ts': pd.Timestamp.now().floor('h') + pd.to_timedelta(hours, unit='h'),
+        'tide_m': 1.5 + 0.7 * np.sin(2 * np.pi * hours / 12.42),
+        'stationId': 'station-1'
+    })
+
+    print(f"{'format':<12} {'encode ms':>10} {'decode ms':>10} {'bytes':>9}")
+    for name, result in benchmark(predictions, args.repeat).items():
+        print(f"{name:<12} {result['encode_ms']:10.3f} {result['decode_ms']:10.3f} {result['bytes']:9d}")
@@ -0,0 +1,332 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+import json
+import time
+import threading
+import traceback
+
+from prediction_formats import encode
+
+# Protocol
+# --------
+# One JSON object per line on stdin, one JSON object per line on stdout:
+#   request:  {"id": 1, "command": "predict", "params": {"station": "S1", "hours": 24}}
+#   response: {"id": 1, "ok": true, "result": [...]}
+#   error:    {"id": 1, "ok": false, "error": "message"}
+# Anything the models print while serving is redirected to stderr so stdout only
+# carries protocol lines. With a PredictBatcher attached, predict responses may be
+# written out of order; callers match them by id. Predict params may ask for
+# "format": "compact" to get {"ts": [epoch ms, ...], "tide_m": [...]} instead of records.
+# With a PredictionCache attached, predict start times are floored to the hour, so the
+# series of a request for 07:23 starts at 07:00.
+
+DEFAULT_THRESHOLDS_PATH = os.path.join('models', 'alert_threshold_model.bundle')
+
+
+class RawJSON:
+    """Handler result that is already serialized JSON and is written to the response as-is."""
+
+    __slots__ = ('payload',)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+
+class PredictionServer:
+    def __init__(self, model_classes, default_model_path=None, default_scaler_path=None,
+                 default_backend='forest', thresholds_path=DEFAULT_THRESHOLDS_PATH, batcher=None,
+                 registry=None, cache=None, artifact_listeners=None):
+        """Initialize a long-lived prediction server.
+
+        Args:
+            model_classes (dict): Mapping of backend name to model class, e.g. {'forest': TidePredictionModel}.
+            default_model_path (str, optional): Model loaded at startup and used when a request names none.
+            default_scaler_path (str, optional): Scaler of the default model.
+            default_backend (str, optional): Backend of the default model.
+            thresholds_path (str, optional): Alert model bundle (or legacy thresholds pickle) written by
+                alert_threshold_optimization.py.
+            batcher (PredictBatcher, optional): Coalesces concurrent predict requests into single model calls.
+            registry (ModelRegistry, optional): Per-station models, used when a request names a station but no model.
+            cache (PredictionCache, optional): Serves repeated predict requests from serialized results.
+            artifact_listeners (list, optional): tide_prediction_model.artifact_listeners of the models'
+                module; the cache registers on_artifact_saved there so saved models invalidate it.
+        """
+        self.model_classes = model_classes
+        self.default_model_path = default_model_path
+        self.default_scaler_path = default_scaler_path
+        self.default_backend = default_backend
+        self.thresholds_path = thresholds_path
+        self.started_at = time.time()
+        self.requests_served = 0
+        self._models = {}
+        self._thresholds = {}
+        self.batcher = batcher
+        self.registry = registry
+        self.cache = cache
+        if cache is not None and artifact_listeners is not None and cache.on_artifact_saved not in artifact_listeners:
+            artifact_listeners.append(cache.on_artifact_saved)
+        self._out = sys.stdout
+        self._write_lock = threading.Lock()
+
+        self.handlers = {
+            'health': self.handle_health,
+            'predict': self.handle_predict,
+            'thresholds': self.handle_thresholds,
+            'analysis': self.handle_analysis
+        }
+
+    def get_model(self, model_path=None, backend=None, scaler_path=None):
+        """Return a loaded model, loading it on first use and keeping it warm afterwards.
+
+        Args:
+            model_path (str, optional): Path of the saved model. Defaults to the server's default model.
+            backend (str, optional): Backend name. Defaults to the server's default backend.
+            scaler_path (str, optional): Path of the saved scaler. Defaults to the server's default scaler.
+
+        Returns:
+            TidePredictionModel: The loaded model.
+        """
+        if not model_path:
+            model_path = self.default_model_path
+            scaler_path = scaler_path or self.default_scaler_path
+        backend = backend or self.default_backend
+
+        if not model_path:
+            raise ValueError("No model path given and the server has no default model")
+
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model file not found: {model_path}")
+
+        # Reload when the artifact was rewritten, e.g. by a training run in another process
+        key = (backend, os.path.abspath(model_path))
+        mtime = os.path.getmtime(model_path)
+        if key not in self._models or self._models[key][1] != mtime:
+            model = self.model_classes[backend]()
+            model.load_model(model_path, scaler_path=scaler_path)
+            self._models[key] = (model, mtime)
+
+        return self._models[key][0]
+
+    def handle_health(self, params):
+        """Report readiness, loaded models, uptime and batching statistics."""
+        health = {
+            'status': 'ready',
+            'pid': os.getpid(),
+            'uptime_s': round(time.time() - self.started_at, 3),
+            'requests_served': self.requests_served,
+            'models': [path for _, path in self._models]
+        }
+        if self.batcher is not None:
+            health['batching'] = self.batcher.stats()
+        if self.registry is not None:
+            health['registry'] = self.registry.stats()
+        if self.cache is not None:
+            health['cache'] = self.cache.stats()
+        return health
+
+    def _predict_args(self, params):
+        """Resolve the model and predict arguments of a predict request."""
+        station_id = params.get('station')
+        if self.registry is not None and not params.get('model') and station_id in self.registry:
+            model = self.registry.get(station_id, params.get('version'))
+        else:
+            model = self.get_model(params.get('model'), params.get('backend'), params.get('scaler'))
+        start_time = pd.Timestamp(params['start_time']).to_pydatetime() if params.get('start_time') else None
+        return model, int(params.get('hours', 24)), start_time, params.get('station')
+
+    @staticmethod
+    def _predict_format(params):
+        """Payload encoding of a predict request; only the JSON encodings fit the protocol."""
+        fmt = params.get('format', 'json')
+        if fmt not in ('json', 'compact'):
+            raise ValueError(f"Unsupported predict format: {fmt} (use 'json' or 'compact')")
+        return fmt
+
+    def handle_predict(self, params):
+        """Predict tide heights for one station.
+
+        Params:
+            hours (int): Number of hours to predict. Defaults to 24.
+            start_time (str): ISO start time. Defaults to now. With a cache attached it is floored
+                to the hour and the series starts there.
+            station (str): Station ID attached to the results.
+            model (str): Model path. Defaults to the station's registry model, then the server's default model.
+            version (str): Registry model version. Defaults to the latest one.
+            scaler (str): Scaler path for forest models.
+            backend (str): Model backend. Defaults to the server's default backend.
+            format (str): 'json' for records with ISO timestamps (default), 'compact' for columns
+                with epoch-ms timestamps.
+            quantiles (list): Quantile bands of the per-tree predictions, e.g. [0.1, 0.5, 0.9],
+                returned as tide_m_p10, tide_m_p50 and tide_m_p90.
+        """
+        model, future_hours, start_time, station_id = self._predict_args(params)
+        fmt = self._predict_format(params)
+        quantiles = params.get('quantiles')
+        if self.cache is not None:
+            return RawJSON(self.cache.predict_json(model, future_hours, start_time, station_id, fmt, quantiles))
+
+        predictions = model.predict(future_hours=future_hours, start_time=start_time, station_id=station_id,
+                                    quantiles=quantiles)
+        return RawJSON(encode(predictions, fmt, indent=None).encode())
+
+    def submit_predict(self, request_id, params):
+        """Queue a predict request on the batcher and respond when its batch completes."""
+        model, future_hours, start_time, station_id = self._predict_args(params)
+        fmt = self._predict_format(params)
+
+        key = None
+        if self.cache is not None and model.checksum is not None:
+            # Cached entries are computed from the start of the hour
+            start_time = pd.Timestamp(start_time if start_time is not None else pd.Timestamp.now()).floor('h')
+            key = self.cache.make_key(station_id, model.checksum, start_time, future_hours, fmt)
+            payload = self.cache.get(key)
+            if payload is not None:
+                self._count_served()
+                self.respond({'id': request_id, 'ok': True, 'result': RawJSON(payload)})
+                return
+            start_time = start_time.to_pydatetime()
+
+        future = self.batcher.submit(model, future_hours, start_time, station_id)
+
+        def on_done(done):
+            try:
+                payload = encode(done.result(), fmt, indent=None).encode()
+                if key is not None:
+                    self.cache.put(key, payload)
+                self._count_served()
+                self.respond({'id': request_id, 'ok': True, 'result': RawJSON(payload)})
+            except Exception as e:
+                traceback.print_exc(file=sys.stderr)
+                self.respond({'id': request_id, 'ok': False, 'error': str(e)})
+
+        future.add_done_callback(on_done)
+
+    def handle_thresholds(self, params):
+        """Return the optimized alert probability thresholds.
+
+        Params:
+            path (str): Alert model bundle or legacy thresholds pickle. Defaults to the server's.
+        """
+        from model_bundle import is_bundle, read_header
+        path = params.get('path') or self.thresholds_path
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Thresholds file not found: {path}")
+
+        # Reread when alert_threshold_optimization.py rewrites the file
+        key = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        if key not in self._thresholds or self._thresholds[key][1] != mtime:
+            if is_bundle(path):
+                # Only the bundle header is read, the model payload is never touched
+                thresholds = read_header(path)['thresholds'] or {}
+            else:
+                import joblib
+                thresholds = joblib.load(path)
+            self._thresholds[key] = ({name: float(value) for name, value in thresholds.items()}, mtime)
+        return self._thresholds[key][0]
+
+    def handle_analysis(self, params):
+        """Summarize a series of readings: statistics, anomalies, trend and risk level.
+
+        Params:
+            readings (list): Readings as {"ts": ..., "height": ...} objects.
+        """
+        readings = params.get('readings') or []
+        if not readings:
+            raise ValueError("No readings to analyze")
+
+        heights = np.array([reading['height'] for reading in readings], dtype=np.float64)
+        avg = heights.mean()
+        max_height = heights.max()
+        min_height = heights.min()
+        height_range = max_height - min_height
+
+        anomaly_idx = np.flatnonzero(np.abs(heights - avg) > height_range * 0.4)
+
+        return {
+            'statistics': {
+                'average': round(float(avg), 2),
+                'maximum': round(float(max_height), 2),
+                'minimum': round(float(min_height), 2),
+                'range': round(float(height_range), 2)
+            },
+            'anomalies': [
+                {
+                    'timestamp': readings[i].get('ts'),
+                    'height': float(heights[i]),
+                    'deviation': round(float(heights[i] - avg), 2)
+                } for i in anomaly_idx
+            ],
+            'trend': 'high_variability' if height_range > 1.5 else 'stable',
+            'riskLevel': 'high' if max_height > 3.0 else 'medium' if max_height > 2.5 else 'low'
+        }
+
+    def _count_served(self):
+        """Count one answered request; batched predicts complete on the batcher's thread."""
+        with self._write_lock:
+            self.requests_served += 1
+
+    def respond(self, response):
+        """Write one protocol line to stdout."""
+        result = response.get('result')
+        if isinstance(result, RawJSON):
+            # Splice pre-serialized results in without decoding them
+            line = '{"id": %s, "ok": true, "result": %s}\n' % (json.dumps(response['id']), result.payload.decode())
+        else:
+            line = json.dumps(response, default=str) + '\n'
+        with self._write_lock:
+            self._out.write(line)
+            self._out.flush()
+
+    def handle_line(self, line):
+        """Parse and dispatch one request line.
+
+        Returns:
+            dict: The response object, or None if the response will be written asynchronously.
+        """
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            command = request.get('command')
+            if command not in self.handlers:
+                raise ValueError(f"Unknown command: {command}")
+
+            params = request.get('params') or {}
+            # The batcher merges mean predictions only; quantile requests are answered directly
+            if command == 'predict' and self.batcher is not None and not params.get('quantiles'):
+                self.submit_predict(request_id, params)
+                return None
+
+            result = self.handlers[command](params)
+            self._count_served()
+            return {'id': request_id, 'ok': True, 'result': result}
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+
+    def serve(self, stdin=None):
+        """Serve requests from stdin until it is closed."""
+        stdin = stdin or sys.stdin
+
+        # Keep stdout for protocol lines only
+        self._out = sys.stdout
+        sys.stdout = sys.stderr
+
+        try:
+            if self.default_model_path:
+                self.get_model()
+            self.respond({'id': None, 'ok': True, 'result': self.handle_health({})})
+
+            for line in stdin:
+                line = line.strip()
+                if line:
+                    response = self.handle_line(line)
+                    if response is not None:
+                        self.respond(response)
+        finally:
+            if self.batcher is not None:
+                self.batcher.close()
+            sys.stdout = self._out
@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+import sys
+import time
+
+
+class StreamingReadingsLoader:
+    def __init__(self, collection, metrics=('tide_m',), batch_size=10000):
+        """Stream readings from MongoDB into NumPy column buffers.
+
+        Only ts, stationId and the requested metrics.* fields are projected, the cursor is
+        consumed in batches and every document is written straight into preallocated column
+        buffers, so no per-document dicts or intermediate DataFrames are kept around.
+
+        Args:
+            collection: pymongo (or mongomock) collection holding the readings.
+            metrics (list, optional): Names of the metrics.* fields to load.
+            batch_size (int, optional): Cursor batch size.
+        """
+        self.collection = collection
+        self.metrics = list(metrics)
+        self.batch_size = batch_size
+        self.stats = {'documents': 0, 'seconds': 0.0, 'docs_per_sec': 0.0}
+
+    @staticmethod
+    def build_query(station_id=None, start_date=None, end_date=None):
+        """Build the readings query for a station and time range."""
+        query = {}
+        if station_id:
+            query['stationId'] = station_id
+        if start_date or end_date:
+            query['ts'] = {}
+            if start_date:
+                query['ts']['$gte'] = start_date
+            if end_date:
+                query['ts']['$lte'] = end_date
+        return query
+
+    def _projection(self):
+        projection = {'_id': 0, 'ts': 1, 'stationId': 1}
+        for metric in self.metrics:
+            projection[f'metrics.{metric}'] = 1
+        return projection
+
+    def _cursor(self, query):
+        return self.collection.find(query, self._projection()).sort('ts', 1).batch_size(self.batch_size)
+
+    def _allocate(self, size):
+        return {
+            'ts': np.empty(size, dtype='datetime64[us]'),
+            'stationId': np.empty(size, dtype=object),
+            'metrics': np.full((size, len(self.metrics)), np.nan)
+        }
+
+    def _grow(self, buffers):
+        size = max(1024, 2 * len(buffers['ts']))
+        grown = self._allocate(size)
+        n = len(buffers['ts'])
+        grown['ts'][:n] = buffers['ts']
+        grown['stationId'][:n] = buffers['stationId']
+        grown['metrics'][:n] = buffers['metrics']
+        return grown
+
+    def _to_frame(self, buffers, n):
+        columns = {
+            'ts': pd.DatetimeIndex(buffers['ts'][:n]),
+            'stationId': buffers['stationId'][:n]
+        }
+        for i, metric in enumerate(self.metrics):
+            columns[metric] = buffers['metrics'][:n, i]
+        return pd.DataFrame(columns)
+
+    def _fill(self, buffers, n, document):
+        buffers['ts'][n] = document.get('ts')
+        station_id = document.get('stationId')
+        buffers['stationId'][n] = str(station_id) if station_id is not None else None
+        values = document.get('metrics')
+        if values:
+            row = buffers['metrics'][n]
+            for i, metric in enumerate(self.metrics):
+                value = values.get(metric)
+                if value is not None:
+                    row[i] = value
+
+    def _report(self, documents, started):
+        seconds = time.perf_counter() - started
+        self.stats = {
+            'documents': documents,
+            'seconds': seconds,
+            'docs_per_sec': documents / seconds if seconds > 0 else 0.0
+        }
+        print(f"Loaded {documents} readings in {seconds:.2f}s "
+              f"({self.stats['docs_per_sec']:.0f} documents/sec)", file=sys.stderr)
+
+    def load(self, station_id=None, start_date=None, end_date=None):
+        """Load all matching readings into one DataFrame.
+
+        Args:
+            station_id (str, optional): ID of the station to get data for.
+            start_date (datetime, optional): Start date for data retrieval.
+            end_date (datetime, optional): End date for data retrieval.
+
+        Returns:
+            pandas.DataFrame: ts, stationId and one column per requested metric.
+        """
+        started = time.perf_counter()
+        query = self.build_query(station_id, start_date, end_date)
+
+        # Size the buffers from the server-side count; grow if more documents arrive meanwhile
+        buffers = self._allocate(self.collection.count_documents(query))
+        n = 0
+        for document in self._cursor(query):
+            if n == len(buffers['ts']):
+                buffers = self._grow(buffers)
+            self._fill(buffers, n, document)
+            n += 1
+
+        self._report(n, started)
+        return self._to_frame(buffers, n)
+
+    def iter_chunks(self, station_id=None, start_date=None, end_date=None, chunk_size=100000):
+        """Yield matching readings as DataFrames of at most chunk_size rows.
+
+        Memory stays bounded by one chunk regardless of the size of the result set.
+
+        Args:
+            station_id (str, optional): ID of the station to get data for.
+            start_date (datetime, optional): Start date for data retrieval.
+            end_date (datetime, optional): End date for data retrieval.
+            chunk_size (int, optional): Rows per yielded DataFrame.
+
+        Yields:
+            pandas.DataFrame: ts, stationId and one column per requested metric.
+        """
+        started = time.perf_counter()
+        query = self.build_query(station_id, start_date, end_date)
+
+        total = 0
+        n = 0
+        buffers = self._allocate(chunk_size)
+        for document in self._cursor(query):
+            self._fill(buffers, n, document)
+            n += 1
+            if n == chunk_size:
+                total += n
+                yield self._to_frame(buffers, n)
+                # The yielded frame may still reference the old buffers
+                buffers = self._allocate(chunk_size)
+                n = 0
+
+        if n:
+            total += n
+            yield self._to_frame(buffers, n)
+
+        self._report(total, started)
@@ -0,0 +1,366 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+import json
+import time
+import tempfile
+
+from readings_loader import StreamingReadingsLoader
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'readings')
+
+# metrics.* fields of backend/models/Reading.js
+READING_METRICS = ['tide_m', 'wind_mps', 'rain_mm', 'salinity_ppt', 'turbidity_NTU']
+
+WATERMARKS_FILE = '_watermarks.json'
+SOURCES_FILE = '_sources.json'
+
+
+class ReadingsStore:
+    def __init__(self, root=DEFAULT_STORE_DIR, dataset='readings'):
+        """Local columnar cache of readings, partitioned by station and month.
+
+        Rows live in <root>/<dataset>/<station_id>/<YYYY-MM>/part-*.parquet. Every station has
+        a ts watermark (the newest stored timestamp); appends and syncs only add rows newer
+        than it, so repeated syncs fetch just the new documents. A CSV export that changed since
+        its last import replaces the station months it covers instead. Reads only open the
+        partitions of the requested stations and months.
+
+        Args:
+            root (str, optional): Store root directory.
+            dataset (str, optional): Dataset name, e.g. 'readings' or 'alert_data'.
+        """
+        self.root = root
+        self.dataset = dataset
+        self.path = os.path.join(root, dataset)
+        os.makedirs(self.path, exist_ok=True)
+
+        self._watermarks = self._read_json(WATERMARKS_FILE)
+        self._sources = self._read_json(SOURCES_FILE)
+
+    def _read_json(self, name):
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_json(self, name, data):
+        path = os.path.join(self.path, name)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=name + '.', dir=self.path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _station_dir(self, station_id):
+        station_id = str(station_id)
+        if not station_id or station_id in ('.', '..') or os.sep in station_id or '/' in station_id:
+            raise ValueError(f"Invalid station ID for the readings store: {station_id!r}")
+        return os.path.join(self.path, station_id)
+
+    @staticmethod
+    def _naive_utc(ts):
+        """Timestamps are stored tz-naive; tz-aware input is converted to UTC first."""
+        ts = pd.to_datetime(ts)
+        if isinstance(ts, pd.Timestamp):
+            return ts.tz_convert('UTC').tz_localize(None) if ts.tzinfo is not None else ts
+        if ts.dt.tz is not None:
+            ts = ts.dt.tz_convert('UTC').dt.tz_localize(None)
+        return ts
+
+    def stations(self):
+        """Station IDs with stored readings."""
+        return sorted(self._watermarks)
+
+    def has_data(self):
+        return bool(self._watermarks)
+
+    def watermark(self, station_id):
+        """Newest stored timestamp of a station, or None."""
+        value = self._watermarks.get(str(station_id))
+        return pd.Timestamp(value) if value is not None else None
+
+    def _prepare(self, df):
+        df = df.copy()
+        df['ts'] = self._naive_utc(df['ts'])
+        df['stationId'] = df['stationId'].astype(str)
+        return df
+
+    @staticmethod
+    def _part_files(month_dir):
+        if not os.path.isdir(month_dir):
+            return []
+        return [os.path.join(month_dir, name) for name in sorted(os.listdir(month_dir)) if name.endswith('.parquet')]
+
+    def _write_part(self, station_id, month, part):
+        """Write one station month's rows as a part file and return its path."""
+        part = part.sort_values('ts', kind='stable')
+        month_dir = os.path.join(self._station_dir(station_id), month)
+        os.makedirs(month_dir, exist_ok=True)
+
+        # Part files are named by their time range, so they sort chronologically
+        first, last = part['ts'].iloc[0].value, part['ts'].iloc[-1].value
+        path = os.path.join(month_dir, f"part-{first:020d}-{last:020d}.parquet")
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(path) + '.', dir=month_dir)
+        os.close(fd)
+        part.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def _refresh_watermark(self, station_id):
+        """Recompute a station's watermark from its newest non-empty month."""
+        station_dir = self._station_dir(station_id)
+        months = sorted(os.listdir(station_dir), reverse=True) if os.path.isdir(station_dir) else []
+        for month in months:
+            paths = self._part_files(os.path.join(station_dir, month))
+            if paths:
+                newest = max(pd.read_parquet(path, columns=['ts'])['ts'].max() for path in paths)
+                self._watermarks[station_id] = newest.isoformat()
+                return
+        self._watermarks.pop(station_id, None)
+
+    def append(self, df):
+        """Add rows newer than each station's watermark.
+
+        Args:
+            df (pandas.DataFrame): Rows with at least ts and stationId columns.
+
+        Returns:
+            int: Number of rows written.
+        """
+        if df is None or df.empty:
+            return 0
+
+        df = self._prepare(df)
+
+        # Drop everything at or before the station's watermark
+        watermarks = df['stationId'].map(
+            lambda station_id: self.watermark(station_id) or pd.Timestamp.min
+        )
+        df = df[df['ts'] > watermarks.astype(df['ts'].dtype)]
+        if df.empty:
+            return 0
+
+        months = df['ts'].dt.strftime('%Y-%m')
+        written = 0
+        for (station_id, month), part in df.groupby([df['stationId'], months], sort=True):
+            self._write_part(station_id, month, part)
+            written += len(part)
+
+        # Watermarks are advanced only after every partition is on disk
+        for station_id, newest in df.groupby('stationId')['ts'].max().items():
+            self._watermarks[station_id] = newest.isoformat()
+        self._write_json(WATERMARKS_FILE, self._watermarks)
+
+        return written
+
+    def replace(self, df, covered=()):
+        """Replace whole station months with the rows of df.
+
+        Every station month df has rows for, plus the (station_id, month) pairs in covered,
+        loses its stored rows and gets df's rows instead, regardless of the watermark. The
+        watermarks of the stations involved are recomputed.
+
+        Args:
+            df (pandas.DataFrame): Rows with at least ts and stationId columns.
+            covered (iterable, optional): Further (station_id, 'YYYY-MM') pairs to clear.
+
+        Returns:
+            int: Number of rows written.
+        """
+        parts = {}
+        if df is not None and not df.empty:
+            df = self._prepare(df)
+            months = df['ts'].dt.strftime('%Y-%m')
+            parts = dict(iter(df.groupby([df['stationId'], months], sort=True)))
+
+        written = 0
+        targets = sorted(set(parts) | {(str(station_id), month) for station_id, month in covered})
+        for station_id, month in targets:
+            month_dir = os.path.join(self._station_dir(station_id), month)
+            stale = self._part_files(month_dir)
+
+            # The new rows are on disk before the old part files go
+            kept = None
+            if (station_id, month) in parts:
+                kept = self._write_part(station_id, month, parts[station_id, month])
+                written += len(parts[station_id, month])
+            for path in stale:
+                if path != kept:
+                    os.remove(path)
+            if os.path.isdir(month_dir) and not os.listdir(month_dir):
+                os.rmdir(month_dir)
+
+        for station_id in {station_id for station_id, _ in targets}:
+            self._refresh_watermark(station_id)
+        self._write_json(WATERMARKS_FILE, self._watermarks)
+
+        return written
+
+    def sync(self, collection, metrics=READING_METRICS, station_ids=None, batch_size=10000,
+             chunk_size=100000):
+        """Fetch readings newer than each station's watermark from MongoDB.
+
+        Args:
+            collection: pymongo collection holding the readings.
+            metrics (list, optional): metrics.* fields to store.
+            station_ids (list, optional): Stations to sync. Defaults to every station in the collection.
+            batch_size (int, optional): MongoDB cursor batch size.
+            chunk_size (int, optional): Rows buffered before they are written to the store.
+
+        Returns:
+            int: Number of new rows stored.
+        """
+        started = time.perf_counter()
+        loader = StreamingReadingsLoader(collection, metrics=metrics, batch_size=batch_size)
+        if station_ids is None:
+            station_ids = collection.distinct('stationId')
+
+        written = 0
+        for station_id in station_ids:
+            # The query keeps the raw ID (e.g. an ObjectId); the store keys by its string form
+            watermark = self.watermark(station_id)
+            start_date = watermark.to_pydatetime() if watermark is not None else None
+            for chunk in loader.iter_chunks(station_id, start_date=start_date, chunk_size=chunk_size):
+                written += self.append(chunk)
+
+        print(f"Synced {written} new readings for {len(station_ids)} stations in "
+              f"{time.perf_counter() - started:.2f}s", file=sys.stderr)
+        return written
+
+    def import_csv(self, csv_path):
+        """Import a CSV export, skipping the parse when the file is unchanged since its last import.
+
+        The first import appends rows newer than the watermarks. Once the file has changed it is
+        taken as authoritative for the station months it covers, now or at its previous import:
+        those months are replaced, so edited or deleted rows at or before the watermark are not
+        served from the store. Rows synced from MongoDB into the same months are replaced too.
+
+        Returns:
+            int: Number of rows stored.
+        """
+        stat = os.stat(csv_path)
+        key = os.path.abspath(csv_path)
+        signature = [stat.st_mtime, stat.st_size]
+        previous = self._sources.get(key)
+        # Stores written before coverage was recorded hold the bare signature
+        if isinstance(previous, list):
+            previous = {'signature': previous, 'partitions': []}
+        if previous is not None and previous['signature'] == signature:
+            return 0
+
+        df = self._prepare(pd.read_csv(csv_path))
+        if previous is None:
+            written = self.append(df)
+        else:
+            written = self.replace(df, covered=previous['partitions'])
+
+        months = df['ts'].dt.strftime('%Y-%m')
+        self._sources[key] = {
+            'signature': signature,
+            'partitions': sorted({(station_id, month) for station_id, month in zip(df['stationId'], months)})
+        }
+        self._write_json(SOURCES_FILE, self._sources)
+        return written
+
+    def partitions(self, station_ids=None, start_date=None, end_date=None):
+        """Part files of the requested stations whose month overlaps [start_date, end_date]."""
+        if station_ids is None:
+            station_ids = self.stations()
+        elif isinstance(station_ids, str) or not np.iterable(station_ids):
+            station_ids = [station_ids]
+
+        first_month = self._naive_utc(start_date).strftime('%Y-%m') if start_date is not None else None
+        last_month = self._naive_utc(end_date).strftime('%Y-%m') if end_date is not None else None
+
+        paths = []
+        for station_id in station_ids:
+            station_dir = self._station_dir(station_id)
+            if not os.path.isdir(station_dir):
+                continue
+            for month in sorted(os.listdir(station_dir)):
+                # YYYY-MM names compare chronologically as strings
+                if first_month is not None and month < first_month:
+                    continue
+                if last_month is not None and month > last_month:
+                    continue
+                paths.extend(self._part_files(os.path.join(station_dir, month)))
+        return paths
+
+    def read(self, station_ids=None, start_date=None, end_date=None, columns=None):
+        """Read stored rows, opening only the partitions that can match.
+
+        Args:
+            station_ids (str or list, optional): Station(s) to read. Defaults to all stations.
+            start_date (datetime, optional): Inclusive start of the time range.
+            end_date (datetime, optional): Inclusive end of the time range.
+            columns (list, optional): Columns to read. ts and stationId are always included.
+
+        Returns:
+            pandas.DataFrame: Matching rows ordered by station and ts.
+        """
+        if columns is not None:
+            columns = ['ts', 'stationId'] + [column for column in columns if column not in ('ts', 'stationId')]
+
+        filters = []
+        if start_date is not None:
+            filters.append(('ts', '>=', self._naive_utc(start_date)))
+        if end_date is not None:
+            filters.append(('ts', '<=', self._naive_utc(end_date)))
+
+        frames = [
+            pd.read_parquet(path, columns=columns, filters=filters or None)
+            for path in self.partitions(station_ids, start_date, end_date)
+        ]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=columns or ['ts', 'stationId'])
+
+        return pd.concat(frames, ignore_index=True)
+
+    def read_csv(self, csv_path, station_ids=None, start_date=None, end_date=None, columns=None):
+        """Import a CSV export if it changed, then read from the store.
+
+        Returns:
+            pandas.DataFrame: Matching rows, or None if neither the CSV nor stored data exist.
+        """
+        if csv_path and os.path.exists(csv_path):
+            self.import_csv(csv_path)
+        if not self.has_data():
+            return None
+        return self.read(station_ids, start_date, end_date, columns)
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local columnar readings store')
+    parser.add_argument('--store', type=str, default=DEFAULT_STORE_DIR, help='Store root directory')
+    parser.add_argument('--dataset', type=str, default='readings', help='Dataset name')
+    parser.add_argument('--sync', action='store_true', help='Fetch new readings from MongoDB')
+    parser.add_argument('--import-csv', type=str, help='Append a CSV export to the dataset')
+    parser.add_argument('--station', type=str, action='append', help='Station ID (repeatable)')
+    args = parser.parse_args()
+
+    store = ReadingsStore(args.store, args.dataset)
+
+    if args.sync:
+        try:
+            from pymongo import MongoClient
+        except ImportError:
+            print("Error: pymongo is required to sync from MongoDB")
+            sys.exit(1)
+        client = MongoClient(os.environ.get('MONGODB_URI'))
+        try:
+            store.sync(client.get_default_database().readings, station_ids=args.station)
+        finally:
+            client.close()
+
+    if args.import_csv:
+        print(f"Imported {store.import_csv(args.import_csv)} new rows from {args.import_csv}")
+
+    for station_id in store.stations():
+        print(f"{station_id}: {len(store.partitions(station_id))} partitions, "
+              f"watermark {store.watermark(station_id)}")
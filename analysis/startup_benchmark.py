@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import subprocess
+import statistics
+
+ANALYSIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Startup target of a predict from a cached model bundle, in milliseconds
+PREDICT_TARGET_MS = 150
+
+
+def benchmark_commands(model_path=None):
+    """Commands whose startup is measured, as argument lists for the Python interpreter.
+
+    'floor' imports only numpy and pandas: no command that returns a DataFrame can start faster.
+    """
+    commands = {
+        'floor': ['-c', 'import numpy, pandas'],
+        'tide --help': ['tide_prediction_model.py', '--help'],
+        'thresholds --help': ['alert_threshold_optimization.py', '--help'],
+        'patterns --help': ['alert_pattern_analysis.py', '--help'],
+        'visualization --help': ['tide_data_visualization.py', '--help'],
+    }
+    if model_path:
+        commands['predict'] = ['tide_prediction_model.py', '--load', os.path.abspath(model_path),
+                               '--predict', '--hours', '24']
+    return commands
+
+
+def parse_importtime(stderr, top=5):
+    """Summarize `python -X importtime` output.
+
+    Args:
+        stderr (str): Captured stderr of the run.
+        top (int, optional): Number of slowest top-level imports to keep.
+
+    Returns:
+        tuple: (total import time in ms, list of (module, cumulative ms) for the slowest top-level imports)
+    """
+    total_us = 0
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        # Nested imports are indented by two spaces per level after the separator
+        if not name[1:].startswith(' '):
+            top_level.append((name.strip(), int(cumulative_us) / 1000))
+
+    top_level.sort(key=lambda item: item[1], reverse=True)
+    return total_us / 1000, top_level[:top]
+
+
+def measure(args, runs=5):
+    """Time fresh interpreter starts of one command.
+
+    One discarded warm-up run fills the OS page cache and the bytecode cache first, so the
+    numbers are those of a cached start.
+
+    Args:
+        args (list): Interpreter arguments, e.g. ['tide_prediction_model.py', '--help'].
+        runs (int, optional): Timed runs.
+
+    Returns:
+        dict: Median and minimum wall time, import time and slowest top-level imports.
+    """
+    command = [sys.executable] + args
+    subprocess.run(command, cwd=ANALYSIS_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=ANALYSIS_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                   text=True)
+        timings.append(1000 * (time.perf_counter() - started))
+        if completed.returncode != 0:
+            raise RuntimeError(f"{' '.join(args)} exited with code {completed.returncode}: {completed.stderr[-500:]}")
+
+    traced = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ANALYSIS_DIR,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    import_ms, slowest = parse_importtime(traced.stderr)
+
+    return {
+        'median_ms': statistics.median(timings),
+        'min_ms': min(timings),
+        'import_ms': import_ms,
+        'slowest_imports': slowest
+    }
+
+
+def run_benchmark(model_path=None, runs=5):
+    """Measure every benchmark command; see benchmark_commands."""
+    return {name: measure(args, runs) for name, args in benchmark_commands(model_path).items()}
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Measure the startup latency of the analysis commands')
+    parser.add_argument('--model', type=str, help='Model bundle for the predict command (skipped without one)')
+    parser.add_argument('--runs', type=int, default=5, help='Timed runs per command')
+    parser.add_argument('--target-ms', type=float, default=PREDICT_TARGET_MS, help='Predict startup target')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--check', action='store_true', help='Exit with status 1 if predict misses the target')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.model, args.runs)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            print(f"{name:<22} {result['median_ms']:7.1f} ms median  {result['min_ms']:7.1f} ms min  "
+                  f"{result['import_ms']:7.1f} ms importing")
+            for module, cumulative_ms in result['slowest_imports']:
+                print(f"{'':<24}{module:<28} {cumulative_ms:7.1f} ms")
+
+    if 'predict' in results:
+        predict_ms = results['predict']['median_ms']
+        print(f"predict: {predict_ms:.1f} ms vs target {args.target_ms:.0f} ms "
+              f"(numpy + pandas floor {results['floor']['median_ms']:.1f} ms): "
+              f"{'OK' if predict_ms <= args.target_ms else 'over target'}", file=sys.stderr)
+        if args.check and predict_ms > args.target_ms:
+            sys.exit(1)
@@ -0,0 +1,258 @@
+import numpy as np
+import pandas as pd
+import sys
+
+# Tidal lag between every pair of stations. Readings are averaged onto a common grid
+# (missing samples masked), and for each pair the Pearson correlation of
+# x_a(t) with x_b(t - k) over the samples both stations have is computed for every lag k
+# from six masked cross-correlations, each one product of per-station FFTs:
+#   n = m_a * m_b,  Sa = x_a * m_b,  Sb = m_a * x_b,  Saa = x_a^2 * m_b,  Sbb = m_a * x_b^2,  Sab = x_a * x_b
+#   r(k) = (n Sab - Sa Sb) / sqrt((n Saa - Sa^2) (n Sbb - Sb^2))
+# This equals Series.corr(other.shift(k)) on the gridded series, for every pair at once.
+
+# Upper bound on the floats of one block of pair spectra
+BLOCK_FLOATS = 2 ** 23
+
+
+def resample_grid(data, value='height', group='stationId', freq='15min'):
+    """Average readings onto a common time grid.
+
+    Args:
+        data (pandas.DataFrame): Readings with ts, group and value columns.
+        value (str, optional): Column to resample.
+        group (str, optional): Column identifying stations.
+        freq (str, optional): Grid spacing.
+
+    Returns:
+        tuple: (station IDs, grid start Timestamp, step Timedelta, (stations x samples) array
+        with NaN where a station has no reading).
+    """
+    step = pd.Timedelta(freq)
+    ts = pd.to_datetime(data['ts'])
+    start = ts.min().floor(freq)
+    slots = ((ts - start) // step).to_numpy(dtype=np.int64)
+    codes, stations = pd.factorize(data[group], sort=True)
+    values = data[value].to_numpy(dtype=np.float64)
+
+    valid = ~np.isnan(values)
+    n_samples = int(slots.max()) + 1 if len(slots) else 0
+    cells = codes[valid] * n_samples + slots[valid]
+    size = len(stations) * n_samples
+    sums = np.bincount(cells, weights=values[valid], minlength=size)
+    counts = np.bincount(cells, minlength=size)
+    with np.errstate(invalid='ignore'):
+        grid = (sums / counts).reshape(len(stations), n_samples)
+    return np.asarray(stations), start, step, grid
+
+
+class LagMatrix:
+    def __init__(self, stations, lags, correlations, overlaps, step, max_lag):
+        """Peak cross-correlation and its lag for every ordered pair of stations.
+
+        lags[a, b] is the lag k (in samples) maximizing corr(x_a(t), x_b(t - k)): positive when
+        station b's tide arrives k samples before station a's. lags[b, a] == -lags[a, b].
+
+        Args:
+            stations (array-like): Station IDs, the row / column order.
+            lags (numpy.ndarray): (stations x stations) lags in samples, 0 where undefined.
+            correlations (numpy.ndarray): Peak correlations, NaN where undefined.
+            overlaps (numpy.ndarray): Samples both stations have at the peak lag.
+            step (pandas.Timedelta): Grid spacing.
+            max_lag (int): Largest lag searched, in samples.
+        """
+        self.stations = np.asarray(stations).astype(str)
+        self.lags = lags
+        self.correlations = correlations
+        self.overlaps = overlaps
+        self.step = pd.Timedelta(step)
+        self.max_lag = int(max_lag)
+        self._index = {station: i for i, station in enumerate(self.stations)}
+
+    @property
+    def lag_hours(self):
+        return self.lags * (self.step / pd.Timedelta(hours=1))
+
+    def query(self, station_a, station_b):
+        """Peak lag (samples and hours), correlation and overlap of one pair."""
+        a, b = self._index[str(station_a)], self._index[str(station_b)]
+        return {
+            'lag': int(self.lags[a, b]),
+            'lag_hours': float(self.lag_hours[a, b]),
+            'correlation': float(self.correlations[a, b]),
+            'overlap': int(self.overlaps[a, b])
+        }
+
+    def to_frame(self):
+        """Long table of every ordered pair of distinct stations."""
+        a, b = np.nonzero(~np.eye(len(self.stations), dtype=bool))
+        return pd.DataFrame({
+            'station_a': self.stations[a],
+            'station_b': self.stations[b],
+            'lag_hours': self.lag_hours[a, b],
+            'correlation': self.correlations[a, b],
+            'overlap': self.overlaps[a, b]
+        })
+
+    def save(self, path):
+        """Write the matrix to a .npz file."""
+        np.savez(
+            path,
+            stations=self.stations,
+            lags=self.lags,
+            correlations=self.correlations,
+            overlaps=self.overlaps,
+            step_seconds=self.step.total_seconds(),
+            max_lag=self.max_lag
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            return cls(
+                saved['stations'],
+                saved['lags'],
+                saved['correlations'],
+                saved['overlaps'],
+                pd.Timedelta(seconds=float(saved['step_seconds'])),
+                int(saved['max_lag'])
+            )
+
+
+class CrossCorrelator:
+    def __init__(self, grid, max_lag, min_overlap=24):
+        """Batched masked cross-correlation of the rows of a (stations x samples) grid.
+
+        The spectra of every station are computed once; pair spectra are formed in blocks of
+        stations so memory stays bounded for hundreds of stations.
+
+        Args:
+            grid (numpy.ndarray): Resampled values, NaN where missing (see resample_grid).
+            max_lag (int): Largest lag in samples, in both directions.
+            min_overlap (int, optional): Fewest shared samples for a lag to count.
+        """
+        grid = np.asarray(grid, dtype=np.float64)
+        self.n_stations, n_samples = grid.shape
+        self.max_lag = min(int(max_lag), max(n_samples - 1, 0))
+        self.min_overlap = max(int(min_overlap), 2)
+
+        mask = ~np.isnan(grid)
+        # Centering each station keeps the sums of squares small relative to the variance
+        counts = np.maximum(mask.sum(axis=1, keepdims=True), 1)
+        means = np.where(mask, grid, 0.0).sum(axis=1, keepdims=True) / counts
+        values = np.where(mask, grid - means, 0.0)
+
+        # Zero padding to at least n_samples + max_lag makes the circular correlation linear
+        self.n_fft = 1 << int(np.ceil(np.log2(max(n_samples + self.max_lag, 2))))
+        fft = lambda x: np.fft.rfft(x, n=self.n_fft, axis=1)
+        self._mask = fft(mask.astype(np.float64))
+        self._values = fft(values)
+        self._squares = fft(values * values)
+
+    def _pair_sums(self, rows, cols):
+        """The six lagged sums of rows x cols, lags -max_lag..max_lag on the last axis."""
+        lag_index = np.r_[self.n_fft - self.max_lag:self.n_fft, 0:self.max_lag + 1]
+
+        def xcorr(left, right):
+            # sum_t u_a(t) v_b(t - k) for every lag k
+            spectrum = left[rows, None, :] * np.conj(right[None, cols, :])
+            return np.fft.irfft(spectrum, n=self.n_fft, axis=2)[:, :, lag_index]
+
+        return {
+            'n': np.round(xcorr(self._mask, self._mask)),
+            'sa': xcorr(self._values, self._mask),
+            'sb': xcorr(self._mask, self._values),
+            'saa': xcorr(self._squares, self._mask),
+            'sbb': xcorr(self._mask, self._squares),
+            'sab': xcorr(self._values, self._values)
+        }
+
+    def _correlate(self, rows, cols):
+        sums = self._pair_sums(rows, cols)
+        n = sums['n']
+        covariance = n * sums['sab'] - sums['sa'] * sums['sb']
+        variance_a = n * sums['saa'] - sums['sa'] ** 2
+        variance_b = n * sums['sbb'] - sums['sb'] ** 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = covariance / np.sqrt(variance_a * variance_b)
+        defined = (n >= self.min_overlap) & (variance_a > 1e-12 * n * n) & (variance_b > 1e-12 * n * n)
+        return np.where(defined, np.clip(r, -1.0, 1.0), np.nan), n
+
+    def spectrum(self, a, b):
+        """Correlation at every lag -max_lag..max_lag between rows a and b."""
+        r, _ = self._correlate(np.array([a]), np.array([b]))
+        return r[0, 0]
+
+    def lag_matrix(self, stations, step):
+        """Peak correlation and lag of every pair, computed block by block.
+
+        Only pairs (a, b) with a <= b are correlated; r_ba(k) = r_ab(-k) fills in the rest.
+        """
+        S = self.n_stations
+        lags = np.zeros((S, S), dtype=np.int64)
+        correlations = np.full((S, S), np.nan)
+        overlaps = np.zeros((S, S), dtype=np.int64)
+        per_row = S * max(self.n_fft, 2 * self.max_lag + 1)
+        block = max(1, BLOCK_FLOATS // max(per_row, 1))
+        for start in range(0, S, block):
+            rows = np.arange(start, min(start + block, S))
+            cols = np.arange(start, S)
+            r, n = self._correlate(rows, cols)
+            has_peak = ~np.isnan(r).all(axis=2)
+            peak = np.argmax(np.where(np.isnan(r), -np.inf, r), axis=2)
+            block_lags = np.where(has_peak, peak - self.max_lag, 0)
+            block_correlations = np.where(has_peak, np.take_along_axis(r, peak[..., None], axis=2)[..., 0], np.nan)
+            block_overlaps = np.where(has_peak, np.take_along_axis(n, peak[..., None], axis=2)[..., 0], 0)
+            lags[np.ix_(cols, rows)] = -block_lags.T
+            correlations[np.ix_(cols, rows)] = block_correlations.T
+            overlaps[np.ix_(cols, rows)] = block_overlaps.T
+            lags[np.ix_(rows, cols)] = block_lags
+            correlations[np.ix_(rows, cols)] = block_correlations
+            overlaps[np.ix_(rows, cols)] = block_overlaps
+        return LagMatrix(stations, lags, correlations, overlaps, step, self.max_lag)
+
+
+def station_lags(data, value='height', group='stationId', freq='15min', max_lag_hours=12, min_overlap=24):
+    """LagMatrix of all station pairs in data.
+
+    Args:
+        data (pandas.DataFrame): Readings with ts, group and value columns.
+        value (str, optional): Column to correlate.
+        group (str, optional): Column identifying stations.
+        freq (str, optional): Common grid spacing.
+        max_lag_hours (float, optional): Largest lag searched in each direction.
+        min_overlap (int, optional): Fewest shared samples for a lag to count.
+
+    Returns:
+        LagMatrix: Peak lags and correlations.
+    """
+    stations, _, step, grid = resample_grid(data, value=value, group=group, freq=freq)
+    max_lag = int(round(pd.Timedelta(hours=max_lag_hours) / step))
+    return CrossCorrelator(grid, max_lag, min_overlap=min_overlap).lag_matrix(stations, step)
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Tidal lag between every pair of stations')
+    parser.add_argument('csv', type=str, help='CSV with ts, stationId and a height column')
+    parser.add_argument('--value', type=str, default='height', help='Height column, e.g. tide_m')
+    parser.add_argument('--freq', type=str, default='15min', help='Common grid spacing')
+    parser.add_argument('--max-lag-hours', type=float, default=12, help='Largest lag searched in each direction')
+    parser.add_argument('--save', type=str, help='Write the lag matrix to this .npz file')
+    parser.add_argument('--query', type=str, nargs=2, metavar=('STATION_A', 'STATION_B'),
+                        help='Print the peak lag of one pair')
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.csv, parse_dates=['ts'])
+    started = time.perf_counter()
+    matrix = station_lags(data, value=args.value, freq=args.freq, max_lag_hours=args.max_lag_hours)
+    print(f"{len(matrix.stations)} stations in {1000 * (time.perf_counter() - started):.1f} ms", file=sys.stderr)
+
+    if args.save:
+        matrix.save(args.save)
+    if args.query:
+        print(matrix.query(*args.query))
+    else:
+        matrix.to_frame().to_csv(sys.stdout, index=False)
@@ -0,0 +1,306 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+import math
+
+from model_bundle import is_bundle, load_classifier_bundle, read_header
+
+# Real-time scoring of readings against the alert threshold model. Every station keeps a ring
+# of its last `window` heights with their running sum and sum of squares, so each reading
+# updates rate_of_change, the rolling mean / std / z-score and the cyclical time features in
+# O(1) instead of preprocess_data recomputing them over the whole history. Against
+# preprocess_data (alert_threshold_optimization.FEATURE_SPEC) height, rate_of_change and the
+# time features are identical and NaN exactly where it drops the row. The rolling mean, std
+# and z-score agree to about 1e-11 relative but not bit for bit: grouped_rolling centers its
+# sums on the mean of a station's whole history, which a stream has not seen yet, so the
+# same values are added in a different order. The replay below fails beyond REPLAY_TOLERANCE.
+
+DEFAULT_BUNDLE_PATH = os.path.join('models', 'alert_threshold_model.bundle')
+
+# Largest relative feature difference to preprocess_data the replay check accepts
+REPLAY_TOLERANCE = 1e-9
+
+# Columns update() returns, a superset of the model's features
+STREAM_FEATURES = (
+    'height', 'rate_of_change', 'time_rad', 'sin_time', 'cos_time', 'day_rad', 'sin_day', 'cos_day',
+    'height_rolling_mean', 'height_rolling_std', 'height_zscore'
+)
+
+
+class _StationState:
+    """Rolling window of one station."""
+
+    __slots__ = ('ring', 'seen', 'shift', 'total', 'squares', 'count', 'last_ts', 'last_height',
+                 'last_valid', 'last_valid_value', 'change_before')
+
+    def __init__(self, window):
+        self.ring = [math.nan] * window
+        self.seen = 0
+        # Sums are of height - shift (the station's first height) to keep them small
+        self.shift = None
+        self.total = 0.0
+        self.squares = 0.0
+        self.count = 0
+        self.last_ts = None
+        self.last_height = math.nan
+        # Reading number and value of the last valid height, and the reading number of the
+        # valid height before the most recent change of value: the window is constant (std
+        # exactly 0, as grouped_rolling reports it) when that reading is outside the window
+        self.last_valid = -1
+        self.last_valid_value = math.nan
+        self.change_before = -1
+
+
+class StreamingFeatures:
+    def __init__(self, window=12):
+        """Per-station incremental features of the alert threshold model.
+
+        Rolling sums are updated by adding the new height and removing the one leaving the
+        window, and re-summed from the ring each time it wraps so rounding never accumulates
+        beyond one window. Readings of a station must arrive in time order; older readings
+        are skipped and counted in out_of_order.
+
+        Args:
+            window (int, optional): Rolling window in readings, FEATURE_SPEC.rolling_window.
+        """
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self._stations = {}
+        self.readings = 0
+        self.out_of_order = 0
+
+    def reset(self, station_id=None):
+        """Forget the history of one station, or of all of them."""
+        if station_id is None:
+            self._stations.clear()
+        else:
+            self._stations.pop(station_id, None)
+
+    def update(self, station_id, ts, height, rate_of_change=None):
+        """Add one reading and return its features.
+
+        Args:
+            station_id (str): Station of the reading.
+            ts (pandas.Timestamp or datetime): Reading time.
+            height (float): Measured height, NaN if missing.
+            rate_of_change (float, optional): Rate supplied with the reading; by default the
+                difference from the station's previous height.
+
+        Returns:
+            tuple: Values in STREAM_FEATURES order, NaN where preprocess_data has none (such
+            rows are dropped there), or None for a reading older than the station's last.
+        """
+        state = self._stations.get(station_id)
+        if state is None:
+            state = self._stations[station_id] = _StationState(self.window)
+        if state.last_ts is not None and ts < state.last_ts:
+            self.out_of_order += 1
+            return None
+        self.readings += 1
+        height = float(height)
+
+        if rate_of_change is None:
+            rate_of_change = height - state.last_height
+        state.last_ts = ts
+        state.last_height = height
+
+        # Slide the window: drop the height leaving it, add the new one
+        slot = state.seen % self.window
+        leaving = state.ring[slot]
+        if leaving == leaving:
+            deviation = leaving - state.shift
+            state.total -= deviation
+            state.squares -= deviation * deviation
+            state.count -= 1
+        state.ring[slot] = height
+        if height == height:
+            if state.shift is None:
+                state.shift = height
+            deviation = height - state.shift
+            state.total += deviation
+            state.squares += deviation * deviation
+            state.count += 1
+            if state.last_valid >= 0 and state.last_valid_value != height:
+                state.change_before = state.last_valid
+            state.last_valid = state.seen
+            state.last_valid_value = height
+        state.seen += 1
+        if slot == self.window - 1:
+            self._resum(state)
+
+        count = state.count
+        if count:
+            local_mean = state.total / count
+            mean = state.shift + local_mean
+        else:
+            mean = math.nan
+        if count >= 2:
+            if state.change_before < state.seen - self.window:
+                std = 0.0
+            else:
+                spread = state.squares - state.total * local_mean
+                if spread < 1e-6 * state.squares:
+                    # Most of the sum of squares cancelled; recompute from the ring
+                    spread = math.fsum((value - mean) ** 2 for value in state.ring if value == value)
+                std = math.sqrt(max(spread, 0.0) / (count - 1))
+        else:
+            std = math.nan
+        zscore = (height - mean) / (std if std != 0 else 1.0)
+
+        time_rad = 2 * math.pi * (ts.hour * 60 + ts.minute) / (24 * 60)
+        day_rad = 2 * math.pi * ts.timetuple().tm_yday / 365.25
+        return (height, float(rate_of_change), time_rad, math.sin(time_rad), math.cos(time_rad),
+                day_rad, math.sin(day_rad), math.cos(day_rad), mean, std, zscore)
+
+    def _resum(self, state):
+        valid = [value - state.shift for value in state.ring if value == value]
+        state.total = math.fsum(valid)
+        state.squares = math.fsum(value * value for value in valid)
+        state.count = len(valid)
+
+
+class StreamingAlertScorer:
+    def __init__(self, model, scaler, features, thresholds, window=12):
+        """Scores readings as they arrive with the alert threshold model.
+
+        Args:
+            model: Classifier with predict_proba (FlatForest or scikit-learn forest).
+            scaler: Fitted scaler with transform.
+            features (list): Model feature names, each one of STREAM_FEATURES.
+            thresholds (dict): Threshold name to alert probability threshold.
+            window (int, optional): Rolling window in readings.
+        """
+        unknown = set(features) - set(STREAM_FEATURES)
+        if unknown:
+            raise ValueError(f"Features not computed by the streaming scorer: {sorted(unknown)}")
+        self.model = model
+        self.scaler = scaler
+        self.features = list(features)
+        self.thresholds = dict(thresholds or {})
+        self.state = StreamingFeatures(window)
+        self._columns = [STREAM_FEATURES.index(name) for name in self.features]
+
+    @classmethod
+    def from_bundle(cls, path=DEFAULT_BUNDLE_PATH, thresholds_path=None, window=12):
+        """Scorer for the bundle written by alert_threshold_optimization.py.
+
+        thresholds_path overrides the bundle's thresholds, with another bundle or a legacy
+        alert_thresholds.pkl.
+        """
+        model, scaler, features, thresholds = load_classifier_bundle(path)
+        if thresholds_path is not None:
+            if is_bundle(thresholds_path):
+                thresholds = read_header(thresholds_path)['thresholds']
+            else:
+                import joblib
+                thresholds = joblib.load(thresholds_path)
+        return cls(model, scaler, features, thresholds, window=window)
+
+    def _probabilities(self, X):
+        """Alert probability of every row of X, NaN for rows with a missing feature."""
+        probabilities = np.full(len(X), np.nan)
+        complete = ~np.isnan(X).any(axis=1)
+        if complete.any():
+            probabilities[complete] = self.model.predict_proba(self.scaler.transform(X[complete]))[:, 1]
+        return probabilities
+
+    def score(self, station_id, ts, height, rate_of_change=None):
+        """Update the station's state with one reading and score it.
+
+        Returns:
+            dict: The features, probability and one boolean per threshold, or None for a
+            reading older than the station's last.
+        """
+        row = self.state.update(station_id, ts, height, rate_of_change)
+        if row is None:
+            return None
+        probability = self._probabilities(np.array([[row[i] for i in self._columns]]))[0]
+        result = dict(zip(STREAM_FEATURES, row))
+        result['probability'] = probability
+        for name, threshold in self.thresholds.items():
+            result[f'{name}_alert'] = bool(probability >= threshold)
+        return result
+
+    def score_batch(self, readings):
+        """Update the state with every reading of a batch, in row order, and score them together.
+
+        The state is updated one reading at a time; the model runs once for the batch.
+
+        Args:
+            readings (pandas.DataFrame): stationId, ts, height and optionally rate_of_change.
+
+        Returns:
+            pandas.DataFrame: stationId, ts, STREAM_FEATURES, probability and <threshold>_alert
+            for the scored readings (out-of-order readings are left out), in row order.
+        """
+        ts = pd.to_datetime(readings['ts'])
+        rates = readings['rate_of_change'] if 'rate_of_change' in readings else [None] * len(readings)
+        update = self.state.update
+        rows, kept = [], []
+        for i, (station_id, when, height, rate) in enumerate(zip(readings['stationId'], ts, readings['height'], rates)):
+            row = update(station_id, when, height, rate)
+            if row is not None:
+                rows.append(row)
+                kept.append(i)
+
+        values = np.array(rows, dtype=np.float64).reshape(len(rows), len(STREAM_FEATURES))
+        result = pd.DataFrame(values, columns=list(STREAM_FEATURES))
+        result.insert(0, 'ts', ts.to_numpy()[kept])
+        result.insert(0, 'stationId', readings['stationId'].to_numpy()[kept])
+        probabilities = self._probabilities(values[:, self._columns])
+        result['probability'] = probabilities
+        for name, threshold in self.thresholds.items():
+            result[f'{name}_alert'] = probabilities >= threshold
+        return result
+
+    def stats(self):
+        return {
+            'stations': len(self.state._stations),
+            'readings': self.state.readings,
+            'out_of_order': self.state.out_of_order
+        }
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from alert_threshold_optimization import preprocess_data
+
+    parser = argparse.ArgumentParser(description='Replay a CSV export through the streaming alert scorer')
+    parser.add_argument('csv', type=str, help='CSV with ts, stationId, height (and rate_of_change) columns')
+    parser.add_argument('--bundle', type=str, default=DEFAULT_BUNDLE_PATH, help='Alert model bundle')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Readings scored per model call')
+    parser.add_argument('--output', type=str, help='Write the scored readings to this CSV')
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.csv, parse_dates=['ts'])
+    # Replay in arrival order
+    readings = data.sort_values('ts', kind='stable').reset_index(drop=True)
+    scorer = StreamingAlertScorer.from_bundle(args.bundle)
+
+    started = time.perf_counter()
+    scored = pd.concat([
+        scorer.score_batch(readings.iloc[start:start + args.batch_size])
+        for start in range(0, len(readings), args.batch_size)
+    ], ignore_index=True)
+    elapsed = time.perf_counter() - started
+    print(f"{len(scored)} readings in {elapsed:.2f} s ({len(scored) / max(elapsed, 1e-9):,.0f} readings/s)",
+          file=sys.stderr)
+
+    # The features of every row preprocess_data keeps must be the streamed ones
+    expected = preprocess_data(data)
+    streamed = scored.set_index(['stationId', 'ts']).loc[pd.MultiIndex.from_frame(expected[['stationId', 'ts']])]
+    columns = [name for name in STREAM_FEATURES if name in expected]
+    worst = np.max(np.abs(streamed[columns].to_numpy() - expected[columns].to_numpy()) /
+                   np.maximum(np.abs(expected[columns].to_numpy()), 1.0))
+    print(f"Largest relative feature difference to preprocess_data: {worst:.2e}", file=sys.stderr)
+
+    if args.output:
+        scored.to_csv(args.output, index=False)
+    if not worst <= REPLAY_TOLERANCE:
+        print(f"Streamed features differ from preprocess_data by more than {REPLAY_TOLERANCE:g}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,239 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+
+# Synthetic tide readings (and the alerts they trigger) for any number of stations, generated
+# in chunks of rows so the output size is bounded only by disk. Each chunk covers a slice of
+# time for every station at once: heights, the alert rule and the alert attributes are all
+# array operations, and rows are written to CSV or Parquet as soon as a chunk is ready.
+
+# Alert rule thresholds; a reading gets the first matching type in ALERT_TYPES order
+HIGH_TIDE_THRESHOLD = 2.0
+LOW_TIDE_THRESHOLD = -0.5
+RAPID_RISE_THRESHOLD = 0.3
+RAPID_FALL_THRESHOLD = -0.3
+ALERT_TYPES = ('HIGH_TIDE', 'LOW_TIDE', 'RAPID_RISE', 'RAPID_FALL')
+ALERT_MESSAGES = {
+    'HIGH_TIDE': 'High tide alert for ',
+    'LOW_TIDE': 'Low tide alert for ',
+    'RAPID_RISE': 'Rapid tide rise alert for ',
+    'RAPID_FALL': 'Rapid tide fall alert for '
+}
+
+# Per alert type: probability of being acknowledged, and of low / medium / high severity
+ACKNOWLEDGED_P = np.array([0.7, 0.7, 0.6, 0.6])
+SEVERITIES = np.array(['low', 'medium', 'high'], dtype=object)
+SEVERITY_P = np.array([
+    [0.2, 0.5, 0.3],
+    [0.3, 0.5, 0.2],
+    [0.1, 0.4, 0.5],
+    [0.2, 0.5, 0.3]
+])
+
+
+def station_table(n_stations, rng):
+    """Station metadata and tide constituents: random locations around the UK coast and
+    random amplitude and phases per station."""
+    ids = np.arange(1, n_stations + 1).astype(str)
+    return pd.DataFrame({
+        'stationId': np.char.add('station-', ids).astype(object),
+        'stationName': np.char.add('Station ', ids).astype(object),
+        'latitude': 50.5 + rng.random(n_stations) * 5,
+        'longitude': -5.5 + rng.random(n_stations) * 5,
+        'amplitude': 1.5 + rng.random(n_stations) * 1.0,
+        'phase': rng.random(n_stations) * np.pi,
+        'diurnal_phase': rng.random(n_stations) * np.pi,
+        'trend_phase': rng.random(n_stations) * np.pi,
+        'spring_neap_phase': rng.random(n_stations) * np.pi
+    })
+
+
+def tide_heights(stations, time_values, n_days, rng):
+    """(stations x samples) heights at the given time values.
+
+    Semidiurnal tide, diurnal inequality, a long-term trend and noise, scaled by a
+    spring-neap cycle (approximately 14.77 days).
+    """
+    t = time_values[None, :]
+    column = lambda name: stations[name].to_numpy()[:, None]
+    heights = column('amplitude') * np.sin(t + column('phase'))
+    heights += 0.3 * np.sin(t / 2 + column('diurnal_phase'))
+    heights += 0.5 * np.sin(t / (n_days / 2) + column('trend_phase'))
+    heights += 0.1 * rng.standard_normal(heights.shape)
+    heights *= 1 + 0.4 * np.sin(t * (2 / 14.77) + column('spring_neap_phase'))
+    return heights
+
+
+def label_alerts(heights, rate_of_change):
+    """Index into ALERT_TYPES of the first rule each reading triggers, -1 for none."""
+    return np.select(
+        [heights > HIGH_TIDE_THRESHOLD, heights < LOW_TIDE_THRESHOLD,
+         rate_of_change > RAPID_RISE_THRESHOLD, rate_of_change < RAPID_FALL_THRESHOLD],
+        [0, 1, 2, 3],
+        default=-1
+    )
+
+
+def sample_alert_attributes(type_codes, rng):
+    """Acknowledged flags and severity codes (into SEVERITIES) for alerts of the given type codes."""
+    acknowledged = rng.random(len(type_codes)) < ACKNOWLEDGED_P[type_codes]
+    # Inverse CDF of each alert's severity distribution
+    cdf = np.cumsum(SEVERITY_P[type_codes], axis=1)
+    severity = (rng.random(len(type_codes))[:, None] > cdf[:, :-1]).sum(axis=1)
+    return acknowledged, severity
+
+
+def generate_chunks(n_days=60, n_stations=3, freq='15min', end_time=None, alerts=True,
+                    chunk_rows=1_000_000, seed=42):
+    """Yield synthetic readings as DataFrames of about chunk_rows rows.
+
+    Chunks follow each other in time; within a chunk rows are ordered by station and time.
+
+    Args:
+        n_days (float, optional): Length of the series.
+        n_stations (int, optional): Number of stations.
+        freq (str, optional): Reading interval.
+        end_time (pandas.Timestamp, optional): Last reading, now by default.
+        alerts (bool, optional): Add rate_of_change, has_alert and the alert columns
+            (alert_id, alert_type, message, acknowledged, severity, kind, area).
+        chunk_rows (int, optional): Target rows per chunk.
+        seed (int, optional): Random seed.
+
+    Yields:
+        pandas.DataFrame: The next chunk of readings.
+    """
+    rng = np.random.default_rng(seed)
+    end_time = pd.Timestamp.now() if end_time is None else pd.Timestamp(end_time)
+    step = pd.Timedelta(freq)
+    n_samples = int(pd.Timedelta(days=n_days) // step) + 1
+    start_time = end_time - (n_samples - 1) * step
+    # n_days / 2 complete cycles over the series
+    radians_per_sample = np.pi * n_days / max(n_samples - 1, 1)
+
+    stations = station_table(n_stations, rng)
+    station_ids = stations['stationId'].to_numpy()
+    names = stations['stationName'].to_numpy()
+    # Every (alert type, station) message, indexed by type * n_stations + station
+    messages = np.concatenate([ALERT_MESSAGES[t] + names for t in ALERT_TYPES])
+    areas = 'Area near ' + names
+    slice_samples = max(1, chunk_rows // n_stations)
+    previous = None
+    next_alert = 1
+
+    for first in range(0, n_samples, slice_samples):
+        sample_index = np.arange(first, min(first + slice_samples, n_samples))
+        heights = tide_heights(stations, sample_index * radians_per_sample, n_days, rng)
+        # The first reading of each station has no rate of change; later slices continue the series
+        rate_of_change = np.diff(heights, axis=1, prepend=heights[:, :1] if previous is None else previous)
+        previous = heights[:, -1:]
+
+        station_rows = np.repeat(np.arange(n_stations), len(sample_index))
+        samples = np.tile(sample_index, n_stations)
+        chunk = pd.DataFrame({
+            'reading_id': pd.Series(station_ids[station_rows]) + '-' + pd.Series(samples).astype(str),
+            'ts': start_time + pd.to_timedelta(samples * step.value, unit='ns'),
+            'height': heights.ravel(),
+            'type': pd.Categorical.from_codes(np.zeros(len(samples), dtype=np.int8), ['prediction'])
+        })
+        if alerts:
+            chunk['rate_of_change'] = rate_of_change.ravel()
+        # Repeated strings are categoricals: codes per row instead of a Python string per row
+        for column in ('stationId', 'stationName'):
+            chunk[column] = pd.Categorical.from_codes(station_rows, stations[column])
+        for column in ('latitude', 'longitude'):
+            chunk[column] = stations[column].to_numpy()[station_rows]
+
+        if alerts:
+            type_codes = label_alerts(heights, rate_of_change).ravel()
+            rows = np.flatnonzero(type_codes >= 0)
+            codes = type_codes[rows]
+            acknowledged, severity = sample_alert_attributes(codes, rng)
+
+            def alert_column(row_codes, categories):
+                full = np.full(len(chunk), -1, dtype=np.int64)
+                full[rows] = row_codes
+                return pd.Categorical.from_codes(full, categories)
+
+            chunk['has_alert'] = type_codes >= 0
+            alert_ids = np.full(len(chunk), np.nan, dtype=object)
+            alert_ids[rows] = np.char.add('alert-', np.arange(next_alert, next_alert + len(rows)).astype(str))
+            chunk['alert_id'] = alert_ids
+            chunk['alert_type'] = alert_column(codes, ALERT_TYPES)
+            chunk['message'] = alert_column(codes * n_stations + station_rows[rows], messages)
+            flags = np.full(len(chunk), np.nan, dtype=object)
+            flags[rows] = acknowledged
+            chunk['acknowledged'] = flags
+            chunk['severity'] = alert_column(severity, SEVERITIES)
+            chunk['kind'] = alert_column(np.zeros(len(rows), dtype=np.int64), ['tide'])
+            chunk['area'] = alert_column(station_rows[rows], areas)
+            next_alert += len(rows)
+
+        yield chunk
+
+
+def generate_frame(**kwargs):
+    """All chunks of generate_chunks in one DataFrame of plain columns, for small datasets."""
+    frame = pd.concat(generate_chunks(**kwargs), ignore_index=True)
+    categorical = frame.select_dtypes('category').columns
+    return frame.astype({column: object for column in categorical})
+
+
+def write_chunks(chunks, path):
+    """Stream chunks to a CSV or (by extension) Parquet file; returns the number of rows."""
+    rows = 0
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    # Alert columns of a chunk without alerts are all null; fix their type up front
+                    schema = pa.schema([
+                        field.with_type(pa.bool_() if field.name == 'acknowledged' else pa.string())
+                        if pa.types.is_null(field.type) else field
+                        for field in table.schema
+                    ])
+                    writer = pq.ParquetWriter(path, schema)
+                writer.write_table(table.cast(writer.schema))
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+        rows += len(chunk)
+    return rows
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Generate synthetic tide readings and alerts for load tests')
+    parser.add_argument('output', type=str, help='Output file, .csv or .parquet')
+    parser.add_argument('--stations', type=int, default=1000, help='Number of stations')
+    parser.add_argument('--days', type=float, default=365, help='Days of readings per station')
+    parser.add_argument('--freq', type=str, default='15min', help='Reading interval')
+    parser.add_argument('--no-alerts', action='store_true', help='Readings only, as tide_data.csv')
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000, help='Rows generated and written at a time')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    started = time.perf_counter()
+    rows = write_chunks(generate_chunks(
+        n_days=args.days, n_stations=args.stations, freq=args.freq, alerts=not args.no_alerts,
+        chunk_rows=args.chunk_rows, seed=args.seed
+    ), args.output)
+    elapsed = time.perf_counter() - started
+    print(f"{rows} rows written to {args.output} in {elapsed:.1f} s ({rows / max(elapsed, 1e-9):,.0f} rows/s)",
+          file=sys.stderr)
@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+import sys
+
+# Cost-optimal alert thresholds for many groups (e.g. station x alert type) at once. Scores are
+# sorted once by (group, score descending); cumulative true / false positive counts along
+# that order give the confusion matrix of every candidate threshold of every group, the
+# cost matrix turns them into costs, and each group keeps its cheapest threshold. Alerting
+# means score >= threshold; "never alert" (threshold inf) is always a candidate.
+
+# Rows: actual (quiet, alert); columns: decided (quiet, alert), as sklearn's confusion_matrix
+DEFAULT_COSTS = np.array([
+    [0.0, 1.0],   # false alarm
+    [10.0, 0.0]   # missed alert
+])
+
+RESULT_COLUMNS = ('threshold', 'cost', 'cost_per_reading', 'samples', 'positives',
+                  'tp', 'fp', 'fn', 'tn', 'precision', 'recall', 'fallback')
+
+
+def _cost_matrices(costs, group_types):
+    """(groups x 2 x 2) cost matrices: one matrix for all, or a dict keyed by alert type."""
+    if isinstance(costs, dict):
+        default = np.asarray(costs.get('default', DEFAULT_COSTS), dtype=np.float64)
+        return np.stack([np.asarray(costs.get(t, default), dtype=np.float64) for t in group_types])
+    return np.broadcast_to(np.asarray(costs, dtype=np.float64), (len(group_types), 2, 2))
+
+
+def sweep(scores, labels, codes, n_groups, cost_matrices):
+    """Cheapest threshold of every group of codes.
+
+    Args:
+        scores (numpy.ndarray): Alert probabilities (or any score, higher means alert).
+        labels (numpy.ndarray): Whether an alert was warranted.
+        codes (numpy.ndarray): Group index (0..n_groups - 1) of every score.
+        n_groups (int): Number of groups.
+        cost_matrices (numpy.ndarray): (n_groups x 2 x 2) costs, see DEFAULT_COSTS.
+
+    Returns:
+        dict: Per group arrays threshold, cost, tp, fp, samples and positives.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels, dtype=bool)
+    codes = np.asarray(codes, dtype=np.int64)
+
+    order = np.lexsort((-scores, codes))
+    scores, labels, codes = scores[order], labels[order], codes[order]
+    samples = np.bincount(codes, minlength=n_groups)
+    positives = np.bincount(codes, weights=labels, minlength=n_groups)
+    starts = np.cumsum(samples) - samples
+
+    # Counts decided as alerts when the threshold is each row's score, restarted per group
+    tp_all = np.cumsum(labels)
+    fp_all = np.cumsum(~labels)
+    before_tp = np.where(starts > 0, tp_all[np.maximum(starts - 1, 0)], 0)
+    before_fp = np.where(starts > 0, fp_all[np.maximum(starts - 1, 0)], 0)
+    tp = tp_all - before_tp[codes]
+    fp = fp_all - before_fp[codes]
+
+    # Tied scores are one threshold: keep the last row of every run of equal scores
+    last = np.ones(len(scores), dtype=bool)
+    last[:-1] = (codes[1:] != codes[:-1]) | (scores[1:] != scores[:-1])
+    rows = np.flatnonzero(last)
+    candidate_codes = codes[rows]
+    tp, fp = tp[rows].astype(np.float64), fp[rows].astype(np.float64)
+    fn = positives[candidate_codes] - tp
+    tn = (samples - positives)[candidate_codes] - fp
+    c = cost_matrices[candidate_codes]
+    cost = c[:, 0, 0] * tn + c[:, 0, 1] * fp + c[:, 1, 0] * fn + c[:, 1, 1] * tp
+
+    # Never alerting: every positive missed, every negative quiet
+    quiet_cost = cost_matrices[:, 1, 0] * positives + cost_matrices[:, 0, 0] * (samples - positives)
+    candidate_codes = np.concatenate([candidate_codes, np.arange(n_groups)])
+    thresholds = np.concatenate([scores[rows], np.full(n_groups, np.inf)])
+    cost = np.concatenate([cost, quiet_cost])
+    tp = np.concatenate([tp, np.zeros(n_groups)])
+    fp = np.concatenate([fp, np.zeros(n_groups)])
+
+    # Cheapest candidate per group, the highest threshold (fewest alerts) among equal costs
+    best = np.lexsort((-thresholds, cost, candidate_codes))
+    first = np.ones(len(best), dtype=bool)
+    first[1:] = candidate_codes[best][1:] != candidate_codes[best][:-1]
+    best = best[first]
+    return {
+        'threshold': thresholds[best],
+        'cost': cost[best],
+        'tp': tp[best],
+        'fp': fp[best],
+        'samples': samples,
+        'positives': positives
+    }
+
+
+def optimize_thresholds(data, score='probability', label='alert', by=('stationId', 'alert_type'),
+                        costs=DEFAULT_COSTS, min_samples=50, min_positives=5):
+    """Cost-optimal threshold of every group of data.
+
+    Groups with fewer than min_samples readings or min_positives alerts get the threshold
+    optimized over all readings of their alert type instead (fallback True), so sparse
+    stations are not fitted to a handful of points.
+
+    Args:
+        data (pandas.DataFrame): One row per (reading, alert type) with score, label and by columns.
+        score (str, optional): Alert probability column.
+        label (str, optional): Boolean column, whether the alert was warranted.
+        by (tuple, optional): Group columns; with a dict of costs the last one is the alert type.
+        costs (array-like or dict, optional): 2 x 2 cost matrix (see DEFAULT_COSTS), or alert
+            type to cost matrix with an optional 'default' entry.
+        min_samples (int, optional): Fewest readings for a group's own threshold.
+        min_positives (int, optional): Fewest alerts for a group's own threshold.
+
+    Returns:
+        pandas.DataFrame: One row per group: the by columns and RESULT_COLUMNS.
+    """
+    by = list(by)
+    grouped = data.groupby(by, sort=True, dropna=False)
+    codes = grouped.ngroup().to_numpy()
+    group_frame = grouped.size().index.to_frame(index=False)
+    n_groups = len(group_frame)
+    group_types = group_frame[by[-1]].to_numpy()
+    matrices = _cost_matrices(costs, group_types)
+    scores = data[score].to_numpy(dtype=np.float64)
+    labels = data[label].to_numpy(dtype=bool)
+
+    result = sweep(scores, labels, codes, n_groups, matrices)
+
+    # The same sweep per alert type (the last by column) over all stations, so a sparse
+    # station's HIGH_TIDE fallback is fitted on HIGH_TIDE labels only
+    fallback = (result['samples'] < min_samples) | (result['positives'] < min_positives)
+    if fallback.any():
+        if len(by) > 1:
+            type_of_group, _ = pd.factorize(group_types, use_na_sentinel=False)
+        else:
+            type_of_group = np.zeros(n_groups, dtype=np.int64)
+        n_types = int(type_of_group.max()) + 1
+        # Groups of one alert type share its cost matrix
+        first_group = np.unique(type_of_group, return_index=True)[1]
+        overall = sweep(scores, labels, type_of_group[codes], n_types, matrices[first_group])
+        result['threshold'][fallback] = overall['threshold'][type_of_group[fallback]]
+        # Confusion counts and cost of the fallback thresholds on the groups' own readings
+        alert = scores >= result['threshold'][codes]
+        result['tp'] = np.bincount(codes, weights=alert & labels, minlength=n_groups)
+        result['fp'] = np.bincount(codes, weights=alert & ~labels, minlength=n_groups)
+
+    samples, positives, tp, fp = result['samples'], result['positives'], result['tp'], result['fp']
+    fn, tn = positives - tp, samples - positives - fp
+    cost = matrices[:, 0, 0] * tn + matrices[:, 0, 1] * fp + matrices[:, 1, 0] * fn + matrices[:, 1, 1] * tp
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table = group_frame.assign(
+            threshold=result['threshold'],
+            cost=cost,
+            cost_per_reading=cost / samples,
+            samples=samples,
+            positives=positives.astype(np.int64),
+            tp=tp.astype(np.int64),
+            fp=fp.astype(np.int64),
+            fn=fn.astype(np.int64),
+            tn=tn.astype(np.int64),
+            precision=tp / (tp + fp),
+            recall=tp / positives,
+            fallback=fallback
+        )
+    return table.sort_values(by, kind='stable').reset_index(drop=True)
+
+
+def by_type(data, score, types, station='stationId'):
+    """Long (reading, alert type) frame for optimize_thresholds.
+
+    Args:
+        data (pandas.DataFrame): Readings with the score and station columns.
+        score (str): Alert probability column.
+        types (dict): Alert type to boolean column (or array) saying whether it was warranted.
+
+    Returns:
+        pandas.DataFrame: stationId, alert_type, probability and alert columns.
+    """
+    return pd.concat([
+        pd.DataFrame({
+            station: data[station].to_numpy(),
+            'alert_type': alert_type,
+            'probability': data[score].to_numpy(dtype=np.float64),
+            'alert': np.asarray(data[column] if isinstance(column, str) else column, dtype=bool)
+        })
+        for alert_type, column in types.items()
+    ], ignore_index=True)
+
+
+def brute_force(data, score='probability', label='alert', by=('stationId', 'alert_type'), costs=DEFAULT_COSTS):
+    """Per-group loop over every candidate threshold, the reference the sweep is checked against."""
+    rows = []
+    for key, group in data.groupby(list(by), sort=True):
+        matrix = np.asarray(costs.get(key[-1], costs.get('default', DEFAULT_COSTS)) if isinstance(costs, dict) else costs)
+        scores, labels = group[score].to_numpy(), group[label].to_numpy(dtype=bool)
+        best = None
+        for threshold in sorted(set(scores) | {np.inf}, reverse=True):
+            alert = scores >= threshold
+            confusion = np.array([[np.sum(~alert & ~labels), np.sum(alert & ~labels)],
+                                  [np.sum(~alert & labels), np.sum(alert & labels)]])
+            cost = float((confusion * matrix).sum())
+            if best is None or cost < best[1]:
+                best = (threshold, cost)
+        rows.append((*key, *best))
+    return pd.DataFrame(rows, columns=[*by, 'threshold', 'cost'])
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Benchmark the per-group threshold sweep')
+    parser.add_argument('--stations', type=int, default=2000, help='Number of synthetic stations')
+    parser.add_argument('--types', type=int, default=4, help='Alert types per station')
+    parser.add_argument('--readings', type=int, default=500, help='Scored readings per (station, type)')
+    parser.add_argument('--missed-cost', type=float, default=10.0, help='Cost of a missed alert')
+    parser.add_argument('--false-alarm-cost', type=float, default=1.0, help='Cost of a false alarm')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.stations * args.types * args.readings
+    labels = rng.random(n) < 0.1
+    # Scores quantized like forest probabilities, so ties occur
+    scores = np.clip(np.round(0.3 * labels + rng.beta(2, 5, n), 2), 0, 1)
+    data = pd.DataFrame({
+        'stationId': np.repeat([f'station-{i}' for i in range(args.stations)], args.types * args.readings),
+        'alert_type': np.tile(np.repeat([f'TYPE_{t}' for t in range(args.types)], args.readings), args.stations),
+        'probability': scores,
+        'alert': labels
+    }).sample(frac=1, random_state=0)
+    costs = np.array([[0.0, args.false_alarm_cost], [args.missed_cost, 0.0]])
+
+    started = time.perf_counter()
+    table = optimize_thresholds(data, costs=costs, min_samples=0, min_positives=0)
+    elapsed = time.perf_counter() - started
+    print(f"{len(table)} groups, {n} scores: {elapsed:.2f} s")
+
+    # Check a sample of groups against the brute-force loop
+    sample = table.sample(min(len(table), 50), random_state=0)[['stationId', 'alert_type']]
+    subset = data.merge(sample, on=['stationId', 'alert_type'])
+    reference = brute_force(subset, costs=costs).merge(table, on=['stationId', 'alert_type'], suffixes=('', '_sweep'))
+    if not (np.allclose(reference['cost'], reference['cost_sweep'])
+            and np.array_equal(reference['threshold'], reference['threshold_sweep'])):
+        print("Sweep differs from the brute-force thresholds", file=sys.stderr)
+        sys.exit(1)
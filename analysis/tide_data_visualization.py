@@ -1,23 +1,43 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import seaborn as sns
 from datetime import datetime, timedelta
 import os
 import sys
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
 
 # Add the parent directory to sys.path to import from backend
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from readings_store import ReadingsStore
+from feature_pipeline import FeatureSpec, compute_features
+from synthetic_data import generate_frame
+from tide_extrema import event_table
+from station_lag import CrossCorrelator, resample_grid
+
+# 24-sample rolling statistics and high / low tides over 12 samples (3 hours at 15-minute intervals);
+# the rate of change is always recomputed, as height_change
+FEATURE_SPEC = FeatureSpec(
+    calendar=('hour', 'minute', 'day_of_year', 'month', 'day', 'day_of_week'),
+    time_of_day=True,
+    rate_of_change='height_change',
+    keep_existing_rate=False,
+    rolling_window=24,
+    extrema_window=12
+)
+
 # Function to load data
-def load_data(from_csv=True, csv_path='tide_data.csv'):
+def load_data(from_csv=True, csv_path='tide_data.csv', store=None, station_id=None, start_date=None, end_date=None):
     """
     Load tide data either from MongoDB or from a CSV file
+
+    With a ReadingsStore the CSV is imported into the store (only when it changed) and
+    only the partitions of the requested station and time range are read back.
     """
     if from_csv:
+        if store is not None:
+            data = store.read_csv(csv_path, station_id, start_date, end_date)
+            if data is not None:
+                return data
+        
         try:
             return pd.read_csv(csv_path)
         except FileNotFoundError:
@@ -75,68 +95,9 @@ def load_data(from_csv=True, csv_path='tide_data.csv'):
 # Function to create sample data
 def create_sample_data(n_days=30, n_stations=3):
     """
-    Create sample tide data for visualization
+    Create sample tide data for visualization (see synthetic_data.py)
     """
-    np.random.seed(42)
-    
-    # Create timestamps for the past n_days at 15-minute intervals
-    end_time = pd.Timestamp.now()
-    start_time = end_time - pd.Timedelta(days=n_days)
-    timestamps = pd.date_range(start=start_time, end=end_time, freq='15min')
-    
-    # Create station data
-    stations = [
-        {
-            'stationId': f'station-{i+1}',
-            'stationName': f'Station {i+1}',
-            # Random locations around the UK coast
-            'latitude': 50.5 + np.random.rand() * 5,
-            'longitude': -5.5 + np.random.rand() * 5
-        } for i in range(n_stations)
-    ]
-    
-    # Create sample data with different tide patterns for each station
-    data = []
-    
-    for station in stations:
-        # Create time values for sine waves
-        time_values = np.linspace(0, 2*np.pi*n_days/2, len(timestamps))  # n_days/2 complete cycles
-        
-        # Create primary tide pattern (semidiurnal with different amplitudes and phases)
-        phase_offset = np.random.rand() * np.pi  # Random phase offset
-        amplitude = 1.5 + np.random.rand() * 1.0  # Random amplitude between 1.5 and 2.5
-        
-        # Main semidiurnal tide component
-        heights = amplitude * np.sin(time_values + phase_offset)
-        
-        # Add diurnal inequality (difference between consecutive high/low tides)
-        heights += 0.3 * np.sin(time_values/2 + np.random.rand() * np.pi)
-        
-        # Add a long-term trend (e.g., seasonal variation)
-        heights += 0.5 * np.sin(time_values / (n_days/2) + np.random.rand() * np.pi)
-        
-        # Add random noise
-        heights += 0.1 * np.random.randn(len(timestamps))
-        
-        # Add spring-neap cycle (approximately 14.77 days)
-        spring_neap_factor = 0.4 * np.sin(time_values * (2/14.77) + np.random.rand() * np.pi)
-        heights *= (1 + spring_neap_factor)
-        
-        # Create station data
-        for i, ts in enumerate(timestamps):
-            data.append({
-                'reading_id': f"{station['stationId']}-{i}",
-                'ts': ts,
-                'height': heights[i],
-                'type': 'prediction',
-                'stationId': station['stationId'],
-                'stationName': station['stationName'],
-                'latitude': station['latitude'],
-                'longitude': station['longitude']
-            })
-    
-    # Convert to DataFrame
-    df = pd.DataFrame(data)
+    df = generate_frame(n_days=n_days, n_stations=n_stations, alerts=False)
     
     # Save to CSV for future use
     df.to_csv('tide_data.csv', index=False)
@@ -146,66 +107,20 @@ def create_sample_data(n_days=30, n_stations=3):
 # Function to preprocess data
 def preprocess_data(data):
     """
-    Preprocess the tide data for visualization
+    Preprocess the tide data for visualization (see feature_pipeline.py)
     """
-    # Convert timestamp to datetime if it's not already
-    if isinstance(data['ts'].iloc[0], str):
-        data['ts'] = pd.to_datetime(data['ts'])
-    
-    # Extract time-based features
-    data['hour'] = data['ts'].dt.hour
-    data['minute'] = data['ts'].dt.minute
-    data['day_of_year'] = data['ts'].dt.dayofyear
-    data['month'] = data['ts'].dt.month
-    data['day'] = data['ts'].dt.day
-    data['day_of_week'] = data['ts'].dt.dayofweek
-    
-    # Calculate time of day in decimal hours
-    data['time_of_day'] = data['hour'] + data['minute'] / 60
-    
-    # Calculate rate of change
-    data = data.sort_values(['stationId', 'ts'])
-    data['height_change'] = data.groupby('stationId')['height'].diff()
-    
-    # Calculate rolling statistics
-    data['height_rolling_mean'] = data.groupby('stationId')['height'].transform(
-        lambda x: x.rolling(window=24, min_periods=1).mean()
-    )
-    data['height_rolling_std'] = data.groupby('stationId')['height'].transform(
-        lambda x: x.rolling(window=24, min_periods=1).std()
-    )
-    
-    # Calculate z-score
-    data['height_zscore'] = (data['height'] - data['height_rolling_mean']) / data['height_rolling_std'].replace(0, 1)
-    
-    # Identify high and low tides
-    window_size = 12  # 3 hours (assuming 15-minute intervals)
-    
-    def find_extrema(group):
-        # Mark local maxima (high tides)
-        group['is_high_tide'] = group['height'].rolling(window=window_size, center=True, min_periods=1).apply(
-            lambda x: np.argmax(x) == len(x) // 2 if len(x) > 1 else False
-        )
-        
-        # Mark local minima (low tides)
-        group['is_low_tide'] = group['height'].rolling(window=window_size, center=True, min_periods=1).apply(
-            lambda x: np.argmin(x) == len(x) // 2 if len(x) > 1 else False
-        )
-        
-        return group
-    
-    data = data.groupby('stationId').apply(find_extrema).reset_index(drop=True)
-    
-    # Drop rows with NaN values
-    data = data.dropna()
-    
-    return data
+    return compute_features(data, FEATURE_SPEC)
 
 # Function to create time series visualization
-def visualize_time_series(data, station_id=None, days=7):
+def visualize_time_series(data, station_id=None, days=7, events=None):
     """
     Create time series visualization of tide data
+
+    events is the high / low tide table of tide_extrema.event_table, built from data if not given.
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    
     # Create output directory
     os.makedirs('visualizations', exist_ok=True)
     
@@ -233,8 +148,12 @@ def visualize_time_series(data, station_id=None, days=7):
     plt.plot(filtered_data['ts'], filtered_data['height'], 'b-', label='Tide Height')
     
     # Mark high and low tides
-    high_tides = filtered_data[filtered_data['is_high_tide'] == True]
-    low_tides = filtered_data[filtered_data['is_low_tide'] == True]
+    if events is None:
+        events = event_table(data)
+    station_events = events[(events['stationId'] == station_id) &
+                            (events['ts'] >= start_time) & (events['ts'] <= end_time)]
+    high_tides = station_events[station_events['type'] == 'high']
+    low_tides = station_events[station_events['type'] == 'low']
     
     plt.scatter(high_tides['ts'], high_tides['height'], color='red', s=50, label='High Tide')
     plt.scatter(low_tides['ts'], low_tides['height'], color='green', s=50, label='Low Tide')
@@ -292,6 +211,9 @@ def visualize_daily_pattern(data, station_id=None):
     """
     Create visualization of daily tide patterns
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     # Create output directory
     os.makedirs('visualizations', exist_ok=True)
     
@@ -374,6 +296,10 @@ def visualize_station_comparison(data):
     """
     Create visualization comparing tide patterns across stations
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    import seaborn as sns
+    
     # Create output directory
     os.makedirs('visualizations', exist_ok=True)
     
@@ -448,36 +374,40 @@ def visualize_station_comparison(data):
     plt.savefig('visualizations/station_correlation.png')
     plt.close()
     
-    # Create lag analysis
-    if len(stations) >= 2:
-        # Select two stations for lag analysis
-        station1_id = stations[0]
-        station2_id = stations[1]
-        
-        station1_data = filtered_data[filtered_data['stationId'] == station1_id]
-        station2_data = filtered_data[filtered_data['stationId'] == station2_id]
-        
-        station1_name = station1_data['stationName'].iloc[0]
-        station2_name = station2_data['stationName'].iloc[0]
-        
-        # Merge data on timestamp
-        merged_data = pd.merge(
-            station1_data[['ts', 'height']],
-            station2_data[['ts', 'height']],
-            on='ts',
-            suffixes=('_1', '_2')
-        )
-        
-        # Calculate cross-correlation
-        max_lag = 48  # 12 hours (assuming 15-minute intervals)
-        lags = range(-max_lag, max_lag + 1)
-        xcorr = [merged_data['height_1'].corr(merged_data['height_2'].shift(lag)) for lag in lags]
-        
-        # Convert lags to hours
-        lag_hours = [lag * 0.25 for lag in lags]  # 0.25 hours = 15 minutes
-        
+    # Lag analysis of every station pair on a common 15-minute grid (see station_lag.py)
+    max_lag_hours = 12
+    station_ids, _, step, grid = resample_grid(filtered_data, freq='15min')
+    correlator = CrossCorrelator(grid, int(pd.Timedelta(hours=max_lag_hours) / step))
+    lag_matrix = correlator.lag_matrix(station_ids, step)
+    lag_matrix.save('visualizations/station_lags.npz')
+    lag_matrix.to_frame().to_csv('visualizations/station_lags.csv', index=False)
+    
+    names = filtered_data.groupby('stationId')['stationName'].first()
+    station_names = [names[station_id] for station_id in station_ids]
+    
+    # Create heatmap of peak lags
+    plt.figure(figsize=(10, 8))
+    sns.heatmap(
+        pd.DataFrame(lag_matrix.lag_hours, index=station_names, columns=station_names),
+        annot=len(station_ids) <= 20,
+        fmt='.2f',
+        cmap='coolwarm',
+        center=0,
+        cbar_kws={'label': 'Lag (hours)'}
+    )
+    plt.title('Tidal Lag Between Stations')
+    plt.tight_layout()
+    plt.savefig('visualizations/station_lag_matrix.png')
+    plt.close()
+    
+    # Plot the lag spectrum of the first two stations
+    station1_name, station2_name = station_names[0], station_names[1]
+    xcorr = correlator.spectrum(0, 1)
+    lag_hours = (np.arange(-correlator.max_lag, correlator.max_lag + 1) * step / pd.Timedelta(hours=1))
+    
+    if not np.isnan(xcorr).all():
         # Find lag with maximum correlation
-        max_corr_idx = np.argmax(xcorr)
+        max_corr_idx = np.nanargmax(xcorr)
         max_corr_lag = lag_hours[max_corr_idx]
         max_corr = xcorr[max_corr_idx]
         
@@ -504,16 +434,27 @@ def visualize_station_comparison(data):
     print("Station comparison visualizations saved")
 
 # Function to create tide pattern analysis
-def analyze_tide_patterns(data):
+def analyze_tide_patterns(data, events=None):
     """
     Analyze tide patterns using PCA and clustering
+
+    High and low tide statistics are read from the event table (see tide_extrema.py).
     """
+    import matplotlib.pyplot as plt
+    from sklearn.decomposition import PCA
+    from sklearn.preprocessing import StandardScaler
+    
     # Create output directory
     os.makedirs('visualizations', exist_ok=True)
     
     # Get unique stations
     stations = data['stationId'].unique()
     
+    if events is None:
+        events = event_table(data)
+    events_by_station = dict(list(events.groupby('stationId')))
+    no_events = events.iloc[:0]
+    
     # Extract features for analysis
     features = []
     
@@ -521,8 +462,9 @@ def analyze_tide_patterns(data):
         station_data = data[data['stationId'] == station_id].copy()
         
         # Calculate tide statistics
-        high_tides = station_data[station_data['is_high_tide'] == True]
-        low_tides = station_data[station_data['is_low_tide'] == True]
+        station_events = events_by_station.get(station_id, no_events)
+        high_tides = station_events[station_events['type'] == 'high']
+        low_tides = station_events[station_events['type'] == 'low']
         
         # Calculate average high and low tide heights
         avg_high_tide = high_tides['height'].mean()
@@ -642,6 +584,9 @@ def visualize_tide_prediction(data, station_id=None, days_to_predict=7):
     """
     Create visualization of tide prediction
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    
     # This is a simplified visualization of what a prediction might look like
     # In a real system, you would use a proper prediction model
     
@@ -724,7 +669,7 @@ def visualize_tide_prediction(data, station_id=None, days_to_predict=7):
     print(f"Tide prediction visualization saved for {station_name}")
 
 # Main function
-def main():
+def main(store_dir=None, station_id=None, start_date=None, end_date=None):
     print("Coastle Alert - Tide Data Visualization")
     print("======================================")
     
@@ -733,13 +678,19 @@ def main():
     
     # Load data
     print("\nLoading tide data...")
-    data = load_data(from_csv=True)
+    store = ReadingsStore(store_dir, dataset='tide_data') if store_dir else None
+    data = load_data(from_csv=True, store=store, station_id=station_id, start_date=start_date, end_date=end_date)
     print(f"Loaded {len(data)} data points from {len(data['stationId'].unique())} stations.")
     
     # Preprocess data
     print("\nPreprocessing data...")
     processed_data = preprocess_data(data)
     
+    # High / low tide events, shared by the visualizations below
+    events = event_table(processed_data)
+    events.to_csv('visualizations/tide_events.csv', index=False)
+    print(f"Detected {len(events)} high and low tides.")
+    
     # Create visualizations for each station
     print("\nCreating visualizations...")
     for station_id in processed_data['stationId'].unique():
@@ -747,7 +698,7 @@ def main():
         print(f"\nProcessing station: {station_name}")
         
         # Create time series visualization
-        visualize_time_series(processed_data, station_id)
+        visualize_time_series(processed_data, station_id, events=events)
         
         # Create daily pattern visualization
         visualize_daily_pattern(processed_data, station_id)
@@ -761,10 +712,19 @@ def main():
     
     # Analyze tide patterns
     print("\nAnalyzing tide patterns...")
-    analyze_tide_patterns(processed_data)
+    analyze_tide_patterns(processed_data, events=events)
     
     print("\nTide data visualization complete!")
     print(f"All visualizations saved to the 'visualizations' directory.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Coastle Alert - Tide Data Visualization')
+    parser.add_argument('--store', type=str, help='Read through the local columnar readings store in this directory')
+    parser.add_argument('--station', type=str, help='Only analyze this station (with --store)')
+    parser.add_argument('--start', type=str, help='Start of the time range, e.g. 2024-01-01 (with --store)')
+    parser.add_argument('--end', type=str, help='End of the time range (with --store)')
+    args = parser.parse_args()
+    
+    main(store_dir=args.store, station_id=args.station, start_date=args.start, end_date=args.end)
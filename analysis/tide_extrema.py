@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+import sys
+from numpy.lib.stride_tricks import sliding_window_view
+
+# High / low tide detection on many stations at once. A reading is a high (low) tide when it
+# is the first maximum (minimum) of the centered window around it, the window pandas'
+# rolling(window, center=True) uses: window // 2 rows before and the rest after, clipped at
+# the station's first and last reading. Every station is compared in the same vectorized
+# pass over a sliding-window view, instead of a Python call per window per row.
+
+EVENT_COLUMNS = ('stationId', 'ts', 'height', 'type')
+
+
+def _padded_windows(values, codes, window):
+    """(rows x window) array of each row's centered window, -inf outside its group."""
+    n = len(values)
+    before = window // 2
+    # Every group is surrounded by enough fill that no window reaches a neighbouring group
+    group_index = np.cumsum(np.r_[True, codes[1:] != codes[:-1]]) - 1
+    positions = np.arange(n) + group_index * (window - 1) + before
+    padded = np.full(n + (group_index[-1] + 1) * (window - 1), -np.inf)
+    padded[positions] = values
+    return sliding_window_view(padded, window)[positions - before], before
+
+
+def _first_extreme(values, codes, window, highs):
+    """Flags of rows that are the first maximum (highs) or minimum of their centered window."""
+    # Minima are the maxima of the negated heights
+    windows, before = _padded_windows(values if highs else -values, codes, window)
+    center = windows[:, before:before + 1]
+    flags = (windows[:, :before] < center).all(axis=1) & (windows[:, before + 1:] <= center).all(axis=1)
+    # A station with a single reading in the window has no extremum
+    neighbours = np.isfinite(windows).sum(axis=1) > 1
+    return flags & neighbours & ~np.isnan(values)
+
+
+def extrema_flags(values, codes, window):
+    """High and low tide flags of values sorted into contiguous groups of codes, in time order.
+
+    Args:
+        values (numpy.ndarray): Heights sorted by group and time.
+        codes (numpy.ndarray): Group label of every row; equal labels must be adjacent.
+        window (int): Centered window length in rows.
+
+    Returns:
+        tuple: (is_high, is_low) boolean arrays.
+    """
+    if window < 2:
+        raise ValueError("window must be at least 2")
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.asarray(codes)
+    if len(values) == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+    return _first_extreme(values, codes, window, True), _first_extreme(values, codes, window, False)
+
+
+def _interpolate_peaks(rows, values, ts_ns, codes):
+    """Vertex of the parabola through each flagged row and its two neighbours.
+
+    Returns the sub-sample time (int64 ns, rounded to the second) and height; rows at a group
+    edge or on a flat top keep their sampled values.
+    """
+    n = len(values)
+    times = ts_ns[rows].astype(np.float64)
+    heights = values[rows].copy()
+    inner = (rows > 0) & (rows < n - 1)
+    inner[inner] = (codes[rows[inner] - 1] == codes[rows[inner]]) & (codes[rows[inner] + 1] == codes[rows[inner]])
+    i = rows[inner]
+    left, middle, right = values[i - 1], values[i], values[i + 1]
+    curvature = left - 2 * middle + right
+    with np.errstate(invalid='ignore', divide='ignore'):
+        offset = np.clip(0.5 * (left - right) / curvature, -0.5, 0.5)
+    offset[~np.isfinite(offset)] = 0.0
+    # Scale the offset by the sample spacing on the side the vertex lies on
+    spacing = np.where(offset > 0, ts_ns[i + 1] - ts_ns[i], ts_ns[i] - ts_ns[i - 1]).astype(np.float64)
+    times[inner] = ts_ns[i] + offset * spacing
+    heights[inner] = middle - 0.25 * (left - right) * offset
+    return (np.round(times / 1e9) * 1e9).astype(np.int64), heights
+
+
+def event_table(data, value='height', group='stationId', interpolate=True):
+    """High / low tide events from the is_high_tide / is_low_tide flags of preprocessed data.
+
+    Args:
+        data (pandas.DataFrame): Readings with ts, group, value and the flag columns.
+        value (str, optional): Height column.
+        group (str, optional): Column identifying stations.
+        interpolate (bool, optional): Refine time and height of each event with a parabola
+            through the neighbouring readings.
+
+    Returns:
+        pandas.DataFrame: One row per event with EVENT_COLUMNS, type 'high' or 'low', sorted
+        by station and time.
+    """
+    work = data.sort_values([group, 'ts'], kind='stable')
+    codes, _ = pd.factorize(work[group])
+    values = work[value].to_numpy(dtype=np.float64)
+    ts_ns = pd.to_datetime(work['ts']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    stations = work[group].to_numpy()
+
+    tables = []
+    for flag, kind in (('is_high_tide', 'high'), ('is_low_tide', 'low')):
+        rows = np.flatnonzero(work[flag].to_numpy() == True)
+        if interpolate:
+            times, heights = _interpolate_peaks(rows, values, ts_ns, codes)
+        else:
+            times, heights = ts_ns[rows], values[rows]
+        tables.append(pd.DataFrame({
+            'stationId': stations[rows],
+            'ts': pd.to_datetime(times),
+            'height': heights,
+            'type': kind
+        }))
+
+    events = pd.concat(tables, ignore_index=True).rename(columns={'stationId': group})
+    return events.sort_values([group, 'ts'], kind='stable').reset_index(drop=True)
+
+
+def detect_events(data, window, value='height', group='stationId', interpolate=True):
+    """Flag extrema over window rows per station and return the event table.
+
+    Args:
+        data (pandas.DataFrame): Readings with ts, group and value columns.
+        window (int): Centered window length in rows.
+
+    Returns:
+        pandas.DataFrame: See event_table.
+    """
+    work = data.sort_values([group, 'ts'], kind='stable')
+    codes, _ = pd.factorize(work[group])
+    is_high, is_low = extrema_flags(work[value].to_numpy(dtype=np.float64), codes, window)
+    work = work.assign(is_high_tide=is_high, is_low_tide=is_low)
+    return event_table(work, value=value, group=group, interpolate=interpolate)
+
+
+# Command-line interface
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Detect high and low tides in a CSV export')
+    parser.add_argument('csv', type=str, help='CSV with ts, stationId and height columns')
+    parser.add_argument('--window', type=int, default=12, help='Centered window in samples')
+    parser.add_argument('--value', type=str, default='height', help='Height column, e.g. tide_m')
+    parser.add_argument('--no-interpolate', action='store_true', help='Report the sampled times and heights')
+    parser.add_argument('--output', type=str, help='Write the event table to this CSV instead of stdout')
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.csv, parse_dates=['ts'])
+    events = detect_events(data, args.window, value=args.value, interpolate=not args.no_interpolate)
+    if args.output:
+        events.to_csv(args.output, index=False)
+        print(f"{len(events)} events written to {args.output}", file=sys.stderr)
+    else:
+        events.to_csv(sys.stdout, index=False)
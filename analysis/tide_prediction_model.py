@@ -1,27 +1,87 @@
 import pandas as pd
 import numpy as np
-import joblib
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-import matplotlib.pyplot as plt
 import os
 import sys
 import json
-from datetime import datetime, timedelta
+import hashlib
+from datetime import datetime
 
 # Add the project root to the path so we can import from other modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-try:
-    from backend.models.Reading import Reading
-    from pymongo import MongoClient
-    MONGODB_URI = os.environ.get('MONGODB_URI')
-    mongo_available = True
-except ImportError:
-    mongo_available = False
-    print("MongoDB connection not available. Will use CSV data if provided.")
+from astronomical_features import astronomical_features, get_default_table, to_epoch_ns
+from readings_loader import StreamingReadingsLoader
+from readings_store import ReadingsStore
+from flat_forest import FlatForest
+from model_bundle import write_bundle, read_header, is_bundle, ModelBundle, scaler_arrays, load_scaler
+from prediction_formats import encode, write_predictions, to_json
+
+# scikit-learn, joblib, matplotlib and pymongo are imported by the code paths that use them:
+# the backend spawns this script per request, and a predict from a model bundle needs none of them.
+
+MONGODB_URI = os.environ.get('MONGODB_URI')
+_mongo_client_class = None
+
+
+def mongo_available():
+    """Whether MongoDB can be used; pymongo is imported on the first call."""
+    global _mongo_client_class
+    if _mongo_client_class is None:
+        try:
+            from backend.models.Reading import Reading
+            from pymongo import MongoClient
+            _mongo_client_class = MongoClient
+        except ImportError:
+            _mongo_client_class = False
+            print("MongoDB connection not available. Will use CSV data if provided.", file=sys.stderr)
+    return _mongo_client_class is not False
+
+
+def mongo_client():
+    """New MongoClient for MONGODB_URI; check mongo_available() first."""
+    mongo_available()
+    return _mongo_client_class(MONGODB_URI)
+
+# Callbacks notified when save_model writes an artifact: callback(model_path, old_checksum, new_checksum).
+# old_checksum is None when the artifact did not exist before.
+artifact_listeners = []
+
+
+def artifact_checksum(*paths):
+    """SHA-256 checksum over the contents of one or more artifact files.
+    
+    Args:
+        *paths (str): Artifact file paths. Missing or None paths are skipped.
+        
+    Returns:
+        str: Hex digest, or None if none of the files exist.
+    """
+    if paths and paths[0] and is_bundle(paths[0]):
+        # Bundles carry their checksum in the header and hold the scaler themselves
+        return read_header(paths[0])['checksum']
+    
+    digest = hashlib.sha256()
+    found = False
+    for path in paths:
+        if path and os.path.exists(path):
+            found = True
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+    return digest.hexdigest() if found else None
+
+
+def quantile_column(quantile, target='tide_m'):
+    """Column holding a predicted quantile, e.g. tide_m_p10 for 0.1."""
+    return f"{target}_p{quantile * 100:g}"
+
+
+def _notify_artifact_saved(model_path, old_checksum, new_checksum):
+    if old_checksum == new_checksum:
+        return
+    for callback in artifact_listeners:
+        callback(model_path, old_checksum, new_checksum)
+
 
 class TidePredictionModel:
     def __init__(self, model_path=None):
@@ -31,9 +91,17 @@ class TidePredictionModel:
             model_path (str, optional): Path to a saved model file. If provided, the model will be loaded from this file.
         """
         self.model = None
-        self.scaler = StandardScaler()
+        # Created by train(), or restored by load_model()
+        self.scaler = None
         self.features = ['hour_of_day', 'day_of_year', 'moon_phase']
         self.target = 'tide_m'
+        self.checksum = None
+        self.search_report = None
+        # Incremental training bookkeeping, saved next to the model (see update())
+        self.training_state = {}
+        self._bundle_path = None
+        # (estimator, FlatForest) used for per-tree quantiles of a scikit-learn forest
+        self._flat_model = None
         
         if model_path and os.path.exists(model_path):
             self.load_model(model_path)
@@ -69,8 +137,8 @@ class TidePredictionModel:
         df['hour_of_day'] = df['ts'].dt.hour
         df['day_of_year'] = df['ts'].dt.dayofyear
         
-        # Calculate moon phase
-        df['moon_phase'] = df['ts'].apply(self._calculate_moon_phase)
+        # Calculate moon phase for the whole block at once
+        df['moon_phase'] = astronomical_features(df['ts'], columns=['moon_phase'])['moon_phase'].values
         
         # Add cyclical features for time
         df['hour_sin'] = np.sin(2 * np.pi * df['hour_of_day'] / 24)
@@ -84,7 +152,8 @@ class TidePredictionModel:
         
         return df[extended_features]
     
-    def load_data(self, csv_path=None, station_id=None, start_date=None, end_date=None):
+    def load_data(self, csv_path=None, station_id=None, start_date=None, end_date=None,
+                  metrics=None, batch_size=10000, chunk_size=None, store=None):
         """Load tide data either from MongoDB or from a CSV file.
         
         Args:
@@ -92,34 +161,49 @@ class TidePredictionModel:
             station_id (str, optional): ID of the station to get data for (for MongoDB).
             start_date (datetime, optional): Start date for data retrieval (for MongoDB).
             end_date (datetime, optional): End date for data retrieval (for MongoDB).
+            metrics (list, optional): metrics.* fields to load (for MongoDB). Defaults to the model target.
+            batch_size (int, optional): MongoDB cursor batch size.
+            chunk_size (int, optional): If set, return a generator of DataFrames of at most this many rows.
+            store (ReadingsStore, optional): Local columnar cache. New MongoDB readings (or a changed CSV)
+                are synced into it and the requested station and time range is read back from it.
             
         Returns:
             pandas.DataFrame: DataFrame containing the loaded data.
         """
-        if mongo_available and not csv_path:
-            # Load from MongoDB
-            client = MongoClient(MONGODB_URI)
-            db = client.get_default_database()
-            
-            query = {}
-            if station_id:
-                query['stationId'] = station_id
-            if start_date:
-                query['ts'] = {'$gte': start_date}
-            if end_date and 'ts' in query:
-                query['ts']['$lte'] = end_date
-            elif end_date:
-                query['ts'] = {'$lte': end_date}
-            
-            readings = list(db.readings.find(query))
-            df = pd.DataFrame(readings)
+        if store is not None:
+            columns = metrics or [self.target]
+            if not csv_path and mongo_available():
+                client = mongo_client()
+                try:
+                    store.sync(client.get_default_database().readings, batch_size=batch_size)
+                finally:
+                    client.close()
+                df = store.read(station_id, start_date, end_date, columns=columns)
+            else:
+                df = store.read_csv(csv_path, station_id, start_date, end_date)
+                if df is None:
+                    raise FileNotFoundError(f"CSV file not found and the readings store is empty: {csv_path}")
+        elif not csv_path and mongo_available():
+            # Stream from MongoDB, projecting only the fields we need
+            client = mongo_client()
+            loader = StreamingReadingsLoader(
+                client.get_default_database().readings,
+                metrics=metrics or [self.target],
+                batch_size=batch_size
+            )
             
-            # Extract metrics from nested structure
-            if not df.empty and 'metrics' in df.columns:
-                metrics_df = pd.json_normalize(df['metrics'])
-                df = pd.concat([df.drop('metrics', axis=1), metrics_df], axis=1)
+            if chunk_size:
+                def chunks():
+                    try:
+                        yield from loader.iter_chunks(station_id, start_date, end_date, chunk_size=chunk_size)
+                    finally:
+                        client.close()
+                return chunks()
             
-            client.close()
+            try:
+                df = loader.load(station_id, start_date, end_date)
+            finally:
+                client.close()
         elif csv_path:
             # Load from CSV
             df = pd.read_csv(csv_path)
@@ -130,18 +214,30 @@ class TidePredictionModel:
         
         return df
     
-    def train(self, data, test_size=0.2, random_state=42, tune_hyperparams=False):
+    def train(self, data, test_size=0.2, random_state=42, tune_hyperparams=False, search='grid',
+              max_fits=None, max_seconds=None, search_state_path=None):
         """Train the tide prediction model.
         
         Args:
             data (pandas.DataFrame): DataFrame containing tide data.
             test_size (float, optional): Proportion of data to use for testing.
             random_state (int, optional): Random seed for reproducibility.
-            tune_hyperparams (bool, optional): Whether to tune hyperparameters using GridSearchCV.
+            tune_hyperparams (bool, optional): Whether to tune hyperparameters.
+            search (str, optional): 'grid' for an exhaustive GridSearchCV, 'halving' for a budgeted
+                successive-halving search (see hyperparameter_search.py).
+            max_fits (int, optional): Fit budget of the halving search.
+            max_seconds (float, optional): Time budget of the halving search.
+            search_state_path (str, optional): File the halving search keeps its resumable state in.
             
         Returns:
             dict: Dictionary containing model performance metrics.
         """
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.model_selection import train_test_split, GridSearchCV
+        from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+        from hyperparameter_search import SuccessiveHalvingSearch
+        
         # Prepare features
         X = self._prepare_features(data)
         y = data[self.target]
@@ -150,6 +246,7 @@ class TidePredictionModel:
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
         
         # Scale features
+        self.scaler = StandardScaler()
         X_train_scaled = self.scaler.fit_transform(X_train)
         X_test_scaled = self.scaler.transform(X_test)
         
@@ -162,17 +259,33 @@ class TidePredictionModel:
                 'min_samples_leaf': [1, 2, 4]
             }
             
-            grid_search = GridSearchCV(
-                RandomForestRegressor(random_state=random_state),
-                param_grid=param_grid,
-                cv=5,
-                scoring='neg_mean_squared_error',
-                n_jobs=-1
-            )
-            
-            grid_search.fit(X_train_scaled, y_train)
-            self.model = grid_search.best_estimator_
-            print(f"Best parameters: {grid_search.best_params_}")
+            if search == 'halving':
+                halving_search = SuccessiveHalvingSearch(
+                    RandomForestRegressor(random_state=random_state),
+                    param_grid=param_grid,
+                    scoring='neg_mean_squared_error',
+                    max_fits=max_fits,
+                    max_seconds=max_seconds,
+                    state_path=search_state_path,
+                    random_state=random_state
+                )
+                
+                halving_search.fit(X_train_scaled, y_train)
+                self.model = halving_search.best_estimator_
+                self.search_report = halving_search.report()
+                halving_search.print_report()
+            else:
+                grid_search = GridSearchCV(
+                    RandomForestRegressor(random_state=random_state),
+                    param_grid=param_grid,
+                    cv=5,
+                    scoring='neg_mean_squared_error',
+                    n_jobs=-1
+                )
+                
+                grid_search.fit(X_train_scaled, y_train)
+                self.model = grid_search.best_estimator_
+                print(f"Best parameters: {grid_search.best_params_}")
         else:
             # Train with default parameters
             self.model = RandomForestRegressor(n_estimators=100, random_state=random_state)
@@ -192,76 +305,370 @@ class TidePredictionModel:
         for metric, value in metrics.items():
             print(f"{metric}: {value:.4f}")
         
+        self.training_state = {
+            'trained_until': pd.to_datetime(data['ts']).max().isoformat(),
+            'baseline_rmse': float(metrics['rmse']),
+            'updates': 0
+        }
+        
         return metrics
     
+    def _new_rows(self, data):
+        """Rows newer than the data the model was last trained or updated on."""
+        trained_until = self.training_state.get('trained_until')
+        if trained_until is None:
+            return data
+        return data[pd.to_datetime(data['ts']) > pd.Timestamp(trained_until)]
+    
+    def _rmse(self, data):
+        errors = np.asarray(data[self.target], dtype=np.float64) - self.predict_at(data['ts'])
+        return float(np.sqrt(np.mean(errors ** 2)))
+    
+    def retrain_needed(self, data, min_new_rows=24, max_error_ratio=1.25):
+        """Decide whether new readings warrant an incremental update.
+        
+        An update is triggered once at least min_new_rows readings arrived since the last
+        training run, or earlier if the model's RMSE on the new readings drifted above
+        max_error_ratio times the RMSE measured when it was trained.
+        
+        Args:
+            data (pandas.DataFrame): Recent tide data; only rows after the training watermark count.
+            min_new_rows (int, optional): New-row count that triggers an update.
+            max_error_ratio (float, optional): RMSE drift ratio that triggers an update.
+            
+        Returns:
+            tuple: (bool, str) whether to update and why.
+        """
+        if self.model is None:
+            return True, 'no trained model'
+        
+        new_data = self._new_rows(data)
+        if new_data.empty:
+            return False, 'no new readings'
+        
+        baseline = self.training_state.get('baseline_rmse')
+        if baseline:
+            rmse = self._rmse(new_data)
+            if rmse > baseline * max_error_ratio:
+                return True, f"error drift: rmse {rmse:.4f} vs baseline {baseline:.4f}"
+        
+        if len(new_data) >= min_new_rows:
+            return True, f"{len(new_data)} new readings"
+        
+        return False, f"only {len(new_data)} new readings and no error drift"
+    
+    def update(self, data, n_trees=20, max_trees=None, random_state=None):
+        """Incrementally train the forest on recent data.
+        
+        n_trees new trees are fitted on data through warm_start and appended to the forest;
+        the oldest trees are then retired so the forest keeps at most max_trees trees. The
+        forest therefore covers a sliding window of training runs instead of being rebuilt
+        from the whole history.
+        
+        Args:
+            data (pandas.DataFrame): Recent tide data, e.g. the last few days.
+            n_trees (int, optional): Number of trees fitted on the new data.
+            max_trees (int, optional): Forest size cap. Defaults to the current number of trees,
+                so every update replaces the n_trees oldest ones.
+            random_state (int, optional): Seed of the new trees. Defaults to the update count.
+            
+        Returns:
+            dict: RMSE on the new data before and after the update, and the forest size.
+        """
+        if self.model is None:
+            raise ValueError("Model has not been trained or loaded yet")
+        if isinstance(self.model, FlatForest):
+            # Bundles keep the scikit-learn estimator for exactly this
+            bundle = ModelBundle(self._bundle_path) if self._bundle_path else None
+            if bundle is None or 'estimator' not in bundle:
+                raise ValueError("Flat-array exports cannot be updated; update the scikit-learn model and re-export it")
+            self.model = bundle.object('estimator')
+        
+        X_scaled = self.scaler.transform(self._prepare_features(data))
+        y = data[self.target]
+        
+        max_trees = max_trees or len(self.model.estimators_)
+        rmse_before = self._rmse(data)
+        updates = self.training_state.get('updates', 0) + 1
+        
+        # warm_start fits only the trees beyond the existing ones; a fresh seed keeps them distinct
+        self.model.set_params(
+            warm_start=True,
+            n_estimators=len(self.model.estimators_) + n_trees,
+            random_state=random_state if random_state is not None else updates
+        )
+        self.model.fit(X_scaled, y)
+        self._flat_model = None
+        
+        # Retire the oldest trees (estimators_ is ordered oldest first)
+        if len(self.model.estimators_) > max_trees:
+            self.model.estimators_ = self.model.estimators_[-max_trees:]
+            self.model.set_params(n_estimators=max_trees)
+        
+        trained_until = pd.to_datetime(data['ts']).max()
+        if self.training_state.get('trained_until'):
+            trained_until = max(trained_until, pd.Timestamp(self.training_state['trained_until']))
+        self.training_state.update({'trained_until': trained_until.isoformat(), 'updates': updates})
+        
+        result = {
+            'rmse_before': rmse_before,
+            'rmse_after': self._rmse(data),
+            'trees': len(self.model.estimators_)
+        }
+        print(f"Updated model with {n_trees} trees on {len(data)} readings "
+              f"(rmse {result['rmse_before']:.4f} -> {result['rmse_after']:.4f}, {result['trees']} trees)")
+        return result
+    
+    @staticmethod
+    def _training_state_path(model_path):
+        return os.path.splitext(model_path)[0] + '.training.json'
+    
     def save_model(self, model_path='./tide_prediction_model.joblib', scaler_path='./tide_scaler.joblib'):
         """Save the trained model and scaler to disk.
         
         Args:
-            model_path (str, optional): Path to save the model to.
+            model_path (str, optional): Path to save the model to. A path ending in .bundle writes a
+                single model bundle (see save_bundle) and ignores scaler_path.
             scaler_path (str, optional): Path to save the scaler to.
         """
         if self.model is None:
             raise ValueError("Model has not been trained yet")
         
+        if model_path.endswith('.bundle'):
+            self.save_bundle(model_path)
+            return
+        
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
         
+        import joblib
+        old_checksum = artifact_checksum(model_path, scaler_path)
+        
         joblib.dump(self.model, model_path)
         joblib.dump(self.scaler, scaler_path)
+        if self.training_state:
+            with open(self._training_state_path(model_path), 'w') as f:
+                json.dump(self.training_state, f, indent=2)
         print(f"Model saved to {model_path}")
         print(f"Scaler saved to {scaler_path}")
+        
+        self.checksum = artifact_checksum(model_path, scaler_path)
+        _notify_artifact_saved(model_path, old_checksum, self.checksum)
     
-    def load_model(self, model_path, scaler_path=None):
+    def load_model(self, model_path, scaler_path=None, mmap_mode=None):
         """Load a trained model and scaler from disk.
         
         Args:
-            model_path (str): Path to the saved model file.
+            model_path (str): Path to the saved model file, a model bundle or a .npz flat-array export.
             scaler_path (str, optional): Path to the saved scaler file.
+            mmap_mode (str, optional): joblib mmap mode, e.g. 'r' to memory-map the tree arrays
+                so several worker processes share the same pages.
         """
-        self.model = joblib.load(model_path)
+        if is_bundle(model_path):
+            self.load_bundle(model_path)
+            return
+        
+        import joblib
+        if model_path.endswith('.npz'):
+            # Flat-array export written by export_flat_model
+            self.model = FlatForest.load(model_path)
+        else:
+            self.model = joblib.load(model_path, mmap_mode=mmap_mode)
         
         if scaler_path and os.path.exists(scaler_path):
             self.scaler = joblib.load(scaler_path)
         
-        print(f"Model loaded from {model_path}")
+        training_state_path = self._training_state_path(model_path)
+        if os.path.exists(training_state_path):
+            with open(training_state_path) as f:
+                self.training_state = json.load(f)
+        
+        self.checksum = artifact_checksum(model_path, scaler_path)
+        
+        print(f"Model loaded from {model_path}", file=sys.stderr)
     
-    def predict(self, future_hours=24, start_time=None, station_id=None):
-        """Generate tide predictions for future hours.
+    def save_bundle(self, model_path, include_estimator=True):
+        """Save model, scaler, feature list and training metadata as one model bundle.
+        
+        The forest is stored as page-aligned FlatForest arrays that load_bundle memory-maps
+        without unpickling anything. The scikit-learn estimator is kept as a pickled section
+        so update() can continue training from the bundle.
+        
+        Args:
+            model_path (str): Bundle path.
+            include_estimator (bool, optional): Also store the scikit-learn estimator.
+        """
+        old_checksum = artifact_checksum(model_path)
+        
+        flat_model = self.model if isinstance(self.model, FlatForest) else FlatForest.from_sklearn(self.model)
+        arrays = {f'model.{name}': array for name, array in flat_model.to_arrays().items()}
+        scaler_data, scaler_metadata = scaler_arrays(self.scaler)
+        arrays.update(scaler_data)
+        
+        objects = {}
+        if include_estimator and not isinstance(self.model, FlatForest):
+            objects['estimator'] = self.model
+        
+        self.checksum = write_bundle(
+            model_path,
+            kind='tide_forest',
+            arrays=arrays,
+            objects=objects,
+            metadata={'target': self.target, 'training_state': self.training_state, 'scaler': scaler_metadata},
+            features=self.features
+        )
+        self._bundle_path = model_path
+        print(f"Model bundle saved to {model_path}")
+        
+        _notify_artifact_saved(model_path, old_checksum, self.checksum)
+    
+    def load_bundle(self, model_path):
+        """Load a bundle written by save_bundle, memory-mapping the forest arrays."""
+        bundle = ModelBundle(model_path)
+        if bundle.kind != 'tide_forest':
+            raise ValueError(f"{model_path} holds a {bundle.kind} bundle, not a tide forest")
+        
+        self.model = FlatForest.from_arrays(bundle.arrays('model.'))
+        self.scaler = load_scaler(bundle, bundle.metadata['scaler'])
+        self.features = bundle.features
+        self.target = bundle.metadata['target']
+        self.training_state = bundle.metadata['training_state']
+        self.checksum = bundle.checksum
+        self._bundle_path = model_path
+        
+        print(f"Model loaded from {model_path}", file=sys.stderr)
+    
+    def export_flat_model(self, model_path, dtype=np.float64):
+        """Export the forest to contiguous node arrays for fast, compact inference.
+        
+        The export is loaded back with load_model(model_path) and predicts through
+        FlatForest's level-by-level traversal instead of scikit-learn. The scaler is not
+        part of the export; keep using the one saved by save_model.
+        
+        Args:
+            model_path (str): Path of the .npz export.
+            dtype (numpy.dtype, optional): np.float32 roughly halves the model size.
+        """
+        if self.model is None:
+            raise ValueError("Model has not been trained yet")
+        
+        flat_model = self.model if isinstance(self.model, FlatForest) else FlatForest.from_sklearn(self.model, dtype)
+        flat_model.save(model_path)
+        print(f"Flat model saved to {model_path} ({flat_model.nbytes / 1024**2:.1f} MB)")
+    
+    def _future_times(self, future_hours=24, start_time=None):
+        """Build the hourly timestamp grid for a prediction request.
         
         Args:
             future_hours (int, optional): Number of hours to predict into the future.
             start_time (datetime, optional): Start time for predictions. Defaults to current time.
-            station_id (str, optional): Station ID for the predictions.
             
         Returns:
-            pandas.DataFrame: DataFrame containing the predictions.
+            pandas.DatetimeIndex: Hourly timestamps starting at start_time.
+        """
+        if start_time is None:
+            start_time = datetime.now()
+        
+        return pd.date_range(start=start_time, periods=future_hours, freq='h')
+    
+    def predict_at(self, ts):
+        """Predict tide heights at arbitrary timestamps with a single model call.
+        
+        Args:
+            ts: DatetimeIndex, datetime Series or array of timestamps.
+            
+        Returns:
+            numpy.ndarray: Predicted tide heights.
         """
         if self.model is None:
             raise ValueError("Model has not been trained or loaded yet")
         
-        if start_time is None:
-            start_time = datetime.now()
+        X = self._prepare_features(pd.DataFrame({'ts': ts}))
+        return self.model.predict(self.scaler.transform(X))
+    
+    def _tree_model(self):
+        """The forest as a FlatForest, converted once per scikit-learn estimator."""
+        if isinstance(self.model, FlatForest):
+            return self.model
+        if self._flat_model is None or self._flat_model[0] is not self.model:
+            self._flat_model = (self.model, FlatForest.from_sklearn(self.model))
+        return self._flat_model[1]
+    
+    def predict_quantiles_at(self, ts, quantiles=(0.1, 0.5, 0.9)):
+        """Predict tide heights and quantiles of the per-tree predictions at arbitrary timestamps.
         
-        # Generate future timestamps
-        future_times = [start_time + timedelta(hours=i) for i in range(future_hours)]
-        future_df = pd.DataFrame({'ts': future_times})
+        The spread of the individual trees gives an uncertainty band without fitting separate
+        quantile models.
         
-        if station_id:
-            future_df['stationId'] = station_id
+        Args:
+            ts: DatetimeIndex, datetime Series or array of timestamps.
+            quantiles (sequence, optional): Quantiles in [0, 1].
+            
+        Returns:
+            tuple: (mean of shape (len(ts),), quantiles of shape (len(quantiles), len(ts)))
+        """
+        if self.model is None:
+            raise ValueError("Model has not been trained or loaded yet")
         
-        # Prepare features
-        X_future = self._prepare_features(future_df)
-        X_future_scaled = self.scaler.transform(X_future)
+        X = self._prepare_features(pd.DataFrame({'ts': ts}))
+        return self._tree_model().predict_quantiles(self.scaler.transform(X), quantiles)
+    
+    @classmethod
+    def _predict_group(cls, models, ts):
+        """Predict one shared set of timestamps for several models of this class.
+        
+        Features are built once for the timestamp set; models shared by several
+        stations are evaluated once.
+        
+        Args:
+            models (list): Trained models of this class.
+            ts (pandas.DatetimeIndex): Timestamps to predict at.
+            
+        Returns:
+            numpy.ndarray: Array of shape (len(models), len(ts)).
+        """
+        X = models[0]._prepare_features(pd.DataFrame({'ts': ts}))
         
-        # Make predictions
-        predictions = self.model.predict(X_future_scaled)
+        results = np.empty((len(models), len(ts)))
+        computed = {}
+        for i, model in enumerate(models):
+            if model.model is None:
+                raise ValueError("Model has not been trained or loaded yet")
+            if id(model) not in computed:
+                computed[id(model)] = model.model.predict(model.scaler.transform(X))
+            results[i] = computed[id(model)]
+        
+        return results
+    
+    def predict(self, future_hours=24, start_time=None, station_id=None, quantiles=None):
+        """Generate tide predictions for future hours.
+        
+        Args:
+            future_hours (int, optional): Number of hours to predict into the future.
+            start_time (datetime, optional): Start time for predictions. Defaults to current time.
+            station_id (str, optional): Station ID for the predictions.
+            quantiles (sequence, optional): Quantiles of the per-tree predictions to add as
+                columns, e.g. (0.1, 0.5, 0.9) adds tide_m_p10, tide_m_p50 and tide_m_p90.
+            
+        Returns:
+            pandas.DataFrame: DataFrame containing the predictions.
+        """
+        if self.model is None:
+            raise ValueError("Model has not been trained or loaded yet")
+        
+        future_times = self._future_times(future_hours, start_time)
         
         # Create results dataframe
-        results_df = pd.DataFrame({
-            'ts': future_times,
-            'tide_m': predictions
-        })
+        if quantiles:
+            mean, bands = self.predict_quantiles_at(future_times, quantiles)
+            columns = {'ts': future_times, 'tide_m': mean}
+            columns.update((quantile_column(quantile), band) for quantile, band in zip(quantiles, bands))
+            results_df = pd.DataFrame(columns)
+        else:
+            results_df = pd.DataFrame({
+                'ts': future_times,
+                'tide_m': self.predict_at(future_times)
+            })
         
         if station_id:
             results_df['stationId'] = station_id
@@ -276,6 +683,8 @@ class TidePredictionModel:
             predictions (pandas.DataFrame, optional): DataFrame containing predictions.
             output_path (str, optional): Path to save the visualization to.
         """
+        import matplotlib.pyplot as plt
+        
         plt.figure(figsize=(12, 6))
         
         if actual_data is not None and self.target in actual_data.columns:
@@ -296,23 +705,18 @@ class TidePredictionModel:
         else:
             plt.show()
     
-    def export_predictions_json(self, predictions, output_path=None):
+    def export_predictions_json(self, predictions, output_path=None, indent=2):
         """Export predictions to JSON format.
         
         Args:
             predictions (pandas.DataFrame): DataFrame containing predictions.
             output_path (str, optional): Path to save the JSON file to.
+            indent (int, optional): JSON indentation. Use None for compact single-line output.
             
         Returns:
             str: JSON string of predictions.
         """
-        # Convert timestamps to ISO format strings
-        predictions_dict = predictions.copy()
-        predictions_dict['ts'] = predictions_dict['ts'].dt.strftime('%Y-%m-%dT%H:%M:%S')
-        
-        # Convert to JSON
-        json_data = predictions_dict.to_dict(orient='records')
-        json_str = json.dumps(json_data, indent=2)
+        json_str = to_json(predictions, indent=indent)
         
         if output_path:
             with open(output_path, 'w') as f:
@@ -320,6 +724,367 @@ class TidePredictionModel:
             print(f"Predictions exported to {output_path}")
         
         return json_str
+    
+    def export_predictions(self, predictions, fmt='json', output_path=None):
+        """Export predictions in one of the prediction_formats encodings.
+        
+        Args:
+            predictions (pandas.DataFrame): DataFrame containing predictions.
+            fmt (str, optional): 'json', 'compact' (columns with epoch-ms timestamps), 'ndjson'
+                (one record per line) or 'binary' (packed float32 with a start / step header).
+            output_path (str, optional): File to write. Defaults to stdout, where NDJSON is
+                streamed row by row.
+        """
+        if not output_path:
+            write_predictions(predictions, fmt)
+            return
+        
+        payload = encode(predictions, fmt)
+        with open(output_path, 'wb' if isinstance(payload, bytes) else 'w') as f:
+            f.write(payload)
+        print(f"Predictions exported to {output_path}", file=sys.stderr)
+
+# Angular speeds (degrees per hour) of the standard tidal constituents, in fitting priority order
+TIDAL_CONSTITUENTS = {
+    'M2': 28.9841042,
+    'S2': 30.0000000,
+    'N2': 28.4397295,
+    'K1': 15.0410686,
+    'O1': 13.9430356,
+    'K2': 30.0821373,
+    'P1': 14.9589314,
+    'Q1': 13.3986609,
+    'M4': 57.9682084,
+    'MS4': 58.9841042,
+    'M6': 86.9523127,
+    'MN4': 57.4238337,
+    'Mf': 1.0980331,
+    'Mm': 0.5443747,
+    'Ssa': 0.0821373,
+    'Sa': 0.0410686
+}
+
+# Phases are referenced to 2000-01-01 00:00 UTC
+HARMONIC_EPOCH_NS = 946684800 * 10**9
+HOUR_NS = 3600 * 10**9
+
+
+class HarmonicTideModel(TidePredictionModel):
+    def __init__(self, model_path=None, constituents=None):
+        """Initialize the harmonic tide model.
+        
+        The model is a least-squares fit of tidal constituents: a mean level plus one
+        amplitude and phase per constituent. It exposes the same train/predict/save_model
+        surface as TidePredictionModel.
+        
+        Args:
+            model_path (str, optional): Path to a saved model file. If provided, the model will be loaded from this file.
+            constituents (list, optional): Names of the constituents to fit. Defaults to all of TIDAL_CONSTITUENTS.
+        """
+        self.constituents = list(constituents or TIDAL_CONSTITUENTS)
+        super().__init__(model_path=model_path)
+    
+    def _hours_since_epoch(self, ts):
+        """Convert timestamps to float hours since the harmonic reference epoch."""
+        return (to_epoch_ns(ts) - HARMONIC_EPOCH_NS) / HOUR_NS
+    
+    def _resolvable_constituents(self, duration_hours):
+        """Select constituents that can be separated over a record of the given length.
+        
+        Uses the Rayleigh criterion: two constituents are only fitted together if the record
+        covers at least one full cycle of their beat frequency. Constituents are accepted in
+        priority order, so the major ones always win over their close neighbours.
+        
+        Args:
+            duration_hours (float): Length of the training record in hours.
+            
+        Returns:
+            list: Names of the constituents to fit.
+        """
+        selected = []
+        for name in self.constituents:
+            speed = TIDAL_CONSTITUENTS[name]
+            if speed * duration_hours < 360:
+                continue
+            if all(abs(speed - TIDAL_CONSTITUENTS[other]) * duration_hours >= 360 for other in selected):
+                selected.append(name)
+        return selected
+    
+    def _design_matrix(self, hours, speeds):
+        """Build the [1, cos, sin, ...] least-squares design matrix."""
+        angles = np.outer(hours, np.deg2rad(speeds))
+        return np.hstack([np.ones((len(hours), 1)), np.cos(angles), np.sin(angles)])
+    
+    def train(self, data, test_size=0.2, random_state=42, tune_hyperparams=False):
+        """Fit tidal constituents to the data by least squares.
+        
+        Args:
+            data (pandas.DataFrame): DataFrame containing tide data.
+            test_size (float, optional): Proportion of data to use for testing.
+            random_state (int, optional): Random seed for reproducibility.
+            tune_hyperparams (bool, optional): Ignored, the harmonic fit has no hyperparameters.
+            
+        Returns:
+            dict: Dictionary containing model performance metrics.
+        """
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+        
+        valid = data[['ts', self.target]].dropna()
+        hours = self._hours_since_epoch(valid['ts'])
+        y = valid[self.target].to_numpy(dtype=np.float64)
+        
+        names = self._resolvable_constituents(hours.max() - hours.min())
+        if not names:
+            raise ValueError("Training data is too short to resolve any tidal constituent")
+        speeds = np.array([TIDAL_CONSTITUENTS[name] for name in names])
+        
+        # Split data
+        hours_train, hours_test, y_train, y_test = train_test_split(
+            hours, y, test_size=test_size, random_state=random_state
+        )
+        
+        coefficients, _, _, _ = np.linalg.lstsq(self._design_matrix(hours_train, speeds), y_train, rcond=None)
+        
+        n = len(names)
+        cos_terms = coefficients[1:n + 1]
+        sin_terms = coefficients[n + 1:]
+        self.model = {
+            'constituents': names,
+            'speeds': speeds,
+            'mean': float(coefficients[0]),
+            'amplitudes': np.hypot(cos_terms, sin_terms),
+            'phases': np.rad2deg(np.arctan2(sin_terms, cos_terms)) % 360
+        }
+        
+        # Evaluate model
+        y_pred = self._predict_hours(hours_test)
+        
+        metrics = {
+            'mse': mean_squared_error(y_test, y_pred),
+            'rmse': np.sqrt(mean_squared_error(y_test, y_pred)),
+            'mae': mean_absolute_error(y_test, y_pred),
+            'r2': r2_score(y_test, y_pred)
+        }
+        
+        print(f"Fitted {n} constituents: {', '.join(names)}")
+        print("Model performance metrics:")
+        for metric, value in metrics.items():
+            print(f"{metric}: {value:.4f}")
+        
+        return metrics
+    
+    def update(self, data, n_trees=20, max_trees=None, random_state=None):
+        """Not supported: a harmonic fit is a single least-squares solve, retrain it with train()."""
+        raise ValueError("Harmonic models are refitted with train(), not updated incrementally")
+    
+    def predict_quantiles_at(self, ts, quantiles=(0.1, 0.5, 0.9)):
+        """Not supported: quantile bands come from the per-tree predictions of a forest."""
+        raise ValueError("Quantile bands need a forest model, the harmonic model has no trees")
+    
+    def _predict_hours(self, hours):
+        """Evaluate the constituent cosine sum at float hours since the reference epoch."""
+        model = self.model
+        angles = np.outer(hours, np.deg2rad(model['speeds'])) - np.deg2rad(model['phases'])
+        return model['mean'] + np.cos(angles) @ model['amplitudes']
+    
+    @classmethod
+    def _predict_group(cls, models, ts):
+        """Predict one shared set of timestamps for several harmonic models.
+        
+        The cos/sin basis is computed once for the union of all constituent speeds, and
+        every station is evaluated in a single matrix product using
+        cos(wt - p) = cos(wt) cos(p) + sin(wt) sin(p).
+        
+        Args:
+            models (list): Trained harmonic models.
+            ts (pandas.DatetimeIndex): Timestamps to predict at.
+            
+        Returns:
+            numpy.ndarray: Array of shape (len(models), len(ts)).
+        """
+        for model in models:
+            if model.model is None:
+                raise ValueError("Model has not been trained or loaded yet")
+        
+        speeds = np.unique(np.concatenate([model.model['speeds'] for model in models]))
+        angles = np.outer(models[0]._hours_since_epoch(ts), np.deg2rad(speeds))
+        
+        cos_coefficients = np.zeros((len(speeds), len(models)))
+        sin_coefficients = np.zeros((len(speeds), len(models)))
+        means = np.empty(len(models))
+        for i, model in enumerate(models):
+            columns = np.searchsorted(speeds, model.model['speeds'])
+            phases = np.deg2rad(model.model['phases'])
+            cos_coefficients[columns, i] = model.model['amplitudes'] * np.cos(phases)
+            sin_coefficients[columns, i] = model.model['amplitudes'] * np.sin(phases)
+            means[i] = model.model['mean']
+        
+        heights = np.cos(angles) @ cos_coefficients + np.sin(angles) @ sin_coefficients + means
+        return heights.T
+    
+    def predict_at(self, ts):
+        """Predict tide heights at arbitrary timestamps.
+        
+        Args:
+            ts: DatetimeIndex, datetime Series or array of timestamps.
+            
+        Returns:
+            numpy.ndarray: Predicted tide heights.
+        """
+        if self.model is None:
+            raise ValueError("Model has not been trained or loaded yet")
+        
+        return self._predict_hours(self._hours_since_epoch(ts))
+    
+    def save_model(self, model_path='./tide_harmonic_model.json', scaler_path=None):
+        """Save the fitted constituents to a JSON file, or to a model bundle if the path ends in .bundle.
+        
+        Args:
+            model_path (str, optional): Path to save the model to.
+            scaler_path (str, optional): Ignored, the harmonic model has no scaler.
+        """
+        if self.model is None:
+            raise ValueError("Model has not been trained yet")
+        
+        os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+        
+        old_checksum = artifact_checksum(model_path)
+        
+        model = self.model
+        if model_path.endswith('.bundle'):
+            self.checksum = write_bundle(
+                model_path,
+                kind='tide_harmonic',
+                arrays={name: np.asarray(model[name], dtype=np.float64) for name in ('speeds', 'amplitudes', 'phases')},
+                metadata={
+                    'target': self.target,
+                    'epoch': pd.Timestamp(HARMONIC_EPOCH_NS).isoformat(),
+                    'mean': model['mean'],
+                    'constituents': model['constituents']
+                }
+            )
+            print(f"Model bundle saved to {model_path}")
+            _notify_artifact_saved(model_path, old_checksum, self.checksum)
+            return
+        
+        with open(model_path, 'w') as f:
+            json.dump({
+                'backend': 'harmonic',
+                'epoch': pd.Timestamp(HARMONIC_EPOCH_NS).isoformat(),
+                'mean': model['mean'],
+                'constituents': [
+                    {'name': name, 'speed': float(speed), 'amplitude': float(amplitude), 'phase': float(phase)}
+                    for name, speed, amplitude, phase in zip(
+                        model['constituents'], model['speeds'], model['amplitudes'], model['phases']
+                    )
+                ]
+            }, f, indent=2)
+        print(f"Model saved to {model_path}")
+        
+        self.checksum = artifact_checksum(model_path)
+        _notify_artifact_saved(model_path, old_checksum, self.checksum)
+    
+    def load_model(self, model_path, scaler_path=None, mmap_mode=None):
+        """Load fitted constituents from a JSON file or model bundle.
+        
+        Args:
+            model_path (str): Path to the saved model file.
+            scaler_path (str, optional): Ignored, the harmonic model has no scaler.
+            mmap_mode (str, optional): Ignored, the harmonic model is a few dozen floats.
+        """
+        if is_bundle(model_path):
+            bundle = ModelBundle(model_path)
+            if bundle.kind != 'tide_harmonic':
+                raise ValueError(f"{model_path} holds a {bundle.kind} bundle, not a harmonic model")
+            self.model = {
+                'constituents': bundle.metadata['constituents'],
+                'speeds': bundle.array('speeds'),
+                'mean': bundle.metadata['mean'],
+                'amplitudes': bundle.array('amplitudes'),
+                'phases': bundle.array('phases')
+            }
+            self.checksum = bundle.checksum
+            print(f"Model loaded from {model_path}", file=sys.stderr)
+            return
+        
+        with open(model_path) as f:
+            saved = json.load(f)
+        
+        constituents = saved['constituents']
+        self.model = {
+            'constituents': [c['name'] for c in constituents],
+            'speeds': np.array([c['speed'] for c in constituents]),
+            'mean': saved['mean'],
+            'amplitudes': np.array([c['amplitude'] for c in constituents]),
+            'phases': np.array([c['phase'] for c in constituents])
+        }
+        self.checksum = artifact_checksum(model_path)
+        
+        print(f"Model loaded from {model_path}", file=sys.stderr)
+
+def predict_many(models, times, station_ids=None):
+    """Predict many stations at once, at a shared or per-station set of timestamps.
+    
+    Stations are grouped by their timestamp set and model class, features are built once per
+    unique timestamp set and each group is predicted with one vectorized call per model.
+    
+    Args:
+        models: Mapping of station ID to trained model, or a station-keyed model registry.
+        times: A DatetimeIndex shared by all stations, or a mapping of station ID to
+            timestamps (DatetimeIndex, datetime Series or array) for irregular per-station grids.
+        station_ids (list, optional): Stations to predict. Defaults to the keys of the
+            per-station times, or of the models mapping when times are shared.
+            
+    Returns:
+        pandas.DataFrame: Columnar results with stationId (categorical), ts and tide_m columns,
+            ordered by station and then by timestamp order as given.
+    """
+    per_station = isinstance(times, dict)
+    if station_ids is None:
+        station_ids = list(times.keys()) if per_station else list(models.keys())
+    station_ids = list(station_ids)
+    
+    # Group stations by timestamp set, then by model class
+    shared = None if per_station else pd.DatetimeIndex(times)
+    station_times = {}
+    timestamp_sets = {}
+    groups = {}
+    for station_id in station_ids:
+        ts_key = None
+        if per_station:
+            ts = station_times[station_id] = pd.DatetimeIndex(times[station_id])
+            ts_key = (str(ts.tz), hashlib.sha1(ts.as_unit('ns').asi8.tobytes()).hexdigest())
+            timestamp_sets.setdefault(ts_key, ts)
+        else:
+            timestamp_sets[ts_key] = shared
+        
+        model = models[station_id]
+        groups.setdefault((ts_key, type(model)), []).append((station_id, model))
+    
+    heights = {}
+    for (ts_key, model_class), members in groups.items():
+        predicted = model_class._predict_group([model for _, model in members], timestamp_sets[ts_key])
+        for (station_id, _), row in zip(members, predicted):
+            heights[station_id] = row
+    
+    if not station_ids:
+        return pd.DataFrame({'stationId': pd.Categorical([]), 'ts': pd.DatetimeIndex([]), 'tide_m': np.array([])})
+    
+    lengths = [len(heights[station_id]) for station_id in station_ids]
+    codes = np.repeat(np.arange(len(station_ids)), lengths)
+    
+    if per_station:
+        ts_column = np.concatenate([station_times[station_id].values for station_id in station_ids])
+    else:
+        ts_column = np.tile(shared.values, len(station_ids))
+    
+    return pd.DataFrame({
+        'stationId': pd.Categorical.from_codes(codes, categories=pd.Index(station_ids, dtype=object)),
+        'ts': ts_column,
+        'tide_m': np.concatenate([heights[station_id] for station_id in station_ids])
+    })
+
 
 # Command-line interface
 if __name__ == "__main__":
@@ -329,47 +1094,192 @@ if __name__ == "__main__":
     parser.add_argument('--train', action='store_true', help='Train the model')
     parser.add_argument('--predict', action='store_true', help='Generate predictions')
     parser.add_argument('--csv', type=str, help='Path to CSV file with tide data')
+    parser.add_argument('--store', type=str,
+                        help='Local columnar readings store directory; readings are synced into it and read back')
     parser.add_argument('--station', type=str, help='Station ID')
     parser.add_argument('--hours', type=int, default=24, help='Number of hours to predict')
+    parser.add_argument('--quantiles', type=float, nargs='+',
+                        help='Add quantile bands from the per-tree predictions, e.g. --quantiles 0.1 0.5 0.9')
     parser.add_argument('--save', type=str, help='Path to save the model')
     parser.add_argument('--load', type=str, help='Path to load the model')
+    parser.add_argument('--scaler', type=str, help='Path to save or load the feature scaler')
     parser.add_argument('--output', type=str, help='Path to save predictions or visualization')
     parser.add_argument('--visualize', action='store_true', help='Visualize predictions')
+    parser.add_argument('--format', type=str, choices=['json', 'compact', 'ndjson', 'binary'], default='json',
+                        help='Prediction output encoding (see prediction_formats.py)')
+    parser.add_argument('--search', type=str, choices=['grid', 'halving'], default='halving',
+                        help='Hyperparameter search used by --train')
+    parser.add_argument('--search-max-fits', type=int, help='Fit budget of the halving search')
+    parser.add_argument('--search-max-seconds', type=float, help='Time budget of the halving search in seconds')
+    parser.add_argument('--search-state', type=str,
+                        help='Resumable halving search state (default: next to --save)')
+    parser.add_argument('--export-flat', type=str,
+                        help='Export the trained or loaded forest as flat arrays (.npz) for fast inference')
+    parser.add_argument('--flat-float32', action='store_true', help='Store the flat export as float32')
+    parser.add_argument('--update', action='store_true',
+                        help='Incrementally update the loaded model (or every --registry model) if new readings warrant it')
+    parser.add_argument('--update-trees', type=int, default=20, help='Trees fitted per incremental update')
+    parser.add_argument('--update-window-days', type=float, default=7,
+                        help='Days of recent readings the new trees are fitted on')
+    parser.add_argument('--min-new-rows', type=int, default=24, help='New readings that trigger an update')
+    parser.add_argument('--max-error-ratio', type=float, default=1.25,
+                        help='RMSE drift over the training baseline that triggers an update')
+    parser.add_argument('--backend', type=str, choices=['forest', 'harmonic'], default='forest',
+                        help='Model backend: RandomForest or harmonic constituents')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run as a long-lived JSON-lines prediction server on stdin/stdout')
+    parser.add_argument('--batch-wait-ms', type=float, default=2.0,
+                        help='Server: how long a predict request waits for others to batch with (0 disables batching)')
+    parser.add_argument('--max-batch-size', type=int, default=64,
+                        help='Server: maximum number of predict requests merged into one model call')
+    parser.add_argument('--registry', type=str,
+                        help='Server: model registry directory with one model per station')
+    parser.add_argument('--registry-max-mb', type=int, default=1024,
+                        help='Server: memory budget of the model registry cache in MB')
+    parser.add_argument('--cache-dir', type=str,
+                        help='Server: directory of the on-disk prediction cache tier')
+    parser.add_argument('--cache-mb', type=int, default=64,
+                        help='Server: memory budget of the prediction cache in MB (0 disables caching)')
+    parser.add_argument('--cache-ttl', type=float, default=3600,
+                        help='Server: prediction cache entry lifetime in seconds')
     
     args = parser.parse_args()
     
-    model = TidePredictionModel(model_path=args.load)
+    if args.serve:
+        from prediction_server import PredictionServer
+        from predict_batcher import PredictBatcher
+        from model_registry import ModelRegistry
+        from prediction_cache import PredictionCache
+        
+        model_classes = {'forest': TidePredictionModel, 'harmonic': HarmonicTideModel}
+        
+        # Open (or build once) the astronomical lookup table before taking requests
+        get_default_table(build=True)
+        
+        registry = None
+        if args.registry:
+            registry = ModelRegistry(args.registry, model_classes, max_bytes=args.registry_max_mb * 1024**2)
+        
+        cache = None
+        if args.cache_mb > 0:
+            cache = PredictionCache(max_bytes=args.cache_mb * 1024**2, ttl_seconds=args.cache_ttl,
+                                    disk_dir=args.cache_dir)
+        
+        batcher = None
+        if args.batch_wait_ms > 0:
+            batcher = PredictBatcher(max_batch_size=args.max_batch_size, max_wait_ms=args.batch_wait_ms)
+        
+        server = PredictionServer(
+            model_classes=model_classes,
+            default_model_path=args.load,
+            default_scaler_path=args.scaler,
+            default_backend=args.backend,
+            batcher=batcher,
+            registry=registry,
+            cache=cache,
+            artifact_listeners=artifact_listeners
+        )
+        server.serve()
+        sys.exit(0)
+    
+    if args.backend == 'harmonic':
+        model = HarmonicTideModel()
+    else:
+        model = TidePredictionModel()
+    
+    if args.load:
+        model.load_model(args.load, scaler_path=args.scaler)
+    
+    store = ReadingsStore(args.store) if args.store else None
     
     if args.train:
-        if not args.csv and not mongo_available:
-            print("Error: Either CSV path or MongoDB connection is required for training")
+        if not args.csv and not mongo_available() and not (store and store.has_data()):
+            print("Error: Either CSV path, MongoDB connection or a populated readings store is required for training")
             sys.exit(1)
         
-        data = model.load_data(csv_path=args.csv, station_id=args.station)
-        model.train(data, tune_hyperparams=True)
+        data = model.load_data(csv_path=args.csv, station_id=args.station, store=store)
+        if isinstance(model, HarmonicTideModel):
+            # The harmonic fit has no hyperparameters to search
+            model.train(data, tune_hyperparams=True)
+        else:
+            search_state = args.search_state
+            if not search_state and args.save:
+                search_state = os.path.splitext(args.save)[0] + '.search.json'
+            model.train(data, tune_hyperparams=True, search=args.search, max_fits=args.search_max_fits,
+                        max_seconds=args.search_max_seconds, search_state_path=search_state)
         
         if args.save:
-            model.save_model(model_path=args.save)
+            if args.scaler:
+                model.save_model(model_path=args.save, scaler_path=args.scaler)
+            else:
+                model.save_model(model_path=args.save)
+    
+    if args.update:
+        def update_station(station_model, station_id):
+            """Update one model from its recent readings; returns True if it changed."""
+            trained_until = station_model.training_state.get('trained_until')
+            since = pd.Timestamp(trained_until) - pd.Timedelta(days=args.update_window_days) if trained_until else None
+            recent = station_model.load_data(csv_path=args.csv, station_id=station_id, start_date=since, store=store)
+            # The CSV path of load_data returns every station's rows
+            if station_id is not None and 'stationId' in recent.columns:
+                recent = recent[recent['stationId'].astype(str) == str(station_id)]
+            if since is not None:
+                recent = recent[pd.to_datetime(recent['ts']) > since]
+            
+            needed, reason = station_model.retrain_needed(recent, args.min_new_rows, args.max_error_ratio)
+            print(f"{station_id or 'model'}: {'updating' if needed else 'skipping'} ({reason})")
+            if needed:
+                station_model.update(recent, n_trees=args.update_trees)
+            return needed
+        
+        if args.registry:
+            from model_registry import ModelRegistry
+            
+            registry = ModelRegistry(args.registry, {'forest': TidePredictionModel, 'harmonic': HarmonicTideModel})
+            for station_id in ([args.station] if args.station else registry.keys()):
+                station_model = registry.get(station_id)
+                if isinstance(station_model, HarmonicTideModel):
+                    print(f"{station_id}: skipping harmonic model, retrain it with --train")
+                    continue
+                if update_station(station_model, station_id):
+                    print(f"{station_id}: published {registry.publish(station_id, station_model)}")
+        else:
+            if model.model is None:
+                print("Error: Model must be loaded (--load) before it can be updated")
+                sys.exit(1)
+            if update_station(model, args.station) and args.save:
+                if args.scaler:
+                    model.save_model(model_path=args.save, scaler_path=args.scaler)
+                else:
+                    model.save_model(model_path=args.save)
+    
+    if args.export_flat:
+        if model.model is None or isinstance(model, HarmonicTideModel):
+            print("Error: A trained or loaded forest model is required for --export-flat")
+            sys.exit(1)
+        model.export_flat_model(args.export_flat, dtype=np.float32 if args.flat_float32 else np.float64)
     
     if args.predict:
         if model.model is None:
             print("Error: Model must be trained or loaded before making predictions")
             sys.exit(1)
         
-        predictions = model.predict(future_hours=args.hours, station_id=args.station)
+        predictions = model.predict(future_hours=args.hours, station_id=args.station, quantiles=args.quantiles)
         
         if args.visualize:
             # If we have training data, use it for visualization
             actual_data = None
-            if args.csv or mongo_available:
+            if args.csv or store or mongo_available():
                 try:
-                    actual_data = model.load_data(csv_path=args.csv, station_id=args.station)
+                    actual_data = model.load_data(csv_path=args.csv, station_id=args.station, store=store)
                 except:
                     pass
             
             model.visualize_predictions(actual_data=actual_data, predictions=predictions, output_path=args.output)
-        else:
+        elif args.format == 'json':
             # Export predictions to JSON
             json_output = model.export_predictions_json(predictions, output_path=args.output)
             if not args.output:
-                print(json_output)
\ No newline at end of file
+                print(json_output)
+        else:
+            model.export_predictions(predictions, fmt=args.format, output_path=args.output)
\ No newline at end of file
@@ -1,11 +1,14 @@
 
 
 import { spawn } from 'child_process';
+import os from 'os';
+import readline from 'readline';
 import path from 'path';
 import { fileURLToPath } from 'url';
 import fs from 'fs';
 import axios from 'axios';
 import { promisify } from 'util';
+import Reading from '../models/Reading.js';
 
 // Get current file directory with ES modules
 const __filename = fileURLToPath(import.meta.url);
@@ -20,6 +23,23 @@ const ALERT_PATTERN_SCRIPT = path.join(ANALYSIS_DIR, 'alert_pattern_analysis.py'
 // Flag to track if environment has been verified
 let environmentVerified = false;
 
+// Long-lived prediction workers (tide_prediction_model.py --serve)
+const PREDICTION_MODEL_PATH = process.env.TIDE_MODEL_PATH;
+const PREDICTION_SCALER_PATH = process.env.TIDE_SCALER_PATH;
+const PREDICTION_BACKEND = process.env.TIDE_MODEL_BACKEND || 'forest';
+const PREDICTION_WORKER_COUNT = parseInt(process.env.PREDICTION_WORKERS) || os.cpus().length;
+const PREDICTION_REQUEST_TIMEOUT = 30 * 1000;
+// Crashed workers are restarted after 0.5 s, 1 s, 2 s, ... and given up on after
+// PREDICTION_MAX_RESTARTS crashes in a row; a worker that stays up a minute resets the count
+const PREDICTION_RESTART_DELAY = 500;
+const PREDICTION_MAX_RESTARTS = 5;
+const PREDICTION_STABLE_TIME = 60 * 1000;
+
+const predictionWorkers = [];
+let poolReady = null;
+const pendingRestarts = new Set();
+let nextRequestId = 1;
+
 
 async function verifyPythonEnvironment() {
   if (environmentVerified) return true;
@@ -65,8 +85,205 @@ async function verifyPythonEnvironment() {
 }
 
 
+/**
+ * Start one long-lived Python prediction worker.
+ * The worker speaks JSON-lines on stdin/stdout and announces readiness with a health line.
+ * @param {Number} restarts - Crashes in a row of the worker this one replaces
+ * @returns {Object} - Worker handle with its process, pending requests and ready promise
+ */
+function startPredictionWorker(restarts = 0) {
+  const pythonExecutable = process.platform === 'win32' ? 'python' : 'python3';
+  const args = [TIDE_PREDICTION_SCRIPT, '--serve', '--backend', PREDICTION_BACKEND];
+  if (PREDICTION_MODEL_PATH) args.push('--load', PREDICTION_MODEL_PATH);
+  if (PREDICTION_SCALER_PATH) args.push('--scaler', PREDICTION_SCALER_PATH);
+
+  const worker = {
+    process: spawn(pythonExecutable, args, { cwd: ANALYSIS_DIR }),
+    pending: new Map(),
+    ready: null,
+    isReady: false,
+    startedAt: Date.now(),
+    restarts
+  };
+
+  worker.ready = new Promise((resolve, reject) => {
+    worker.resolveReady = resolve;
+    worker.rejectReady = reject;
+  });
+  // Avoid unhandled rejections when nobody is waiting on a failed start
+  worker.ready.catch(() => {});
+
+  const lines = readline.createInterface({ input: worker.process.stdout });
+  lines.on('line', (line) => {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (e) {
+      // Ignore anything that is not a protocol line
+      return;
+    }
+
+    // The unsolicited startup health line marks the worker as ready
+    if (message.id === null) {
+      worker.isReady = true;
+      worker.resolveReady(message.result);
+      return;
+    }
+
+    const request = worker.pending.get(message.id);
+    if (!request) return;
+    worker.pending.delete(message.id);
+    clearTimeout(request.timeout);
+
+    if (message.ok) {
+      request.resolve(message.result);
+    } else {
+      request.reject(new Error(message.error));
+    }
+  });
+
+  worker.process.stderr.on('data', (data) => {
+    console.error(`[prediction worker ${worker.process.pid}] ${data.toString().trim()}`);
+  });
+
+  const failPending = (error) => {
+    worker.rejectReady(error);
+    for (const request of worker.pending.values()) {
+      clearTimeout(request.timeout);
+      request.reject(error);
+    }
+    worker.pending.clear();
+
+    // Replace a crashed worker after a backoff so the pool stays at full size; drop workers
+    // that never started or keep crashing
+    const index = predictionWorkers.indexOf(worker);
+    if (index === -1) return;
+    predictionWorkers.splice(index, 1);
+    if (worker.isReady) {
+      const restarts = Date.now() - worker.startedAt >= PREDICTION_STABLE_TIME ? 1 : worker.restarts + 1;
+      if (restarts <= PREDICTION_MAX_RESTARTS) {
+        const timer = setTimeout(() => {
+          pendingRestarts.delete(timer);
+          predictionWorkers.push(startPredictionWorker(restarts));
+        }, PREDICTION_RESTART_DELAY * 2 ** (restarts - 1));
+        pendingRestarts.add(timer);
+        return;
+      }
+      console.error(`Prediction worker crashed ${restarts} times in a row; not restarting it`);
+    }
+    // Start a fresh pool on the next request once every worker is gone
+    if (predictionWorkers.length === 0 && pendingRestarts.size === 0) {
+      poolReady = null;
+    }
+  };
+
+  worker.process.on('exit', (code) => {
+    failPending(new Error(`Prediction worker exited with code ${code}`));
+  });
+
+  worker.process.on('error', (error) => {
+    failPending(new Error(`Failed to start prediction worker: ${error.message}`));
+  });
+
+  return worker;
+}
+
+
+/**
+ * Start the prediction worker pool once; concurrent callers share the same promise.
+ * @returns {Promise<void>}
+ */
+function ensurePredictionPool() {
+  if (!poolReady) {
+    poolReady = verifyPythonEnvironment().then(() => {
+      for (let i = 0; i < PREDICTION_WORKER_COUNT; i++) {
+        predictionWorkers.push(startPredictionWorker());
+      }
+    });
+    poolReady.catch(() => {
+      poolReady = null;
+    });
+  }
+  return poolReady;
+}
+
+
+/**
+ * Send a command to the least busy prediction worker, starting the pool on first use.
+ * @param {String} command - Server command: health, predict, thresholds or analysis
+ * @param {Object} params - Command parameters
+ * @returns {Promise<Object>} - Command result
+ */
+async function callPredictionServer(command, params = {}) {
+  await ensurePredictionPool();
+  if (predictionWorkers.length === 0) {
+    throw new Error('No prediction workers available');
+  }
+
+  const worker = predictionWorkers.reduce((best, candidate) =>
+    candidate.pending.size < best.pending.size ? candidate : best
+  );
+  await worker.ready;
+
+  return new Promise((resolve, reject) => {
+    const id = nextRequestId++;
+    const timeout = setTimeout(() => {
+      worker.pending.delete(id);
+      reject(new Error(`Prediction server ${command} request timed out`));
+    }, PREDICTION_REQUEST_TIMEOUT);
+
+    worker.pending.set(id, { resolve, reject, timeout });
+    worker.process.stdin.write(JSON.stringify({ id, command, params }) + '\n');
+  });
+}
+
+
+/**
+ * Stop all prediction workers.
+ */
+function shutdownPredictionWorkers() {
+  for (const timer of pendingRestarts) {
+    clearTimeout(timer);
+  }
+  pendingRestarts.clear();
+  poolReady = null;
+  const workers = predictionWorkers.splice(0, predictionWorkers.length);
+  for (const worker of workers) {
+    worker.process.removeAllListeners('exit');
+    worker.process.stdin.end();
+  }
+}
+
+// Stop the workers with the process; the default SIGTERM exit is kept unless the
+// application installs its own handler
+process.on('beforeExit', shutdownPredictionWorkers);
+process.once('SIGTERM', () => {
+  shutdownPredictionWorkers();
+  if (process.listenerCount('SIGTERM') === 0) {
+    process.kill(process.pid, 'SIGTERM');
+  }
+});
+
+
 async function generateTidePredictions(hours = 24, stationId = null) {
   try {
+    if (PREDICTION_MODEL_PATH) {
+      // Compact format: { ts: [epoch ms, ...], tide_m: [...] }
+      const predictions = await callPredictionServer('predict', {
+        hours,
+        station: stationId,
+        start_time: new Date().toISOString(),
+        format: 'compact'
+      });
+      const heights = predictions.tide_m;
+      const mean = heights.reduce((sum, h) => sum + h, 0) / (heights.length || 1);
+      return predictions.ts.map((ms, i) => ({
+        timestamp: new Date(ms).toISOString(),
+        height: parseFloat(heights[i].toFixed(2)),
+        type: heights[i] > mean ? 'high' : 'low'
+      }));
+    }
+    
     // For testing purposes, generate mock predictions
     // In production, this would call the Python model
     const now = new Date();
@@ -102,6 +319,11 @@ async function generateTidePredictions(hours = 24, stationId = null) {
 
 async function getOptimizedThresholds() {
   try {
+    if (PREDICTION_MODEL_PATH) {
+      // Probability thresholds from the alert model bundle written by alert_threshold_optimization.py
+      return await callPredictionServer('thresholds');
+    }
+    
     // For testing purposes, return mock optimized thresholds
     // In production, this would call the Python model
     return {
@@ -121,6 +343,19 @@ async function getOptimizedThresholds() {
 
 async function analyzeTideData(stationId, days = 7) {
   try {
+    if (PREDICTION_MODEL_PATH) {
+      const since = new Date(Date.now() - days * 24 * 60 * 60 * 1000);
+      const readings = await Reading.find({ stationId, ts: { $gte: since } })
+        .sort({ ts: 1 })
+        .select({ ts: 1, 'metrics.tide_m': 1 })
+        .lean();
+      return await callPredictionServer('analysis', {
+        readings: readings
+          .filter(reading => Number.isFinite(reading.metrics?.tide_m))
+          .map(reading => ({ ts: reading.ts.toISOString(), height: reading.metrics.tide_m }))
+      });
+    }
+    
     // For testing purposes, return mock analysis
     // In production, this would call the Python model
     
@@ -287,6 +522,8 @@ async function runPythonScript(scriptPath, args = []) {
 }
 
 export {
+  callPredictionServer,
+  shutdownPredictionWorkers,
   generateTidePredictions,
   getOptimizedThresholds,
   analyzeTideData,
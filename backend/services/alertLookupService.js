@@ -0,0 +1,143 @@
+/**
+ * Alert Lookup Service
+ *
+ * Alert probabilities of the Python alert threshold model, read from the lookup table written
+ * by analysis/alert_lookup.py. The table holds the model's probability on a grid of
+ * height x rate of change x time of day; a reading's probability is the trilinear
+ * interpolation between the eight surrounding grid nodes, so alerts are decided in O(1)
+ * without calling Python.
+ *
+ * Time of day is taken in UTC, the contract with alert_lookup.py: the model is trained on
+ * naive timestamps that hold UTC (MongoDB stores UTC), whatever the server's time zone.
+ */
+
+import fs from 'fs';
+import path from 'path';
+import { fileURLToPath } from 'url';
+
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
+
+const DEFAULT_LOOKUP_PATH = process.env.ALERT_LOOKUP_PATH ||
+  path.join(__dirname, '..', '..', 'analysis', 'models', 'alert_lookup.json');
+const LOOKUP_FORMAT = 'alert-probability-lookup';
+const LOOKUP_VERSION = 1;
+
+let lookup = null;
+
+/**
+ * Load the lookup table
+ * @param {String} filePath - Lookup JSON written by alert_lookup.py
+ * @returns {Object|null} - The loaded lookup, or null if the file is missing or invalid
+ */
+function loadAlertLookup(filePath = DEFAULT_LOOKUP_PATH) {
+  try {
+    const table = JSON.parse(fs.readFileSync(filePath, 'utf8'));
+    if (table.format !== LOOKUP_FORMAT || table.version > LOOKUP_VERSION) {
+      throw new Error(`Unsupported lookup format ${table.format} v${table.version}`);
+    }
+
+    // Decode the little-endian uint16 probabilities once
+    const bytes = Buffer.from(table.data, 'base64');
+    const probabilities = new Float32Array(bytes.length / 2);
+    for (let i = 0; i < probabilities.length; i++) {
+      probabilities[i] = bytes.readUInt16LE(2 * i) * table.scale;
+    }
+
+    lookup = {
+      axes: table.axes,
+      thresholds: table.thresholds || {},
+      accuracy: table.accuracy,
+      probabilities
+    };
+    console.log(`Loaded alert probability lookup (${probabilities.length} nodes) from ${filePath}`);
+    return lookup;
+  } catch (error) {
+    console.error('Alert probability lookup not available:', error.message);
+    lookup = null;
+    return null;
+  }
+}
+
+/**
+ * Lower grid node and interpolation weight of a value along one axis
+ */
+function axisPosition(axis, value) {
+  let position = (value - axis.start) / axis.step;
+  if (axis.periodic) {
+    const lower = Math.floor(position);
+    return { lower: ((lower % axis.size) + axis.size) % axis.size, weight: position - lower };
+  }
+  // Values outside the grid take the edge value
+  position = Math.min(Math.max(position, 0), axis.size - 1);
+  const lower = Math.min(Math.max(Math.floor(position), 0), Math.max(axis.size - 2, 0));
+  return { lower, weight: position - lower };
+}
+
+/**
+ * Interpolated alert probability of a reading
+ * @param {Number} height - Tide height in metres
+ * @param {Number} rateOfChange - Height change since the station's previous reading
+ * @param {Date|String} ts - Reading time
+ * @returns {Number|null} - Probability, or null without a lookup or with missing inputs
+ */
+function getAlertProbability(height, rateOfChange, ts) {
+  if (!lookup || !Number.isFinite(height) || !Number.isFinite(rateOfChange)) {
+    return null;
+  }
+  const time = new Date(ts);
+  // UTC time of day, as the model's time features were computed
+  const timeOfDay = time.getUTCHours() + time.getUTCMinutes() / 60;
+  const [heightAxis, rateAxis, timeAxis] = lookup.axes;
+  const positions = [
+    axisPosition(heightAxis, height),
+    axisPosition(rateAxis, rateOfChange),
+    axisPosition(timeAxis, timeOfDay)
+  ];
+  const sizes = lookup.axes.map(axis => axis.size);
+
+  let probability = 0;
+  for (let corner = 0; corner < 8; corner++) {
+    let index = 0;
+    let weight = 1;
+    for (let dim = 0; dim < 3; dim++) {
+      const upper = (corner >> dim) & 1;
+      const node = (positions[dim].lower + upper) % sizes[dim];
+      index = index * sizes[dim] + node;
+      weight *= upper ? positions[dim].weight : 1 - positions[dim].weight;
+    }
+    probability += weight * lookup.probabilities[index];
+  }
+  return probability;
+}
+
+/**
+ * Whether a probability reaches one of the model's thresholds
+ * @param {Number} probability - From getAlertProbability
+ * @param {String} level - optimal, high_precision or high_recall
+ * @returns {Boolean}
+ */
+function isAlertProbability(probability, level = 'optimal') {
+  if (probability === null || !lookup || lookup.thresholds[level] === undefined) {
+    return false;
+  }
+  return probability >= lookup.thresholds[level];
+}
+
+/**
+ * The loaded lookup's thresholds and held-out accuracy report
+ * @returns {Object|null}
+ */
+function getAlertLookupInfo() {
+  if (!lookup) {
+    return null;
+  }
+  return { axes: lookup.axes, thresholds: { ...lookup.thresholds }, accuracy: lookup.accuracy };
+}
+
+export {
+  loadAlertLookup,
+  getAlertProbability,
+  isAlertProbability,
+  getAlertLookupInfo
+};
@@ -1,10 +1,13 @@
 import Alert from '../models/Alert.js';
 import { notifySubscribers } from './notificationService.js';
 import { getOptimizedThresholds } from './aiModelService.js';
+import { loadAlertLookup, getAlertProbability, isAlertProbability } from './alertLookupService.js';
 
 // Default thresholds (will be overridden by AI model if available)
 let alertThresholds = {
   HIGH_TIDE: 2.5,
+  // Lowest tide level at which the alert model alone can raise a surge alert
+  HIGH_TIDE_LOWER: 2.0,
   STORM_SURGE: 3.0,
   COASTAL_FLOODING: 3.5,
   WIND_SPEED: 15,
@@ -12,8 +15,13 @@ let alertThresholds = {
   TURBIDITY: 25
 };
 
+// Last tide level per station, for the rate of change the alert model uses
+const lastTideByStation = new Map();
+
 // Initialize thresholds from AI model
 async function initializeThresholds() {
+  loadAlertLookup();
+
   try {
     const optimizedThresholds = await getOptimizedThresholds();
     if (optimizedThresholds) {
@@ -31,6 +39,55 @@ async function initializeThresholds() {
 // Initialize thresholds when service starts
 initializeThresholds();
 
+function stationKey(station) {
+  return String(station._id || station.name);
+}
+
+/**
+ * Alert model probability of a reading from the precomputed lookup table
+ * Only reads the station's previous tide level; recordTideLevel stores the new one.
+ * @param {Object} station - The station object
+ * @param {Object} reading - The reading object with metrics
+ * @returns {Number|null} - Probability, or null without a lookup or a previous tide level
+ */
+function getTideAlertProbability(station, reading) {
+  const tide = reading.metrics && reading.metrics.tide_m;
+  if (!Number.isFinite(tide)) {
+    return null;
+  }
+  const previous = lastTideByStation.get(stationKey(station));
+  return previous === undefined ? null : getAlertProbability(tide, tide - previous, reading.ts);
+}
+
+/**
+ * Remember a reading's tide level as the station's previous level for the next reading
+ * @param {Object} station - The station object
+ * @param {Object} reading - The reading object with metrics
+ */
+function recordTideLevel(station, reading) {
+  const tide = reading.metrics && reading.metrics.tide_m;
+  if (Number.isFinite(tide)) {
+    lastTideByStation.set(stationKey(station), tide);
+  }
+}
+
+/**
+ * Whether a tide level warrants a surge alert
+ * Tides above HIGH_TIDE always do. Between HIGH_TIDE_LOWER and HIGH_TIDE the alert model
+ * decides: a lookup probability at or above its threshold raises the alert (its alerts also
+ * cover low tides, hence the lower bound).
+ * @param {Number} tide - Tide level in metres
+ * @param {Number|null} probability - From getTideAlertProbability
+ * @returns {Boolean}
+ */
+function isSurgeAlert(tide, probability) {
+  if (!Number.isFinite(tide)) {
+    return false;
+  }
+  return tide > alertThresholds.HIGH_TIDE ||
+    (isAlertProbability(probability) && tide > alertThresholds.HIGH_TIDE_LOWER);
+}
+
 /**
  * Analyze readings and create alerts if thresholds are exceeded
  * @param {Object} station - The station object
@@ -41,9 +98,11 @@ async function analyzeReadingsAndCreateAlerts(station, reading) {
   try {
     const { metrics } = reading;
     let createdAlert = null;
+    const alertProbability = getTideAlertProbability(station, reading);
+    recordTideLevel(station, reading);
     
     // Check for storm surge (high tide)
-    if (metrics.tide_m && metrics.tide_m > alertThresholds.HIGH_TIDE) {
+    if (isSurgeAlert(metrics.tide_m, alertProbability)) {
       createdAlert = await Alert.create({
         area: station.name,
         center: { lat: station.lat, lng: station.lng },
@@ -54,6 +113,7 @@ async function analyzeReadingsAndCreateAlerts(station, reading) {
         details: {
           tide_level: metrics.tide_m,
           threshold: alertThresholds.HIGH_TIDE,
+          alert_probability: alertProbability,
           timestamp: reading.ts
         }
       });
@@ -172,6 +232,7 @@ function getCurrentThresholds() {
 
 export {
   analyzeReadingsAndCreateAlerts,
+  getTideAlertProbability,
   getActiveAlertsByArea,
   getAllActiveAlerts,
   updateAlertThresholds,